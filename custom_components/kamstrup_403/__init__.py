@@ -5,16 +5,42 @@ https://github.com/custom-components/kamstrup_403
 """
 
 import logging
+from collections.abc import Mapping
 from datetime import timedelta
+from functools import partial
+from typing import Any
 
 from homeassistant.config_entries import ConfigEntry, ConfigEntryState
-from homeassistant.const import CONF_PORT, CONF_SCAN_INTERVAL, CONF_TIMEOUT, Platform
+from homeassistant.const import CONF_ADDRESS, CONF_PORT, CONF_SCAN_INTERVAL, CONF_TIMEOUT, Platform
 from homeassistant.core import HomeAssistant
 from homeassistant.exceptions import ConfigEntryNotReady
-
-from .const import DEFAULT_BAUDRATE, DEFAULT_SCAN_INTERVAL, DEFAULT_TIMEOUT, DOMAIN
-from .coordinator import KamstrupUpdateCoordinator
-from .pykamstrup.kamstrup import Kamstrup
+from homeassistant.helpers import config_validation as cv
+from homeassistant.helpers.typing import ConfigType
+
+from .capabilities import KamstrupCapabilities
+from .const import (
+    CONF_BATCH_SIZE,
+    CONF_BAUDRATE,
+    CONF_ECHO_MODE,
+    CONF_FAST_SCAN_INTERVAL,
+    CONF_INTER_BYTE_TIMEOUT,
+    CONF_PROBE_BATCH_SIZE,
+    CONF_PROBE_BAUDRATE,
+    CONF_SLOW_SCAN_INTERVAL,
+    DEFAULT_BAUDRATE,
+    DEFAULT_ECHO_MODE,
+    DEFAULT_SCAN_INTERVAL,
+    DEFAULT_TIMEOUT,
+    DOMAIN,
+    FAST_REGISTERS,
+    REGISTER_TTLS,
+    SLOW_REGISTERS,
+)
+from .coordinator import KamstrupUpdateCoordinator, snapshot_store
+from .port_manager import get_port_manager
+from .pykamstrup.const import DEFAULT_DEST_ADDR, EchoMode
+from .pykamstrup.kamstrup import MULTIPLE_NBR_MAX, Kamstrup
+from .services import async_setup_services
 
 _LOGGER: logging.Logger = logging.getLogger(__package__)
 
@@ -23,29 +49,82 @@ PLATFORMS: list[Platform] = [
     Platform.SENSOR,
 ]
 
+CONFIG_SCHEMA = cv.config_entry_only_config_schema(DOMAIN)
+
+
+async def async_setup(hass: HomeAssistant, _config: ConfigType) -> bool:
+    """Set up the services, they're shared by all config entries."""
+    async_setup_services(hass)
+    return True
+
 
 async def async_setup_entry(hass: HomeAssistant, config_entry: ConfigEntry[KamstrupUpdateCoordinator]) -> bool:
     """Set up this integration using UI."""
-    hass.data.setdefault(DOMAIN, {})
+    port_manager = get_port_manager(hass)
 
     port = config_entry.data.get(CONF_PORT)
+    address = config_entry.data.get(CONF_ADDRESS, DEFAULT_DEST_ADDR)
+    baudrate = config_entry.data.get(CONF_BAUDRATE)
     scan_interval_seconds = config_entry.options.get(CONF_SCAN_INTERVAL, DEFAULT_SCAN_INTERVAL)
     scan_interval = timedelta(seconds=scan_interval_seconds)
     timeout_seconds = config_entry.options.get(CONF_TIMEOUT, DEFAULT_TIMEOUT)
+    inter_byte_timeout_seconds = config_entry.options.get(CONF_INTER_BYTE_TIMEOUT)
+    echo_mode = EchoMode(config_entry.options.get(CONF_ECHO_MODE, DEFAULT_ECHO_MODE))
 
     if not port:
         msg = "Missing required configuration options: port."
         raise ValueError(msg)
 
     _LOGGER.debug(
-        "Set up entry, with scan_interval of %s seconds and timeout of %s seconds",
+        "Set up entry for address %s, with scan_interval of %s seconds, timeout of %s seconds, inter byte timeout of %s seconds and echo mode %s",
+        address,
         scan_interval_seconds,
         timeout_seconds,
+        inter_byte_timeout_seconds,
+        echo_mode,
     )
 
     try:
-        client = Kamstrup(url=port, baudrate=DEFAULT_BAUDRATE, timeout=timeout_seconds)
-        await client.connect()
+        client = await port_manager.async_acquire(
+            port,
+            partial(Kamstrup, url=port),
+            {
+                "baudrate": baudrate or DEFAULT_BAUDRATE,
+                "timeout": timeout_seconds,
+                "inter_byte_timeout": inter_byte_timeout_seconds,
+                "echo_mode": echo_mode,
+            },
+        )
+    except Exception as exception:
+        _LOGGER.warning("Can't establish a connection to %s", port)
+        raise ConfigEntryNotReady from exception
+
+    # The port is only released on unload after a successful setup, release it here when the setup fails.
+    try:
+        await async_setup_coordinator(hass, config_entry, client, port, scan_interval)
+    except Exception:
+        await port_manager.async_release(port)
+        raise
+
+    return True
+
+
+async def async_setup_coordinator(
+    hass: HomeAssistant,
+    config_entry: ConfigEntry[KamstrupUpdateCoordinator],
+    client: Kamstrup,
+    port: str,
+    scan_interval: timedelta,
+) -> None:
+    """Set up the coordinator of the meter on the port the client was acquired on, and its platforms."""
+    address = config_entry.data.get(CONF_ADDRESS, DEFAULT_DEST_ADDR)
+    try:
+        if config_entry.data.get(CONF_BAUDRATE) is None:
+            await async_probe_baudrate(hass, config_entry, client)
+        if (batch_size := config_entry.data.get(CONF_BATCH_SIZE)) is not None:
+            client.set_batch_size(batch_size, address)
+        if batch_size is None or config_entry.data.get(CONF_PROBE_BATCH_SIZE):
+            await async_probe_batch_size(hass, config_entry, client)
     except Exception as exception:
         _LOGGER.warning("Can't establish a connection to %s", port)
         raise ConfigEntryNotReady from exception
@@ -55,30 +134,104 @@ async def async_setup_entry(hass: HomeAssistant, config_entry: ConfigEntry[Kamst
         config_entry=config_entry,
         client=client,
         scan_interval=scan_interval,
+        address=address,
+        port=port,
+        register_ttls=register_ttls(config_entry),
+        poll_intervals=tier_intervals(config_entry),
     )
+    await coordinator.capabilities.async_load()
+
+    restored = await coordinator.async_restore()
 
     await hass.config_entries.async_forward_entry_setups(config_entry, PLATFORMS)
 
     if config_entry.state is ConfigEntryState.LOADED:
         await coordinator.async_refresh()
+    elif restored:
+        # The entities start with the readings from before the restart, don't wait for the meter.
+        config_entry.async_create_background_task(hass, coordinator.async_refresh(), f"{DOMAIN} {config_entry.entry_id} refresh")
     else:
         await coordinator.async_config_entry_first_refresh()
 
-    config_entry.async_on_unload(config_entry.add_update_listener(async_reload_entry))
+    # Changes of the data, like the probed baudrate, don't reload the entry, where they're made a reload is scheduled if needed.
+    config_entry.async_on_unload(config_entry.add_update_listener(partial(async_reload_entry, options=dict(config_entry.options))))
 
-    return True
+
+def tier_intervals(config_entry: ConfigEntry[KamstrupUpdateCoordinator]) -> dict[int, float]:
+    """Seconds after which registers are read again, for the polling tiers set in the options."""
+    intervals: dict[int, float] = {}
+    if (slow_scan_interval := config_entry.options.get(CONF_SLOW_SCAN_INTERVAL)) is not None:
+        intervals.update(dict.fromkeys(SLOW_REGISTERS, float(slow_scan_interval)))
+    if (fast_scan_interval := config_entry.options.get(CONF_FAST_SCAN_INTERVAL)) is not None:
+        intervals.update(dict.fromkeys(FAST_REGISTERS, float(fast_scan_interval)))
+    return intervals
+
+
+def register_ttls(config_entry: ConfigEntry[KamstrupUpdateCoordinator]) -> dict[int, float]:
+    """Seconds after which registers are read again, the polling tiers in the options replace the defaults."""
+    return {**REGISTER_TTLS, **tier_intervals(config_entry)}
+
+
+async def async_probe_baudrate(hass: HomeAssistant, config_entry: ConfigEntry[KamstrupUpdateCoordinator], client: Kamstrup) -> None:
+    """Find the fastest baudrate the meter answers at and store it in the config entry.
+
+    When the meter doesn't answer, the current baudrate is stored so the next setup doesn't probe again,
+    the coordinator probes again once the meter answers.
+    """
+    baudrate = await client.probe_baudrate(dest_addr=config_entry.data.get(CONF_ADDRESS, DEFAULT_DEST_ADDR))
+    data = {key: value for key, value in config_entry.data.items() if key != CONF_PROBE_BAUDRATE}
+    if baudrate is None:
+        _LOGGER.warning("Meter didn't answer at any baudrate, using %s baud", client.baudrate)
+        hass.config_entries.async_update_entry(config_entry, data={**data, CONF_BAUDRATE: client.baudrate, CONF_PROBE_BAUDRATE: True})
+        return
+
+    _LOGGER.debug("Meter answers at %s baud", baudrate)
+    hass.config_entries.async_update_entry(config_entry, data={**data, CONF_BAUDRATE: baudrate})
+
+
+async def async_probe_batch_size(hass: HomeAssistant, config_entry: ConfigEntry[KamstrupUpdateCoordinator], client: Kamstrup) -> None:
+    """Find the number of registers the meter answers in a single request and store it in the config entry.
+
+    Fewer registers than a request can hold may be caused by requests that got lost, that number is only confirmed
+    when the next setup finds it again.
+    """
+    address = config_entry.data.get(CONF_ADDRESS, DEFAULT_DEST_ADDR)
+    batch_size = await client.probe_batch_size(dest_addr=address)
+    if batch_size is None:
+        _LOGGER.warning("Meter didn't answer a request for multiple registers, using batches of %s", client.batch_size(address))
+        return
+
+    _LOGGER.debug("Meter answers %s registers at once", batch_size)
+    data = {key: value for key, value in config_entry.data.items() if key != CONF_PROBE_BATCH_SIZE}
+    if batch_size < MULTIPLE_NBR_MAX and batch_size != config_entry.data.get(CONF_BATCH_SIZE):
+        data[CONF_PROBE_BATCH_SIZE] = True
+    hass.config_entries.async_update_entry(config_entry, data={**data, CONF_BATCH_SIZE: batch_size})
 
 
 async def async_unload_entry(hass: HomeAssistant, config_entry: ConfigEntry[KamstrupUpdateCoordinator]) -> bool:
-    """Unload a config entry."""
-    if hasattr(config_entry, "runtime_data") and config_entry.runtime_data:
-        coordinator = config_entry.runtime_data
-        if coordinator.kamstrup:
-            await coordinator.kamstrup.disconnect()
-    return await hass.config_entries.async_unload_platforms(config_entry, PLATFORMS)
-
-
-async def async_reload_entry(hass: HomeAssistant, config_entry: ConfigEntry[KamstrupUpdateCoordinator]) -> None:
-    """Reload config entry."""
-    await async_unload_entry(hass, config_entry)
-    await async_setup_entry(hass, config_entry)
+    """Unload a config entry.
+
+    The port the coordinator uses is released once nothing reads the meter anymore, it may not be the port in the
+    config entry after a reconfigure.
+    """
+    if not await hass.config_entries.async_unload_platforms(config_entry, PLATFORMS):
+        return False
+
+    coordinator = config_entry.runtime_data
+    await coordinator.async_shutdown()
+    if coordinator.port is not None:
+        await get_port_manager(hass).async_release(coordinator.port)
+    return True
+
+
+async def async_remove_entry(hass: HomeAssistant, config_entry: ConfigEntry[KamstrupUpdateCoordinator]) -> None:
+    """Remove the stored registers and readings of the meter when the config entry is removed."""
+    await KamstrupCapabilities(hass, config_entry.entry_id).async_remove()
+    await snapshot_store(hass, config_entry.entry_id).async_remove()
+
+
+async def async_reload_entry(hass: HomeAssistant, config_entry: ConfigEntry[KamstrupUpdateCoordinator], *, options: Mapping[str, Any]) -> None:
+    """Reload config entry when its options differ from the `options` it was set up with."""
+    if config_entry.options == options:
+        return
+    await hass.config_entries.async_reload(config_entry.entry_id)
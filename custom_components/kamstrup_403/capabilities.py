@@ -0,0 +1,105 @@
+"""Registers supported by the meter for kamstrup_403."""
+
+import logging
+from collections.abc import Iterable
+from typing import Any, TypedDict
+
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.storage import Store
+
+from .const import DOMAIN, STORAGE_SAVE_DELAY, STORAGE_VERSION
+
+_LOGGER: logging.Logger = logging.getLogger(__package__)
+
+# Failures in a row before a register is quarantined.
+QUARANTINE_FAILURES = 3
+# Seconds a register is quarantined the first time, this doubles for every failed re-probe.
+QUARANTINE_BACKOFF = 3600.0
+QUARANTINE_BACKOFF_MAX = 7 * 24 * 3600.0
+
+
+class CapabilitiesData(TypedDict):
+    """Stored capabilities, keys of the mappings are register numbers."""
+
+    supported: list[int]
+    unsupported: list[int]
+    failures: dict[str, int]
+    quarantine: dict[str, float]
+
+
+class KamstrupCapabilities:
+    """Registers the meter supports, stored so the register catalog is only discovered once.
+
+    Unsupported registers get no entities. Supported registers that keep failing are quarantined,
+    they're re-probed after a backoff that doubles every time they fail again.
+    """
+
+    def __init__(self, hass: HomeAssistant, entry_id: str) -> None:
+        """Initialize, for the meter of a config entry."""
+        self._store: Store[CapabilitiesData] = Store(hass, STORAGE_VERSION, f"{DOMAIN}.{entry_id}")
+        self.supported: set[int] = set()
+        self.unsupported: set[int] = set()
+        self._failures: dict[int, int] = {}
+        self._quarantine: dict[int, float] = {}
+
+    async def async_load(self) -> None:
+        """Load the stored capabilities."""
+        if (data := await self._store.async_load()) is None:
+            return
+        self.supported = set(data["supported"])
+        self.unsupported = set(data["unsupported"])
+        self._failures = {int(nbr): failures for nbr, failures in data["failures"].items()}
+        self._quarantine = {int(nbr): until for nbr, until in data["quarantine"].items()}
+
+    async def async_save(self) -> None:
+        """Store the capabilities now."""
+        await self._store.async_save(self._data_to_save())
+
+    async def async_remove(self) -> None:
+        """Remove the stored capabilities."""
+        await self._store.async_remove()
+
+    def _data_to_save(self) -> CapabilitiesData:
+        """The capabilities to store."""
+        return {
+            "supported": sorted(self.supported),
+            "unsupported": sorted(self.unsupported),
+            "failures": {str(nbr): failures for nbr, failures in self._failures.items()},
+            "quarantine": {str(nbr): until for nbr, until in self._quarantine.items()},
+        }
+
+    def unknown(self, registers: Iterable[int]) -> list[int]:
+        """The registers that haven't been discovered yet."""
+        return [nbr for nbr in registers if nbr not in self.supported and nbr not in self.unsupported]
+
+    def discovered(self, supported: dict[int, bool]) -> None:
+        """Remember whether registers are supported."""
+        for nbr, is_supported in supported.items():
+            (self.supported if is_supported else self.unsupported).add(nbr)
+
+    def is_supported(self, nbr: int) -> bool:
+        """Whether the register is supported, registers that couldn't be discovered are assumed to be."""
+        return nbr not in self.unsupported
+
+    def is_quarantined(self, nbr: int, now: float) -> bool:
+        """Whether the register is quarantined at time `now`."""
+        return self._quarantine.get(nbr, 0.0) > now
+
+    def record(self, nbr: int, *, success: bool, now: float) -> None:
+        """Record the result of reading a register at time `now`, quarantines it when it keeps failing."""
+        if success:
+            if self._failures.pop(nbr, None) is not None:
+                self._quarantine.pop(nbr, None)
+                self._store.async_delay_save(self._data_to_save, STORAGE_SAVE_DELAY)
+            return
+
+        failures = self._failures[nbr] = self._failures.get(nbr, 0) + 1
+        if failures >= QUARANTINE_FAILURES:
+            backoff = min(QUARANTINE_BACKOFF * 2 ** min(failures - QUARANTINE_FAILURES, 16), QUARANTINE_BACKOFF_MAX)
+            _LOGGER.debug("Quarantine register %s for %s seconds after %s failures", nbr, backoff, failures)
+            self._quarantine[nbr] = now + backoff
+        self._store.async_delay_save(self._data_to_save, STORAGE_SAVE_DELAY)
+
+    def as_dict(self) -> dict[str, Any]:
+        """The capabilities, for diagnostics."""
+        return dict(self._data_to_save())
@@ -3,12 +3,35 @@
 from typing import Any
 
 import voluptuous as vol
-from homeassistant.config_entries import SOURCE_RECONFIGURE, ConfigEntry, ConfigFlow, ConfigFlowResult, OptionsFlow
-from homeassistant.const import CONF_PORT, CONF_SCAN_INTERVAL, CONF_TIMEOUT
+from homeassistant.config_entries import SOURCE_RECONFIGURE, ConfigEntry, ConfigEntryState, ConfigFlow, ConfigFlowResult, OptionsFlow
+from homeassistant.const import CONF_ADDRESS, CONF_PORT, CONF_SCAN_INTERVAL, CONF_TIMEOUT
 from homeassistant.core import callback
-from homeassistant.helpers.selector import TextSelector, TextSelectorConfig, TextSelectorType
+from homeassistant.helpers.selector import (
+    NumberSelector,
+    NumberSelectorConfig,
+    NumberSelectorMode,
+    SelectSelector,
+    SelectSelectorConfig,
+    SelectSelectorMode,
+    TextSelector,
+    TextSelectorConfig,
+    TextSelectorType,
+)
 
-from .const import DEFAULT_BAUDRATE, DEFAULT_SCAN_INTERVAL, DEFAULT_TIMEOUT, DOMAIN
+from .capabilities import KamstrupCapabilities
+from .const import (
+    CONF_ECHO_MODE,
+    CONF_FAST_SCAN_INTERVAL,
+    CONF_INTER_BYTE_TIMEOUT,
+    CONF_SLOW_SCAN_INTERVAL,
+    DEFAULT_BAUDRATE,
+    DEFAULT_ECHO_MODE,
+    DEFAULT_SCAN_INTERVAL,
+    DEFAULT_TIMEOUT,
+    DOMAIN,
+)
+from .coordinator import snapshot_store
+from .pykamstrup.const import DEFAULT_DEST_ADDR, EchoMode
 from .pykamstrup.kamstrup import Kamstrup
 
 CONFIG_SCHEMA = vol.Schema(
@@ -17,12 +40,25 @@ CONFIG_SCHEMA = vol.Schema(
     },
 )
 
+ADDRESS_SCHEMA = vol.Schema(
+    {
+        vol.Required(CONF_ADDRESS, default=DEFAULT_DEST_ADDR): vol.All(
+            NumberSelector(NumberSelectorConfig(min=1, max=254, step=1, mode=NumberSelectorMode.BOX)),
+            vol.Coerce(int),
+        ),
+    },
+)
+
 
 class KamstrupFlowHandler(ConfigFlow, domain=DOMAIN):
     """Config flow for Kamstrup 403."""
 
     VERSION = 1
 
+    def __init__(self) -> None:
+        """Initialize."""
+        self._data: dict[str, Any] = {}
+
     async def async_step_user(self, user_input: dict[str, Any] | None = None) -> ConfigFlowResult:
         """Handle a flow initialized by the user."""
         _errors = {}
@@ -33,13 +69,8 @@ class KamstrupFlowHandler(ConfigFlow, domain=DOMAIN):
             except Exception:  # pylint: disable=broad-exception-caught # noqa: BLE001
                 _errors["base"] = "port"
             else:
-                if self.source == SOURCE_RECONFIGURE:
-                    return self.async_update_reload_and_abort(
-                        self._get_reconfigure_entry(),
-                        title=user_input[CONF_PORT],
-                        data=user_input,
-                    )
-                return self.async_create_entry(title=user_input[CONF_PORT], data=user_input)
+                self._data = user_input
+                return await self.async_step_address()
 
         return self.async_show_form(
             step_id="user",
@@ -47,6 +78,43 @@ class KamstrupFlowHandler(ConfigFlow, domain=DOMAIN):
             errors=_errors,
         )
 
+    async def async_step_address(self, user_input: dict[str, Any] | None = None) -> ConfigFlowResult:
+        """Handle the address of the meter, several meters can share a port."""
+        if user_input is not None:
+            data = {**self._data, **user_input}
+            port = data[CONF_PORT]
+            title = port if data[CONF_ADDRESS] == DEFAULT_DEST_ADDR else f"{port} ({data[CONF_ADDRESS]})"
+
+            if self.source == SOURCE_RECONFIGURE:
+                entry = self._get_reconfigure_entry()
+                if entry.data.get(CONF_PORT) != port or entry.data.get(CONF_ADDRESS, DEFAULT_DEST_ADDR) != data[CONF_ADDRESS]:
+                    await self._async_remove_stores(entry)
+                return self.async_update_reload_and_abort(entry, title=title, data=data)
+
+            # Entries created before meters had an address are at the default address.
+            for entry in self._async_current_entries(include_ignore=False):
+                if entry.data.get(CONF_PORT) == port and entry.data.get(CONF_ADDRESS, DEFAULT_DEST_ADDR) == data[CONF_ADDRESS]:
+                    return self.async_abort(reason="already_configured")
+            return self.async_create_entry(title=title, data=data)
+
+        data_schema = ADDRESS_SCHEMA
+        if self.source == SOURCE_RECONFIGURE:
+            data_schema = self.add_suggested_values_to_schema(ADDRESS_SCHEMA, self._get_reconfigure_entry().data)
+
+        return self.async_show_form(
+            step_id="address",
+            data_schema=data_schema,
+        )
+
+    async def _async_remove_stores(self, entry: ConfigEntry) -> None:
+        """Remove the registers and readings stored for an entry, they're of the meter it was set up for before."""
+        if entry.state is ConfigEntryState.LOADED:
+            # Through the coordinator, so its pending writes don't store them again.
+            await entry.runtime_data.async_remove_stores()
+            return
+        await KamstrupCapabilities(self.hass, entry.entry_id).async_remove()
+        await snapshot_store(self.hass, entry.entry_id).async_remove()
+
     async def async_step_reconfigure(self, _: dict[str, Any] | None = None) -> ConfigFlowResult:
         """Handle reconfiguration."""
         data = self._get_reconfigure_entry().data.copy()
@@ -79,10 +147,32 @@ class KamstrupOptionsFlowHandler(OptionsFlow):
                         CONF_SCAN_INTERVAL,
                         default=self.config_entry.options.get(CONF_SCAN_INTERVAL, DEFAULT_SCAN_INTERVAL),
                     ): vol.All(vol.Coerce(int), vol.Range(min=1, max=86400)),
+                    vol.Optional(
+                        CONF_FAST_SCAN_INTERVAL,
+                        description={"suggested_value": self.config_entry.options.get(CONF_FAST_SCAN_INTERVAL)},
+                    ): vol.All(vol.Coerce(int), vol.Range(min=1, max=86400)),
+                    vol.Optional(
+                        CONF_SLOW_SCAN_INTERVAL,
+                        description={"suggested_value": self.config_entry.options.get(CONF_SLOW_SCAN_INTERVAL)},
+                    ): vol.All(vol.Coerce(int), vol.Range(min=1, max=604800)),
                     vol.Required(
                         CONF_TIMEOUT,
                         default=self.config_entry.options.get(CONF_TIMEOUT, DEFAULT_TIMEOUT),
                     ): vol.All(vol.Coerce(float), vol.Range(min=0.0, max=5.0)),
+                    vol.Optional(
+                        CONF_INTER_BYTE_TIMEOUT,
+                        description={"suggested_value": self.config_entry.options.get(CONF_INTER_BYTE_TIMEOUT)},
+                    ): vol.All(vol.Coerce(float), vol.Range(min=0.01, max=1.0)),
+                    vol.Required(
+                        CONF_ECHO_MODE,
+                        default=self.config_entry.options.get(CONF_ECHO_MODE, DEFAULT_ECHO_MODE),
+                    ): SelectSelector(
+                        SelectSelectorConfig(
+                            options=[mode.value for mode in EchoMode],
+                            mode=SelectSelectorMode.DROPDOWN,
+                            translation_key=CONF_ECHO_MODE,
+                        )
+                    ),
                 }
             ),
         )
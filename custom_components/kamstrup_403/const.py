@@ -1,5 +1,6 @@
 """Constants for Kamstrup 403."""
 
+import math
 from typing import Final
 
 # Base component constants
@@ -8,8 +9,56 @@ DOMAIN: Final = "kamstrup_403"
 MODEL: Final = "403"
 MANUFACTURER: Final = "Kamstrup"
 
+# Configuration and options
+CONF_BAUDRATE: Final = "baudrate"
+# Set while the stored baudrate isn't confirmed, the baudrate is probed again once the meter answers.
+CONF_PROBE_BAUDRATE: Final = "probe_baudrate"
+CONF_BATCH_SIZE: Final = "batch_size"
+# Set while a stored batch size below the most a request can hold isn't confirmed, it's probed again on the next setup.
+CONF_PROBE_BATCH_SIZE: Final = "probe_batch_size"
+CONF_INTER_BYTE_TIMEOUT: Final = "inter_byte_timeout"
+CONF_ECHO_MODE: Final = "echo_mode"
+CONF_FAST_SCAN_INTERVAL: Final = "fast_scan_interval"
+CONF_SLOW_SCAN_INTERVAL: Final = "slow_scan_interval"
+
+# Services
+SERVICE_READ_REGISTERS: Final = "read_registers"
+SERVICE_START_STREAMING: Final = "start_streaming"
+SERVICE_STOP_STREAMING: Final = "stop_streaming"
+ATTR_REGISTERS: Final = "registers"
+ATTR_DURATION: Final = "duration"
+
+# State attributes
+ATTR_RESTORED_AT: Final = "restored_at"
+
 # Defaults
 DEFAULT_NAME: Final = NAME
 DEFAULT_BAUDRATE: Final = 1200
 DEFAULT_SCAN_INTERVAL: Final = 3600
 DEFAULT_TIMEOUT: Final = 1.0
+DEFAULT_ECHO_MODE: Final = "auto"
+# Seconds registers are streamed when no duration is given, and at most.
+DEFAULT_STREAM_DURATION: Final = 300
+MAX_STREAM_DURATION: Final = 3600
+
+# Storage
+STORAGE_VERSION: Final = 1
+# Seconds to wait before saving changes, changes of a whole update are saved at once.
+STORAGE_SAVE_DELAY: Final = 10
+
+# Polling tiers, registers not in a tier are read every scan interval.
+# Flow, power and temperatures.
+FAST_REGISTERS: Final = (74, 80, 86, 87, 89)
+# Yearly min, max and average values, and their dates.
+YEARLY_REGISTERS: Final = (123, 124, 125, 126, 127, 128, 129, 130, 146, 147)
+# Monthly min, max and average values, and their dates.
+MONTHLY_REGISTERS: Final = (138, 139, 140, 141, 142, 143, 144, 145, 149, 150)
+SLOW_REGISTERS: Final = YEARLY_REGISTERS + MONTHLY_REGISTERS
+
+# How long a value stays valid, in seconds, for registers that change slowly or never.
+REGISTER_TTLS: Final[dict[int, float]] = {
+    # Serial number.
+    1001: math.inf,
+    **dict.fromkeys(YEARLY_REGISTERS, 24 * 3600.0),
+    **dict.fromkeys(MONTHLY_REGISTERS, 6 * 3600.0),
+}
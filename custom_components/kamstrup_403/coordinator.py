@@ -1,96 +1,482 @@
 """DataUpdateCoordinator for kamstrup_403."""
 
+import asyncio
 import logging
-from datetime import timedelta
-from typing import Any
+import math
+import time
+from collections.abc import Mapping
+from datetime import datetime, timedelta
+from typing import Any, TypedDict
 
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.debounce import Debouncer
+from homeassistant.helpers.storage import Store
 from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
+from homeassistant.util import dt as dt_util
 from serialx import SerialException
 
-from .const import DOMAIN
-from .pykamstrup.kamstrup import MULTIPLE_NBR_MAX, Kamstrup
+from .capabilities import KamstrupCapabilities
+from .const import CONF_BAUDRATE, CONF_PROBE_BAUDRATE, DOMAIN, REGISTER_TTLS, STORAGE_SAVE_DELAY, STORAGE_VERSION
+from .pykamstrup.const import BAUDRATES, DEFAULT_DEST_ADDR
+from .pykamstrup.kamstrup import Kamstrup
+from .readings import Readings
 
 _LOGGER: logging.Logger = logging.getLogger(__package__)
+# Updates in a row without any reading before falling back to a slower baudrate.
+BAUDRATE_FALLBACK_UPDATES = 3
+# Requests per update that may be spent on retrying failed commands.
+RETRY_BUDGET = 3
+# Seconds to wait for more commands to register before reading new commands.
+NEW_COMMANDS_DELAY = 2.0
+# Seconds between updates of the listeners while streaming, readings in between only update the values.
+STREAM_PUBLISH_INTERVAL = 1.0
+# Seconds to wait before streaming again after the meter couldn't be read.
+STREAM_RETRY_DELAY = 1.0
 
 
-class KamstrupUpdateCoordinator(DataUpdateCoordinator[dict[int, Any]]):
+class Snapshot(TypedDict):
+    """Stored readings, keys of the data are the commands."""
+
+    time: float
+    data: dict[str, dict[str, Any]]
+
+
+def snapshot_store(hass: HomeAssistant, entry_id: str) -> Store[Snapshot]:
+    """The store of the last readings of a config entry."""
+    return Store(hass, STORAGE_VERSION, f"{DOMAIN}.{entry_id}.snapshot")
+
+
+class KamstrupUpdateCoordinator(DataUpdateCoordinator[Readings]):  # pylint: disable=too-many-instance-attributes
     """Class to manage fetching data from the Kamstrup serial reader."""
 
-    def __init__(
+    def __init__(  # noqa: PLR0913 # pylint: disable=too-many-arguments
         self,
         hass: HomeAssistant,
         config_entry: ConfigEntry,
         client: Kamstrup,
         scan_interval: timedelta,
+        *,
+        address: int = DEFAULT_DEST_ADDR,
+        port: str | None = None,
+        retry_budget: int = RETRY_BUDGET,
+        register_ttls: Mapping[int, float] | None = None,
+        poll_intervals: Mapping[int, float] | None = None,
     ) -> None:
-        """Initialize."""
+        """Initialize, for the meter at `address` on the line of the client, acquired on `port`.
+
+        Failed commands are retried in the same update, using at most `retry_budget` extra requests.
+        Values are read again after the number of seconds in `register_ttls`, by default REGISTER_TTLS, or every `scan_interval`
+        for commands not in there. These only skip values that are still valid, only `poll_intervals` make the coordinator
+        update more often than the scan interval, as often as the registered commands in there need.
+        All commands that are due are requested together.
+        """
         self.kamstrup = client
+        self.address = address
+        # The port the client was acquired on, the port of the config entry can change before it unloads.
+        self.port = port
+        self.retry_budget = retry_budget
+        self.register_ttls = REGISTER_TTLS if register_ttls is None else register_ttls
+        self.poll_intervals = poll_intervals or {}
+        self.scan_interval = scan_interval
+        self.capabilities = KamstrupCapabilities(hass, config_entry.entry_id)
+        # When the data is restored from before a restart, the time it was read.
+        self.restored_at: datetime | None = None
+        self._snapshot_store = snapshot_store(hass, config_entry.entry_id)
 
-        self._commands: list[int] = []
+        # Registered commands in the order they were registered, with the number of registrations.
+        self._commands: dict[int, int] = {}
+        # Commands registered since the last update, read by a partial refresh.
+        self._new_commands: set[int] = set()
+        # The readings are updated in place, the cache only holds the time they expire.
+        self._readings = Readings()
+        self._cache: dict[int, float] = {}
+        self._failed_updates = 0
+        # Commands whose reading changed in the last update, None when all listeners need an update.
+        self._changed: set[int] | None = None
+        # Streaming reads commands back to back until a deadline, separate from the updates.
+        self._stream_commands: list[int] = []
+        self._stream_until = -math.inf
+        self._stream_task: asyncio.Task[None] | None = None
+        # Commands whose reading changed since the listeners were last updated by the stream.
+        self._stream_changed: set[int] = set()
+        self._stream_publish: asyncio.TimerHandle | None = None
+        self._stream_published = -math.inf
 
         super().__init__(hass, _LOGGER, config_entry=config_entry, name=DOMAIN, update_interval=scan_interval)
+        self._new_commands_debouncer = Debouncer(
+            hass,
+            _LOGGER,
+            cooldown=NEW_COMMANDS_DELAY,
+            immediate=False,
+            function=self._async_read_new_commands,
+        )
 
     def register_command(self, command: int) -> None:
-        """Add a command to the commands list."""
+        """Add a command to the registered commands, a command registered more than once is read once.
+
+        A new command is read within seconds by a partial refresh, instead of at the next update.
+        """
         _LOGGER.debug("Register command %s", command)
-        self._commands.append(command)
+        registrations = self._commands.get(command, 0)
+        self._commands[command] = registrations + 1
+        if registrations:
+            return
+
+        self._update_poll_interval()
+        # Before the first update there's nothing to refresh, the first update reads all commands.
+        if self.data is not None:
+            self._new_commands.add(command)
+            self._new_commands_debouncer.async_schedule_call()
 
     def unregister_command(self, command: int) -> None:
-        """Remove a command from the commands list."""
+        """Remove a registration of a command, the command is removed when it has no registrations left."""
         _LOGGER.debug("Unregister command %s", command)
-        self._commands.remove(command)
+        registrations = self._commands.get(command)
+        if registrations is None:
+            msg = f"Command {command} is not registered"
+            raise ValueError(msg)
+        if registrations > 1:
+            self._commands[command] = registrations - 1
+            return
+
+        del self._commands[command]
+        self._new_commands.discard(command)
+        self._cache.pop(command, None)
+        self._readings.remove(command)
+        self._update_poll_interval()
+
+    def _ttl(self, command: int) -> float:
+        """Seconds a value of the command stays valid."""
+        return self.register_ttls.get(command, self.scan_interval.total_seconds())
+
+    def _update_poll_interval(self) -> None:
+        """Update as often as the fastest registered command with a poll interval needs, at least every scan interval."""
+        seconds = min((self.poll_intervals[command] for command in self._commands if command in self.poll_intervals), default=math.inf)
+        self.update_interval = timedelta(seconds=seconds) if seconds < self.scan_interval.total_seconds() else self.scan_interval
 
     @property
     def commands(self) -> list[int]:
-        """List of registered commands."""
-        return self._commands
+        """List of registered commands, in the order they were registered."""
+        return list(self._commands)
 
-    async def _async_update_data(self) -> dict[int, Any]:
-        """Update data via library."""
-        _LOGGER.debug("Start update")
+    async def async_restore(self) -> bool:
+        """Restore the last readings stored before a restart, returns whether there were any."""
+        if (snapshot := await self._snapshot_store.async_load()) is None:
+            return False
 
-        data = {}
-        failed_counter = 0
+        self.restored_at = dt_util.utc_from_timestamp(snapshot["time"])
+        self.data = self._readings = Readings.from_dict(snapshot["data"])
+        _LOGGER.debug("Restored %s readings, read at %s", len(self.data), self.restored_at)
+        return True
 
-        # The amount of values that can request at once is limited, do it in chunks.
-        chunks: list[list[int]] = [self._commands[i : i + MULTIPLE_NBR_MAX] for i in range(0, len(self._commands), MULTIPLE_NBR_MAX)]
+    async def async_remove_stores(self) -> None:
+        """Remove the stored registers and readings, including pending writes, e.g. when the entry is set up for another meter."""
+        await self.capabilities.async_remove()
+        await self._snapshot_store.async_remove()
 
-        for chunk in chunks:
-            _LOGGER.debug("Get values for %s", chunk)
+    def _snapshot_to_save(self) -> Snapshot:
+        """The last readings to store."""
+        return {"time": time.time(), "data": {str(command): reading for command, reading in self._readings.as_dict().items()}}
 
-            try:
-                values = await self.kamstrup.get_values(chunk)
-            except SerialException as exception:
-                _LOGGER.warning("Device disconnected or multiple access on port?")
-                raise UpdateFailed from exception
-            except Exception as exception:
-                _LOGGER.warning("Error reading multiple %s \nException: %s", chunk, exception)
-                raise UpdateFailed from exception
+    async def async_discover(self, registers: list[int]) -> None:
+        """Discover which of the registers the meter supports, registers discovered before are skipped."""
+        if not (unknown := self.capabilities.unknown(registers)):
+            return
 
-            if values is None:
-                _LOGGER.debug("No values returned for chunk %s", chunk)
-                failed_counter += len(chunk)
-                continue
+        _LOGGER.debug("Discover registers %s", unknown)
+        try:
+            supported = await self.kamstrup.discover_registers(unknown, dest_addr=self.address)
+        except Exception as exception:  # pylint: disable=broad-exception-caught # noqa: BLE001
+            _LOGGER.warning("Can't discover the registers of the meter: %s", exception)
+            return
 
-            for command in chunk:
-                if command in values:
-                    value, unit = values[command]
-                    data[command] = {"value": value, "unit": unit}
-                    _LOGGER.debug("New value for sensor %s, value: %s %s", command, value, unit)
-                else:
-                    _LOGGER.debug("No value for sensor %s", command)
-                    data[command] = {"value": None, "unit": None}
-                    failed_counter += 1
-
-        if failed_counter == len(self._commands):
+        self.capabilities.discovered(supported)
+        await self.capabilities.async_save()
+
+    async def async_read_registers(self, registers: list[int]) -> Readings:
+        """Read registers on request, registered or not, in the same batches as an update.
+
+        The readings of the coordinator aren't changed, registers the meter doesn't answer have no value.
+        Raises UpdateFailed when the meter can't be read.
+        """
+        readings = Readings()
+        for chunk in self.kamstrup.plan_batches(registers, self.address):
+            values = await self._async_request(chunk) or {}
+            for register in chunk:
+                value, unit = values.get(register, (None, None))
+                readings.set(register, value, unit)
+        return readings
+
+    async def _async_update_data(self) -> Readings:
+        """Update data via library."""
+        _LOGGER.debug("Start update")
+        self._changed = None
+        # This update reads the new commands as well.
+        self._new_commands.clear()
+        self._new_commands_debouncer.async_cancel()
+
+        now = time.monotonic()
+        wall_now = time.time()
+        cached = self._cached_commands(now)
+        due = [command for command in self._commands if command not in cached and not self.capabilities.is_quarantined(command, wall_now)]
+        changed: set[int] = set()
+        failed: list[int] = []
+        update_all = False
+
+        # The amount of values that can be requested at once is limited, the client plans the chunks.
+        for chunk in self.kamstrup.plan_batches(due, self.address):
+            values = await self._async_request(chunk)
+            failed.extend(self._store_values(chunk, values, changed))
+
+        if failed:
+            failed = await self._async_retry(failed, changed)
+        # Commands without a value are unavailable.
+        for command in failed:
+            if self._readings.set(command, None, None):
+                changed.add(command)
+        failed_counter = len(failed)
+        self._cache_values(due, now)
+
+        if self._commands and not due:
+            _LOGGER.debug("Finished update, all %s readings are cached", len(self._commands))
+        elif failed_counter == len(due):
             _LOGGER.error("Finished update, No readings from the meter. Please check the IR connection")
+            if due:
+                self._failed_updates += 1
+                self._fallback_baudrate()
         else:
+            self._failed_updates = 0
+            self._probe_baudrate_again()
+            # The meter answers, commands that still failed count towards their quarantine.
+            for command in due:
+                self.capabilities.record(command, success=command not in failed, now=wall_now)
+            # All sensors drop the time of the restored readings, also when their reading didn't change.
+            update_all = self.restored_at is not None
+            self.restored_at = None
+            self._snapshot_store.async_delay_save(self._snapshot_to_save, STORAGE_SAVE_DELAY)
             _LOGGER.debug(
-                "Finished update, %s out of %s readings failed",
+                "Finished update, %s out of %s readings failed, %s cached",
                 failed_counter,
-                len(self._commands),
+                len(due),
+                len(self._commands) - len(due),
             )
 
-        return data
+        if self.last_update_success and not update_all:
+            self._changed = changed
+        return self._readings
+
+    async def _async_read_new_commands(self) -> None:
+        """Read the commands registered since the last update, and update their listeners."""
+        commands = [command for command in self._commands if command in self._new_commands]
+        self._new_commands.clear()
+        if not commands:
+            return
+
+        _LOGGER.debug("Read new commands %s", commands)
+        now = time.monotonic()
+        changed: set[int] = set()
+        failed: list[int] = []
+        try:
+            for chunk in self.kamstrup.plan_batches(commands, self.address):
+                values = await self._async_request(chunk)
+                failed.extend(self._store_values(chunk, values, changed))
+        except UpdateFailed:
+            # Not an update, the next update reads them again.
+            _LOGGER.debug("Reading new commands failed, they're read by the next update")
+            return
+
+        # Failed commands aren't cached, the next update tries them again.
+        for command in failed:
+            if self._readings.set(command, None, None):
+                changed.add(command)
+        self._cache_values(commands, now)
+        self._changed = changed
+        self.async_update_listeners()
+
+    async def async_shutdown(self) -> None:
+        """Cancel any scheduled refresh, including a pending read of new commands and streaming."""
+        await super().async_shutdown()
+        self._new_commands_debouncer.async_shutdown()
+        self._stream_until = -math.inf
+        if self._stream_task is not None:
+            self._stream_task.cancel()
+        if self._stream_publish is not None:
+            self._stream_publish.cancel()
+            self._stream_publish = None
+
+    @property
+    def streaming(self) -> bool:
+        """Whether commands are streamed."""
+        return self._stream_task is not None and time.monotonic() < self._stream_until
+
+    @callback
+    def async_start_streaming(self, commands: list[int], duration: float) -> None:
+        """Read registered commands back to back for `duration` seconds, on top of the updates.
+
+        Starting again while streaming replaces the commands and the deadline. Listeners are updated
+        at most every STREAM_PUBLISH_INTERVAL, with the latest readings, readings in between aren't queued.
+        """
+        _LOGGER.debug("Stream commands %s for %s seconds", commands, duration)
+        self._stream_commands = commands
+        self._stream_until = time.monotonic() + duration
+        if self._stream_task is None:
+            self._stream_task = self.hass.async_create_background_task(self._async_stream(), f"{DOMAIN} {self.address} streaming")
+
+    @callback
+    def async_stop_streaming(self) -> None:
+        """Stop streaming, after the request that is in progress."""
+        self._stream_until = -math.inf
+
+    async def _async_stream(self) -> None:
+        """Read the streamed commands until the deadline, the updates keep their schedule."""
+        try:
+            while (now := time.monotonic()) < self._stream_until:
+                # Commands that are unregistered while streaming aren't read anymore.
+                if not (commands := [command for command in self._stream_commands if command in self._commands]):
+                    break
+                failed: list[int] = []
+                try:
+                    for chunk in self.kamstrup.plan_batches(commands, self.address):
+                        values = await self._async_request(chunk)
+                        failed.extend(self._store_values(chunk, values, self._stream_changed))
+                except UpdateFailed:
+                    await asyncio.sleep(STREAM_RETRY_DELAY)
+                    continue
+
+                # The streamed readings are fresh, the updates don't read them again until they expire.
+                self._cache_values([command for command in commands if command not in failed], now)
+                self._schedule_stream_publish()
+                # Let the event loop run, even when the client answers without waiting.
+                await asyncio.sleep(0)
+        finally:
+            if self._stream_task is asyncio.current_task():
+                self._stream_task = None
+            _LOGGER.debug("Stopped streaming")
+
+    @callback
+    def _schedule_stream_publish(self) -> None:
+        """Update the listeners with the streamed readings, unless an update of the listeners is already pending."""
+        if self._stream_publish is not None:
+            return
+        delay = max(0.0, self._stream_published + STREAM_PUBLISH_INTERVAL - time.monotonic())
+        self._stream_publish = self.hass.loop.call_later(delay, self._publish_stream)
+
+    @callback
+    def _publish_stream(self) -> None:
+        """Update the listeners of the streamed commands whose reading changed."""
+        self._stream_publish = None
+        self._stream_published = time.monotonic()
+        changed, self._stream_changed = self._stream_changed, set()
+        if changed:
+            self._changed = changed
+            self.async_update_listeners()
+
+    @callback
+    def async_update_listeners(self) -> None:
+        """Update the listeners of commands whose reading changed, and listeners without a command.
+
+        All listeners are updated when the changes aren't known, e.g. when the update failed.
+        """
+        changed, self._changed = self._changed, None
+        if changed is None:
+            super().async_update_listeners()
+            return
+
+        _LOGGER.debug("Readings of %s changed", changed)
+        for update_callback, context in list(self._listeners.values()):
+            if context is None or context in changed:
+                update_callback()
+
+    def _cached_commands(self, now: float) -> set[int]:
+        """Registered commands with a reading that is still valid at the next update."""
+        # Values expiring within half an update interval are read now, instead of an update late.
+        now += self.update_interval.total_seconds() / 2 if self.update_interval else 0
+        return {command for command in self._commands if self._cache.get(command, -math.inf) > now}
+
+    def _cache_values(self, commands: list[int], now: float) -> None:
+        """Cache the values read for commands, until they're due again."""
+        for command in commands:
+            if (reading := self._readings.get(command)) is not None and reading.value is not None:
+                self._cache[command] = now + self._ttl(command)
+
+    async def _async_request(self, chunk: list[int], *, single: bool = False) -> dict[int, tuple[Any, str | None]] | None:
+        """Request the values of a chunk of commands, with `single` the chunk is a single command requested on its own."""
+        _LOGGER.debug("Get values for %s", chunk)
+
+        try:
+            if single:
+                value, unit = await self.kamstrup.get_value(chunk[0], dest_addr=self.address)
+                return None if value is None else {chunk[0]: (value, unit)}
+            return await self.kamstrup.get_values(chunk, dest_addr=self.address)
+        except SerialException as exception:
+            _LOGGER.warning("Device disconnected or multiple access on port?")
+            raise UpdateFailed from exception
+        except Exception as exception:
+            _LOGGER.warning("Error reading multiple %s \nException: %s", chunk, exception)
+            raise UpdateFailed from exception
+
+    def _store_values(self, chunk: list[int], values: dict[int, tuple[Any, str | None]] | None, changed: set[int]) -> list[int]:
+        """Store the values received for a chunk in the readings, adds the commands whose reading changed to `changed`.
+
+        Returns the commands that failed.
+        """
+        if values is None:
+            _LOGGER.debug("No values returned for chunk %s", chunk)
+            return chunk
+
+        failed = []
+        for command in chunk:
+            value, unit = values.get(command, (None, None))
+            # A register the meter answered without a value failed as well, it's retried like a missing one.
+            if value is None:
+                _LOGGER.debug("No value for sensor %s", command)
+                failed.append(command)
+                continue
+            if self._readings.set(command, value, unit):
+                changed.add(command)
+            _LOGGER.debug("New value for sensor %s, value: %s %s", command, value, unit)
+        return failed
+
+    async def _async_retry(self, failed: list[int], changed: set[int]) -> list[int]:
+        """Request failed commands again, within the retry budget, returns the commands that still failed.
+
+        The failed commands are requested together first, those that fail again are requested one by one.
+        """
+        budget = self.retry_budget
+        for single in (False, True):
+            chunks = [[command] for command in failed] if single else self.kamstrup.plan_batches(failed, self.address)
+            failed = []
+            for chunk in chunks:
+                if budget <= 0:
+                    failed.extend(chunk)
+                    continue
+                budget -= 1
+                _LOGGER.debug("Retry %s", chunk)
+                values = await self._async_request(chunk, single=single)
+                failed.extend(self._store_values(chunk, values, changed))
+        return failed
+
+    def _fallback_baudrate(self) -> None:
+        """Store the next slower baudrate when the meter hasn't answered for several updates, and reload the entry with it."""
+        slower = [baudrate for baudrate in BAUDRATES if baudrate < self.kamstrup.baudrate]
+        if self._failed_updates < BAUDRATE_FALLBACK_UPDATES or not slower or self.config_entry is None:
+            return
+
+        _LOGGER.warning("No readings at %s baud, falling back to %s baud", self.kamstrup.baudrate, max(slower))
+        self._failed_updates = 0
+        # The meter may just be unreachable for a while, the faster baudrates are probed again once it answers.
+        self.hass.config_entries.async_update_entry(
+            self.config_entry, data={**self.config_entry.data, CONF_BAUDRATE: max(slower), CONF_PROBE_BAUDRATE: True}
+        )
+        self.hass.config_entries.async_schedule_reload(self.config_entry.entry_id)
+
+    def _probe_baudrate_again(self) -> None:
+        """Remove the stored baudrate when it isn't confirmed, and reload the entry to probe from the fastest baudrate."""
+        if self.config_entry is None or not self.config_entry.data.get(CONF_PROBE_BAUDRATE):
+            return
+
+        _LOGGER.info("Meter answers at %s baud, probing the faster baudrates again", self.kamstrup.baudrate)
+        data = {key: value for key, value in self.config_entry.data.items() if key not in (CONF_BAUDRATE, CONF_PROBE_BAUDRATE)}
+        self.hass.config_entries.async_update_entry(self.config_entry, data=data)
+        self.hass.config_entries.async_schedule_reload(self.config_entry.entry_id)
@@ -12,6 +12,10 @@ async def async_get_config_entry_diagnostics(_hass: HomeAssistant, config_entry:
 
     return {
         "config_entry": config_entry.as_dict(),
-        "data": coordinator.data,
+        "data": coordinator.data.as_dict() if coordinator.data is not None else None,
+        "restored_at": coordinator.restored_at,
         "registered_commands": coordinator.commands,
+        "capabilities": coordinator.capabilities.as_dict(),
+        "frame_cache": coordinator.kamstrup.frame_cache_info(),
+        "trace": coordinator.kamstrup.trace(),
     }
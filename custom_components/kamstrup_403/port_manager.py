@@ -0,0 +1,84 @@
+"""Shared serial ports for kamstrup_403."""
+
+import asyncio
+import logging
+from collections.abc import Callable, Mapping
+from dataclasses import dataclass
+from typing import Any
+
+from homeassistant.core import HomeAssistant
+
+from .const import DOMAIN
+from .pykamstrup.kamstrup import Kamstrup
+
+_LOGGER: logging.Logger = logging.getLogger(__package__)
+
+DATA_PORT_MANAGER = "port_manager"
+
+
+@dataclass
+class SharedPort:
+    """A connection to a port and the number of config entries using it."""
+
+    client: Kamstrup
+    users: int = 0
+
+
+class KamstrupPortManager:
+    """Hands out a single Kamstrup connection per port, shared by all config entries using that port.
+
+    The Kamstrup client handles one request at a time, in the order they're made,
+    so entries sharing a port take turns instead of fighting over the device.
+    """
+
+    def __init__(self) -> None:
+        """Initialize."""
+        self._ports: dict[str, SharedPort] = {}
+        self._lock = asyncio.Lock()
+
+    @property
+    def ports(self) -> dict[str, SharedPort]:
+        """The ports in use."""
+        return self._ports
+
+    async def async_acquire(self, port: str, factory: Callable[..., Kamstrup], settings: Mapping[str, Any]) -> Kamstrup:
+        """Get the connection to a port, it's created with `factory(**settings)` and connected when not in use yet.
+
+        The settings are those of the line, shared by all meters on it. When the port is in use with other settings,
+        the shared connection changes to the new ones.
+        """
+        async with self._lock:
+            shared = self._ports.get(port)
+            if shared is None:
+                client = factory(**settings)
+                await client.connect()
+                shared = self._ports[port] = SharedPort(client)
+            elif await shared.client.configure(**settings):
+                _LOGGER.warning("Settings of %s changed, they apply to all meters on the port", port)
+            else:
+                _LOGGER.debug("Sharing the connection to %s", port)
+            shared.users += 1
+            return shared.client
+
+    async def async_release(self, port: str) -> None:
+        """Stop using a port, the connection is closed when it was the last user.
+
+        Requests that are still waiting are served first, the closed connection isn't opened again by later ones.
+        """
+        async with self._lock:
+            shared = self._ports.get(port)
+            if shared is None:
+                return
+            shared.users -= 1
+            if shared.users > 0:
+                return
+            del self._ports[port]
+            await shared.client.close()
+
+
+def get_port_manager(hass: HomeAssistant) -> KamstrupPortManager:
+    """Get the port manager, shared by all config entries."""
+    domain_data = hass.data.setdefault(DOMAIN, {})
+    if DATA_PORT_MANAGER not in domain_data:
+        domain_data[DATA_PORT_MANAGER] = KamstrupPortManager()
+    return domain_data[DATA_PORT_MANAGER]
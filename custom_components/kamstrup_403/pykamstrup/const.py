@@ -1,7 +1,26 @@
 """Constants for PyKamstrup."""
 
+from enum import StrEnum
 from typing import Final
 
+# Address of a meter, when not configured otherwise.
+DEFAULT_DEST_ADDR: Final = 0x3F
+
+# Baudrates to probe, fastest first.
+BAUDRATES: Final = (19200, 9600, 4800, 2400, 1200)
+
+# Maximum size of a response frame on the line, including byte stuffing.
+FRAME_SIZE_MAX: Final = 512
+
+
+class EchoMode(StrEnum):
+    """Whether the optical head echoes the request before the meter's response."""
+
+    AUTO = "auto"
+    ALWAYS = "always"
+    NEVER = "never"
+
+
 ESCAPES: Final = {
     0x06: True,
     0x0D: True,
@@ -9,111 +9,343 @@
 
 import asyncio
 import logging
-import math
+import time
+from collections import OrderedDict, deque
+from collections.abc import Iterable, Sequence
+from decimal import Decimal
+from typing import cast
 
 import serialx
 
-from .const import ESCAPES, UNITS
+from .const import BAUDRATES, DEFAULT_DEST_ADDR, ESCAPES, FRAME_SIZE_MAX, UNITS, EchoMode
+from .protocol import FrameAssembler, KamstrupProtocol
 
 _LOGGER: logging.Logger = logging.getLogger(__package__)
 MULTIPLE_NBR_MAX: int = 8
-
-
-class Kamstrup:
+_READ_SIZE: int = 256
+_FRAME_CACHE_SIZE: int = 32
+_TRACE_SIZE: int = 32
+# A character on the line is a start bit, 8 data bits and 2 stop bits.
+_CHAR_BITS: int = 11
+# Silence allowed between bytes of a response, in character times, and its lower bound in seconds.
+_INTER_BYTE_CHARS: int = 20
+_INTER_BYTE_TIMEOUT_MIN: float = 0.05
+# Margin on the transmission time of a whole frame.
+_FRAME_TIME_MARGIN: float = 2.0
+# Register read when probing the baudrate, the serial number is cheap and always available.
+_PROBE_NBR: int = 1001
+# Registers read when probing the batch size, available on all meters.
+_PROBE_BATCH_NBRS: tuple[int, ...] = (60, 68, 74, 80, 86, 87, 89, 1004)
+# Requests for a number of registers without an answer before the meter is taken not to answer that many, one can get lost.
+_PROBE_BATCH_ATTEMPTS: int = 2
+
+
+def _crc_1021_table() -> tuple[int, ...]:
+    """Precompute the CRC-16 (polynomial 0x1021) remainder for every byte value."""
+    table = []
+    for byte in range(256):
+        reg = byte << 8
+        for _ in range(8):
+            reg = (reg << 1) ^ 0x1021 if reg & 0x8000 else reg << 1
+        table.append(reg & 0xFFFF)
+    return tuple(table)
+
+
+_CRC_TABLE: tuple[int, ...] = _crc_1021_table()
+# Powers of ten for every exponent that fits the 6 exponent bits.
+_POW10: tuple[int, ...] = tuple(10**exp for exp in range(64))
+
+
+class Kamstrup:  # pylint: disable=too-many-instance-attributes
     """Kamstrup Meter Protocol (KMP)."""
 
     reader: asyncio.StreamReader | None
     writer: asyncio.StreamWriter | None
-
-    def __init__(self, url: str, baudrate: int, timeout: float) -> None:
-        """Initialize."""
+    protocol: KamstrupProtocol | None
+
+    def __init__(  # noqa: PLR0913 # pylint: disable=too-many-arguments
+        self,
+        url: str,
+        baudrate: int,
+        timeout: float,
+        inter_byte_timeout: float | None = None,
+        trace_size: int = _TRACE_SIZE,
+        *,
+        exact: bool = False,
+        use_protocol: bool = False,
+        echo_mode: EchoMode = EchoMode.AUTO,
+    ) -> None:
+        """Initialize.
+
+        `timeout` is the time the meter gets to start answering, `inter_byte_timeout` the silence
+        allowed between bytes once the answer has started. When omitted, it's derived from the baudrate.
+        The last `trace_size` frames sent and received are kept for diagnostics, 0 disables this.
+        With `exact`, values are returned as Decimal instead of float.
+        With `use_protocol`, the connection uses a KamstrupProtocol instead of a stream reader and writer.
+        With `echo_mode` ALWAYS, the echo of every request is verified so a broken line fails right away,
+        with AUTO whether there is an echo is detected on the first response after connecting.
+        """
         self.url = url
         self.baudrate = baudrate
         self.timeout = timeout
+        self.exact = exact
+        self._inter_byte_timeout = inter_byte_timeout
+        self.inter_byte_timeout = inter_byte_timeout or self._derive_inter_byte_timeout(baudrate)
+        self.use_protocol = use_protocol
+        self.echo_mode = echo_mode
+        self.echo_detected: bool | None = None
         self.reader = None
         self.writer = None
+        self.protocol = None
+        self._frame_cache: OrderedDict[tuple[int, int, tuple[int, ...]], bytes] = OrderedDict()
+        self._frame_cache_hits = 0
+        self._frame_cache_misses = 0
+        self._trace_buffer: deque[tuple[float, str, bytes]] = deque(maxlen=trace_size)
+        self._request = b""
+        # Learned per meter address: registers per request.
+        self._batch_sizes: dict[int, int] = {}
+        # One request at a time, waiting requests are served in order.
+        self._lock = asyncio.Lock()
+        self._closed = False
 
     async def connect(self) -> None:
         """Connect to the serial device."""
-        if self.reader is None or self.writer is None:
+        if self._closed:
+            msg = "Connection is closed"
+            raise RuntimeError(msg)
+        if self.use_protocol:
+            if self.protocol is None or self.protocol.transport is None:
+                _, protocol = await serialx.create_serial_connection(
+                    asyncio.get_running_loop(), KamstrupProtocol, url=self.url, baudrate=self.baudrate
+                )
+                self.protocol = cast("KamstrupProtocol", protocol)
+                self.echo_detected = None
+        elif self.reader is None or self.writer is None:
             self.reader, self.writer = await serialx.open_serial_connection(url=self.url, baudrate=self.baudrate)
+            self.echo_detected = None
 
     async def disconnect(self) -> None:
         """Disconnect from the serial device."""
+        if self.protocol:
+            if self.protocol.transport:
+                self.protocol.transport.close()
+            self.protocol = None
         if self.writer:
             self.writer.close()
             await self.writer.wait_closed()
             self.reader = None
             self.writer = None
 
+    async def close(self) -> None:
+        """Disconnect for good, after the requests waiting for their turn. Later requests fail instead of connecting again."""
+        async with self._lock:
+            self._closed = True
+            await self.disconnect()
+
+    @staticmethod
+    def _derive_inter_byte_timeout(baudrate: int) -> float:
+        """Inter byte timeout for a baudrate, when it isn't given."""
+        return max(_INTER_BYTE_TIMEOUT_MIN, _INTER_BYTE_CHARS * _CHAR_BITS / baudrate)
+
+    async def set_baudrate(self, baudrate: int) -> None:
+        """Change the baudrate, the next request reconnects at the new rate."""
+        async with self._lock:
+            if baudrate == self.baudrate:
+                return
+            await self.disconnect()
+            self.baudrate = baudrate
+            self.inter_byte_timeout = self._inter_byte_timeout or self._derive_inter_byte_timeout(baudrate)
+
+    async def configure(
+        self,
+        baudrate: int,
+        timeout: float,  # noqa: ASYNC109
+        inter_byte_timeout: float | None = None,
+        *,
+        echo_mode: EchoMode = EchoMode.AUTO,
+    ) -> bool:
+        """Change the settings of the line, returns whether any setting changed.
+
+        A new baudrate reconnects on the next request, a new echo mode detects the echo again.
+        """
+        changed = (baudrate, timeout, inter_byte_timeout, echo_mode) != (self.baudrate, self.timeout, self._inter_byte_timeout, self.echo_mode)
+        await self.set_baudrate(baudrate)
+        async with self._lock:
+            self.timeout = timeout
+            self._inter_byte_timeout = inter_byte_timeout
+            self.inter_byte_timeout = inter_byte_timeout or self._derive_inter_byte_timeout(self.baudrate)
+            if echo_mode != self.echo_mode:
+                self.echo_mode = echo_mode
+                self.echo_detected = None
+        return changed
+
+    async def probe_baudrate(self, baudrates: Sequence[int] = BAUDRATES, nbr: int = _PROBE_NBR, dest_addr: int = DEFAULT_DEST_ADDR) -> int | None:
+        """Find the fastest baudrate the meter at `dest_addr` answers at, by reading a register at each rate from fast to slow.
+
+        The connection is left at the rate found, or at the original rate when the meter didn't answer at all.
+        """
+        original = self.baudrate
+        for baudrate in sorted(baudrates, reverse=True):
+            await self.set_baudrate(baudrate)
+            try:
+                value, _ = await self.get_value(nbr, dest_addr)
+            except serialx.SerialException as exception:
+                _LOGGER.debug("Probing %i baud failed: %s", baudrate, exception)
+                continue
+            if value is not None:
+                _LOGGER.debug("Meter answers at %i baud", baudrate)
+                return baudrate
+            _LOGGER.debug("No answer at %i baud", baudrate)
+
+        await self.set_baudrate(original)
+        return None
+
     @classmethod
-    def _crc_1021(cls, message: tuple[int, ...]) -> int:
-        """Kamstrup uses the "true" CCITT CRC-16."""
-        poly = 0x1021
-        reg = 0x0000
+    def _crc_1021(cls, message: Iterable[int], reg: int = 0x0000) -> int:
+        """Kamstrup uses the "true" CCITT CRC-16.
+
+        Works on any iterable of byte values (bytes, bytearray, memoryview, tuple).
+        Pass the result of a previous call as `reg` to continue the checksum
+        incrementally, e.g. while a frame is still arriving.
+        """
+        table = _CRC_TABLE
         for byte in message:
-            mask = 0x80
-            while mask > 0:
-                reg <<= 1
-                if byte & mask:
-                    reg |= 1
-                mask >>= 1
-                if reg & 0x10000:
-                    reg &= 0xFFFF
-                    reg ^= poly
+            reg = (((reg << 8) & 0xFF00) | byte) ^ table[reg >> 8]
         return reg
 
-    def _debug(self, msg: str, byte_array: bytearray) -> None:
-        """Log a debug message with a byte array."""
-        log = f"{msg}:"
-        for byte in byte_array:
-            log += f" {byte:02x}"
-        _LOGGER.debug(log)
+    def _trace(self, direction: str, frame: bytes | bytearray) -> None:
+        """Keep a raw frame in the trace buffer and log it when debug logging is enabled."""
+        if self._trace_buffer.maxlen:
+            self._trace_buffer.append((time.monotonic(), direction, bytes(frame)))
+        if _LOGGER.isEnabledFor(logging.DEBUG):
+            _LOGGER.debug("%s: %s", direction, frame.hex(" "))
+
+    def trace(self) -> list[dict[str, str | float]]:
+        """The last raw frames sent (TX) and received (RX), oldest first."""
+        now = time.monotonic()
+        return [
+            {"age": round(now - timestamp, 3), "direction": direction, "frame": frame.hex(" ")} for timestamp, direction, frame in self._trace_buffer
+        ]
 
     async def _ensure_connected(self) -> None:
         """Make sure the connection is established."""
-        if self.reader is None or self.writer is None:
+        if self.use_protocol:
+            if self.protocol is None or self.protocol.transport is None:
+                await self.connect()
+        elif self.reader is None or self.writer is None:
             await self.connect()
 
-    async def _write(self, data: tuple[int, ...]) -> None:
+    async def _write(self, data: bytes) -> None:
         """Write directly to the meter."""
         await self._ensure_connected()
+        self._request = data
+        if self.protocol is not None:
+            self._trace("TX", data)
+            self.protocol.send(data, self.timeout, self.inter_byte_timeout, self._expected_echo())
+            return
         if self.writer is None:
             msg = "Writer not available"
             raise RuntimeError(msg)
-        bytearray_data = bytearray(data)
-        self._debug("Write", bytearray_data)
-        self.writer.write(bytearray_data)
+        self._trace("TX", data)
+        self.writer.write(data)
         await self.writer.drain()
 
-    async def _read(self) -> int | None:
-        """Read directly from the meter."""
+    def _expected_echo(self) -> bytes | None:
+        """The echo that must precede the response to the last request, None when it's not verified."""
+        if self.echo_mode is EchoMode.ALWAYS or (self.echo_mode is EchoMode.AUTO and self.echo_detected):
+            return self._request
+        return None
+
+    def _detect_echo(self, skipped: bytes | bytearray) -> None:
+        """Detect the echo from the data that preceded the first response."""
+        if self._request and skipped.startswith(self._request):
+            self.echo_detected = True
+        elif not skipped:
+            self.echo_detected = False
+        else:
+            # Noise on the line, try again on the next response.
+            return
+        _LOGGER.debug("Echo detected: %s", self.echo_detected)
+
+    def _frame_timeout(self, length: int) -> float:
+        """Deadline for receiving `length` bytes: the meter starting to answer plus the transmission time with margin."""
+        return self.timeout + self.inter_byte_timeout + length * _CHAR_BITS / self.baudrate * _FRAME_TIME_MARGIN
+
+    @staticmethod
+    def _exchange_length(count: int) -> int:
+        """Estimate the bytes on the line when requesting `count` registers, the echo and the response."""
+        # Echo: prefix, address, CID, count, 2 bytes per register, CRC and end byte.
+        # Response: start byte, address, CID, ~9 bytes per register, CRC and end byte.
+        return (6 + 2 * count) + (6 + 9 * count)
+
+    async def _read(self, wait: float | None = None) -> bytes | None:
+        """Read whatever the meter has sent so far, waiting up to `wait` seconds (default `timeout`) for at least one byte."""
         await self._ensure_connected()
         if self.reader is None:
             msg = "Reader not available"
             raise RuntimeError(msg)
         try:
-            data = await asyncio.wait_for(self.reader.read(1), timeout=self.timeout)
-            if len(data) == 0:
-                _LOGGER.debug("Rx Timeout")
-                return None
-            bytearray_data = bytearray(data)
-            self._debug("Read", bytearray(bytearray_data))
-            return bytearray_data[0]
+            data = await asyncio.wait_for(self.reader.read(_READ_SIZE), timeout=self.timeout if wait is None else wait)
         except TimeoutError:
             _LOGGER.debug("Rx Timeout")
             return None
+        if len(data) == 0:
+            _LOGGER.debug("Rx Timeout")
+            return None
+        return data
+
+    async def _read_frame(self, expected_length: int) -> bytearray | None:
+        """Read a complete response frame, from the start byte up to and including the end byte.
+
+        The meter gets `timeout` to start its response, then `inter_byte_timeout` between bytes.
+        The whole frame must arrive within a deadline based on the `expected_length`.
+        The frame, or whatever was received of it, is traced as a whole.
+        """
+        if self.protocol is not None:
+            frame = await self.protocol.receive(self._frame_timeout(expected_length))
+            assembler = self.protocol.assembler
+        else:
+            frame, assembler = await self._read_stream_frame(expected_length)
+
+        if frame is not None:
+            self._trace("RX", frame)
+            if self.echo_mode is EchoMode.AUTO and self.echo_detected is None:
+                self._detect_echo(assembler.skipped)
+        elif assembler.started:
+            self._trace("RX", assembler.buffer)
+        return frame
+
+    async def _read_stream_frame(self, expected_length: int) -> tuple[bytearray | None, FrameAssembler]:
+        """Read a complete response frame from the stream reader."""
+        assembler = FrameAssembler()
+        assembler.reset(self._expected_echo())
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self._frame_timeout(expected_length)
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                _LOGGER.debug("Rx Timeout, frame deadline exceeded")
+                return None, assembler
+            wait = self.inter_byte_timeout if assembler.started else self.timeout
+            data = await self._read(min(wait, remaining))
+            if data is None:
+                return None, assembler
+            frame = assembler.feed(data)
+            if frame is not None:
+                return frame, assembler
+            if assembler.error is not None:
+                return None, assembler
 
-    async def _send(self, pfx: int, message: tuple[int, ...]) -> None:
-        """Construct the message and send to the meter."""
+    @classmethod
+    def _encode(cls, pfx: int, message: tuple[int, ...]) -> bytes:
+        """Construct the frame to send to the meter."""
         bytearray_data = bytearray(message)
-        bytearray_data.append(0)
-        bytearray_data.append(0)
-        crc = self._crc_1021(tuple(bytearray_data))
-        bytearray_data[-2] = crc >> 8
-        bytearray_data[-1] = crc & 0xFF
+        # The CRC is calculated over the message followed by two zero bytes.
+        crc = cls._crc_1021(bytes(2), cls._crc_1021(bytearray_data))
+        bytearray_data.append(crc >> 8)
+        bytearray_data.append(crc & 0xFF)
 
-        send_data = [pfx]
+        send_data = bytearray([pfx])
         for i in bytearray_data:
             if i in ESCAPES:
                 send_data.append(0x1B)
@@ -121,87 +353,204 @@ class Kamstrup:
             else:
                 send_data.append(i)
         send_data.append(0x0D)
-        await self._write(tuple(send_data))
-
-    async def _receive(self) -> bytearray | None:
-        """Receive data."""
-        # Skip first response, which is repetition of initial command,
-        # only break on 0x0d if it comes after 0x40.
-        bytearray_data = None
-        resp_start = 0x40
-        resp_end = 0x0D
-        while True:
-            data = await self._read()
-            if data is None:
-                return None
-            if data == resp_start:
-                bytearray_data = bytearray()
-            if bytearray_data is not None:
-                bytearray_data.append(data)
-                if data == resp_end:
+        return bytes(send_data)
+
+    def _request_frame(self, dest_addr: int, cid: int, multiple_nbr: tuple[int, ...]) -> bytes:
+        """Get the encoded frame requesting the given registers, from cache when possible."""
+        key = (dest_addr, cid, multiple_nbr)
+        frame = self._frame_cache.get(key)
+        if frame is not None:
+            self._frame_cache_hits += 1
+            self._frame_cache.move_to_end(key)
+            return frame
+
+        self._frame_cache_misses += 1
+        req = [dest_addr, cid, len(multiple_nbr)]
+        for nbr in multiple_nbr:
+            req.append(nbr >> 8)
+            req.append(nbr & 0xFF)
+        frame = self._frame_cache[key] = self._encode(0x80, tuple(req))
+        if len(self._frame_cache) > _FRAME_CACHE_SIZE:
+            self._frame_cache.popitem(last=False)
+        return frame
+
+    def frame_cache_info(self) -> dict[str, int]:
+        """Statistics of the request frame cache."""
+        return {
+            "hits": self._frame_cache_hits,
+            "misses": self._frame_cache_misses,
+            "size": len(self._frame_cache),
+            "max_size": _FRAME_CACHE_SIZE,
+        }
+
+    def batch_size(self, dest_addr: int = DEFAULT_DEST_ADDR) -> int:
+        """The number of registers the meter at `dest_addr` answers in a single request."""
+        return self._batch_sizes.get(dest_addr, MULTIPLE_NBR_MAX)
+
+    def set_batch_size(self, size: int, dest_addr: int = DEFAULT_DEST_ADDR) -> None:
+        """Set the number of registers the meter at `dest_addr` answers in a single request, e.g. a stored probe result."""
+        self._batch_sizes[dest_addr] = max(1, min(size, MULTIPLE_NBR_MAX))
+
+    async def probe_batch_size(self, multiple_nbr: Sequence[int] = _PROBE_BATCH_NBRS, dest_addr: int = DEFAULT_DEST_ADDR) -> int | None:
+        """Find the largest number of registers the meter at `dest_addr` answers in a single request.
+
+        Starts with all registers, up to MULTIPLE_NBR_MAX, and then searches between the largest number the
+        meter answered and the smallest number it didn't. A number is requested again before it counts as not answered.
+        """
+        size = min(len(multiple_nbr), MULTIPLE_NBR_MAX)
+        answered, failed = 0, size + 1
+        while failed - answered > 1:
+            for _ in range(_PROBE_BATCH_ATTEMPTS):
+                if await self.get_values(list(multiple_nbr[:size]), dest_addr) is not None:
+                    answered = size
                     break
+            else:
+                failed = size
+            size = (answered + failed) // 2
+        if not answered:
+            return None
+        _LOGGER.debug("Meter at %s answers %i registers at once", dest_addr, answered)
+        self._batch_sizes[dest_addr] = answered
+        return answered
+
+    def plan_batches(self, multiple_nbr: Sequence[int], dest_addr: int = DEFAULT_DEST_ADDR) -> list[list[int]]:
+        """Split registers in as few requests as possible, in order, within the batch size of the meter at `dest_addr`."""
+        batch_size = self.batch_size(dest_addr)
+        return [list(multiple_nbr[index : index + batch_size]) for index in range(0, len(multiple_nbr), batch_size)]
+
+    async def discover_registers(self, multiple_nbr: Sequence[int], dest_addr: int = DEFAULT_DEST_ADDR) -> dict[int, bool]:
+        """Find which of the registers the meter at `dest_addr` supports.
+
+        Registers without a value in an answered request are asked once more on their own, so a short
+        response isn't mistaken for an unsupported register. Registers the meter didn't answer are left out.
+        """
+        supported: dict[int, bool] = {}
+        for batch in self.plan_batches(multiple_nbr, dest_addr):
+            values = await self.get_values(batch, dest_addr)
+            if values is None:
+                _LOGGER.debug("No answer for %s, support unknown", batch)
+                continue
+            for nbr in batch:
+                if values[nbr][0] is not None:
+                    supported[nbr] = True
+                elif (value := await self.get_values([nbr], dest_addr)) is not None:
+                    supported[nbr] = value[nbr][0] is not None
+        _LOGGER.debug("Meter at %s doesn't support %s", dest_addr, [nbr for nbr, ok in supported.items() if not ok])
+        return supported
+
+    @classmethod
+    def _unstuff(cls, frame: bytearray) -> tuple[bytearray, bool]:
+        """Strip the start and end byte and undo the byte stuffing of a frame.
 
+        Returns the payload without CRC and whether the CRC was valid.
+        """
         escape_byte = 0x1B
-        response_data = bytearray()
-        i = 1
-        while i < len(bytearray_data) - 1:
-            if bytearray_data[i] == escape_byte:
-                value = bytearray_data[i + 1] ^ 0xFF
-                if value not in ESCAPES:
-                    _LOGGER.debug("Missing Escape %02x", value)
-                response_data.append(value)
-                i += 2
-            else:
-                response_data.append(bytearray_data[i])
-                i += 1
-        if self._crc_1021(tuple(response_data)):
+        end = len(frame) - 1
+        index = frame.find(escape_byte, 1, end)
+        if index < 0:
+            payload = frame[1:end]
+        else:
+            # Copy the runs between the escape sequences into one buffer, and each sequence as the byte it escapes.
+            payload = bytearray()
+            start = 1
+            with memoryview(frame) as view:
+                while index >= 0:
+                    payload += view[start:index]
+                    value = frame[index + 1] ^ 0xFF
+                    if value not in ESCAPES:
+                        _LOGGER.debug("Missing Escape %02x", value)
+                    payload.append(value)
+                    start = index + 2
+                    index = frame.find(escape_byte, start, end)
+                payload += view[start:end]
+
+        crc_valid = cls._crc_1021(payload) == 0
+        del payload[-2:]
+        return payload, crc_valid
+
+    async def _receive(self, expected_length: int = FRAME_SIZE_MAX) -> bytearray | None:
+        """Receive data."""
+        bytearray_data = await self._read_frame(expected_length)
+        if bytearray_data is None:
+            return None
+
+        response_data, crc_valid = self._unstuff(bytearray_data)
+        if not crc_valid:
             _LOGGER.debug("CRC error")
-        return response_data[:-2]
+        return response_data
 
     @classmethod
-    def _process_response(cls, nbr: int, data: bytearray) -> tuple[float | None, str | None]:
-        """Process a response."""
-        if data[0] != nbr >> 8 or data[1] != nbr & 0xFF:
+    def _process_response(
+        cls, nbr: int, data: bytes | bytearray | memoryview, offset: int = 0, *, exact: bool = False
+    ) -> tuple[float | Decimal | None, str | None]:
+        """Process the response for a register, starting at `offset` in the data."""
+        if data[offset] != nbr >> 8 or data[offset + 1] != nbr & 0xFF:
             _LOGGER.debug("NBR error")
             return (None, None)
 
-        unit = UNITS.get(data[2], None)
+        unit = UNITS.get(data[offset + 2], None)
 
-        # Decode the mantissa.
-        value: float = 0.0
-        for i in range(data[3]):
-            value = (value * 256) + data[i + 5]
+        # Decode the mantissa, bit 7 of sigexp is the sign.
+        size = data[offset + 3]
+        sigexp = data[offset + 4]
+        mantissa = int.from_bytes(data[offset + 5 : offset + 5 + size])
+        if sigexp & 0x80:
+            mantissa = -mantissa
 
-        # Decode the exponent.
-        exp_val = data[4] & 0x3F
-        if data[4] & 0x40:
-            exp_val = -exp_val
-        exp = math.pow(10, exp_val)
-        if data[4] & 0x80:
-            exp = -exp
-        value *= exp
+        # Decode the exponent, bit 6 of sigexp is its sign.
+        exp = sigexp & 0x3F
+        if exact:
+            return Decimal(mantissa).scaleb(-exp if sigexp & 0x40 else exp), unit
+        # Integer math up to a single, correctly rounded, conversion to float.
+        if sigexp & 0x40:
+            return mantissa / _POW10[exp], unit
+        return float(mantissa * _POW10[exp]), unit
 
-        return value, unit
+    @classmethod
+    def _parse_registers(
+        cls, multiple_nbr: Sequence[int], data: bytes | bytearray, offset: int = 0, *, exact: bool = False
+    ) -> dict[int, tuple[float | Decimal | None, str | None]]:
+        """Parse the responses for all registers in a single pass over the data, starting at `offset`.
+
+        Registers beyond the end of a short response get no value.
+        """
+        result: dict[int, tuple[float | Decimal | None, str | None]] = {}
+        with memoryview(data) as view:
+            length = len(view)
+            for nbr in multiple_nbr:
+                # nbr (2) + units (1) + length (1) + sigexp (1) (=5) + length of actual value.
+                if offset + 5 > length or (end := offset + 5 + view[offset + 3]) > length:
+                    _LOGGER.debug("Short response, no data for %s", nbr)
+                    result[nbr] = (None, None)
+                    offset = length
+                    continue
+                result[nbr] = cls._process_response(nbr, view, offset, exact=exact)
+                offset = end
 
-    async def get_value(self, nbr: int) -> tuple[None, None] | tuple[float | None, str | None]:
-        """Get a value from the meter."""
-        await self._send(0x80, (0x3F, 0x10, 0x01, nbr >> 8, nbr & 0xFF))
+        return result
+
+    async def get_value(self, nbr: int, dest_addr: int = DEFAULT_DEST_ADDR) -> tuple[None, None] | tuple[float | Decimal | None, str | None]:
+        """Get a value from the meter at `dest_addr`."""
+        cid = 0x10
+        async with self._lock:
+            await self._write(self._request_frame(dest_addr, cid, (nbr,)))
+            bytearray_data = await self._receive(self._exchange_length(1))
 
-        bytearray_data = await self._receive()
         if bytearray_data is None:
             return (None, None)
 
-        dest_addr = 0x3F
-        cid = 0x10
-        if bytearray_data[0] != dest_addr or bytearray_data[1] != cid:
+        if len(bytearray_data) < 2 or bytearray_data[0] != dest_addr or bytearray_data[1] != cid:  # noqa: PLR2004
             return (None, None)
 
-        value, unit = self._process_response(nbr, bytearray_data[2:])
+        return self._parse_registers((nbr,), bytearray_data, 2, exact=self.exact)[nbr]
 
-        return (value, unit)
+    async def get_values(
+        self, multiple_nbr: list[int], dest_addr: int = DEFAULT_DEST_ADDR
+    ) -> dict[int, tuple[float | Decimal | None, str | None]] | None:
+        """Get values from the meter at `dest_addr`.
 
-    async def get_values(self, multiple_nbr: list[int]) -> dict[int, tuple[float | None, str | None]] | None:
-        """Get values from the meter."""
+        Requests to different meters on the same line take turns, one request at a time.
+        """
         if len(multiple_nbr) > MULTIPLE_NBR_MAX:
             multiple_nbr = multiple_nbr[:MULTIPLE_NBR_MAX]
             _LOGGER.warning(
@@ -210,39 +559,19 @@ class Kamstrup:
                 multiple_nbr,
             )
 
-        # Construct the request.
-        dest_addr = 0x3F
+        # Send the request and receive the response, without other requests in between.
         cid = 0x10
-        req = [dest_addr, cid, len(multiple_nbr)]
-        for nbr in multiple_nbr:
-            req.append(nbr >> 8)
-            req.append(nbr & 0xFF)
-        await self._send(0x80, tuple(req))
+        async with self._lock:
+            await self._write(self._request_frame(dest_addr, cid, tuple(multiple_nbr)))
+            bytearray_data = await self._receive(self._exchange_length(len(multiple_nbr)))
 
         # Process response.
-        bytearray_data = await self._receive()
         if bytearray_data is None:
             return None
 
         # Check destination address and CID.
-        if bytearray_data[0] != dest_addr or bytearray_data[1] != cid:
+        if len(bytearray_data) < 2 or bytearray_data[0] != dest_addr or bytearray_data[1] != cid:  # noqa: PLR2004
             return None
 
-        # Decode response data, containing multiple variables.
-        result = {}
-        remaining_data = bytearray_data[2:]
-        counter = 0
-
-        # Continue processing data until all variables have been processed.
-        while counter < (len(multiple_nbr)):
-            current_nbr = multiple_nbr[counter]
-            value, unit = self._process_response(current_nbr, remaining_data)
-            result[current_nbr] = (value, unit)
-            # length of current variable response data =
-            # nbr (2) + units (1) + length (1) + sigexp (1) (=5)
-            # + length of actual value.
-            len_current_nbr = 5 + remaining_data[3]
-            remaining_data = remaining_data[len_current_nbr:]
-            counter += 1
-
-        return result
+        # Decode response data, containing multiple variables, following the address and CID.
+        return self._parse_registers(multiple_nbr, bytearray_data, 2, exact=self.exact)
@@ -0,0 +1,189 @@
+"""Frame assembly and asyncio protocol for the Kamstrup Meter Protocol (KMP)."""
+
+import asyncio
+import logging
+
+from .const import FRAME_SIZE_MAX
+
+_LOGGER: logging.Logger = logging.getLogger(__package__)
+_SKIPPED_SIZE_MAX: int = 64
+
+
+class FrameAssembler:
+    """Assembles a KMP response frame from serial data as it arrives.
+
+    Data before the start byte, usually the echo of the request, is skipped and the first bytes
+    are kept for echo detection. When the echo is known to be there, it's verified instead.
+    """
+
+    def __init__(self) -> None:
+        """Initialize."""
+        self.buffer = bytearray()
+        self.skipped = bytearray()
+        self.error: str | None = None
+        self._echo = b""
+
+    @property
+    def started(self) -> bool:
+        """Whether the start byte of the response has been received."""
+        return len(self.buffer) > 0
+
+    def reset(self, echo: bytes | None = None) -> None:
+        """Prepare for a new response, which must be preceded by `echo` when given."""
+        self.buffer.clear()
+        self.skipped.clear()
+        self.error = None
+        self._echo = echo or b""
+
+    def feed(self, data: bytes | bytearray) -> bytearray | None:
+        """Add received data, returns the frame once it's complete.
+
+        When the data can't be a valid response, `error` is set.
+        """
+        if self.error is not None:
+            return None
+
+        if self._echo:
+            size = min(len(self._echo), len(data))
+            if data[:size] != self._echo[:size]:
+                self._fail("Echo mismatch")
+                return None
+            self._echo = self._echo[size:]
+            data = data[size:]
+
+        # Skip everything before the response,
+        # only break on 0x0d if it comes after 0x40.
+        resp_start = 0x40
+        resp_end = 0x0D
+        buffer = self.buffer
+        scan_from = len(buffer)
+        buffer += data
+
+        if scan_from == 0:
+            start = buffer.find(resp_start)
+            if start < 0:
+                self._skip(buffer)
+                buffer.clear()
+                return None
+            self._skip(buffer[:start])
+            del buffer[:start]
+            scan_from = 1
+
+        end = buffer.find(resp_end, scan_from)
+        if end < 0:
+            if len(buffer) > FRAME_SIZE_MAX:
+                self._fail(f"Frame exceeds {FRAME_SIZE_MAX} bytes")
+            return None
+
+        # A start byte never appears escaped inside a frame, use the last one before the end.
+        start = buffer.rfind(resp_start, 0, end)
+        frame = buffer[start : end + 1]
+        buffer.clear()
+        return frame
+
+    def _skip(self, data: bytes | bytearray) -> None:
+        """Keep the first skipped bytes, enough to recognize an echo."""
+        if len(self.skipped) < _SKIPPED_SIZE_MAX:
+            self.skipped += data[: _SKIPPED_SIZE_MAX - len(self.skipped)]
+
+    def _fail(self, error: str) -> None:
+        """Give up on the response."""
+        _LOGGER.debug(error)
+        self.error = error
+
+
+class KamstrupProtocol(asyncio.Protocol):
+    """Asyncio protocol that assembles KMP frames as data arrives and resolves the pending request.
+
+    There is a single reader, no coroutine is scheduled per byte or chunk. Timeouts are timer
+    callbacks: the first byte timeout runs from sending the request until the response starts,
+    after that the inter byte timeout is re-armed for every chunk of data.
+    """
+
+    def __init__(self) -> None:
+        """Initialize."""
+        self.transport: asyncio.WriteTransport | None = None
+        self.assembler = FrameAssembler()
+        self._response: asyncio.Future[bytearray | None] | None = None
+        self._timer: asyncio.TimerHandle | None = None
+        self._timeout = 0.0
+        self._inter_byte_timeout = 0.0
+
+    def connection_made(self, transport: asyncio.BaseTransport) -> None:
+        """Store the transport once the port is opened."""
+        if isinstance(transport, asyncio.WriteTransport):
+            self.transport = transport
+
+    def connection_lost(self, exc: Exception | None) -> None:
+        """Fail the pending request when the port is closed."""
+        self.transport = None
+        self._cancel_timer()
+        if self._response is not None and not self._response.done():
+            self._response.set_exception(exc or ConnectionError("Connection lost"))
+
+    def data_received(self, data: bytes) -> None:
+        """Feed received data to the frame assembler."""
+        if self._response is None or self._response.done():
+            _LOGGER.debug("Dropping unsolicited data")
+            return
+
+        frame = self.assembler.feed(data)
+        if frame is not None:
+            self._finish(frame)
+        elif self.assembler.error is not None:
+            self._finish(None)
+        else:
+            self._arm_timer(self._inter_byte_timeout if self.assembler.started else self._timeout)
+
+    def send(self, data: bytes, timeout: float, inter_byte_timeout: float, echo: bytes | None = None) -> None:
+        """Send a request, its response will resolve the next `receive`.
+
+        When `echo` is given, the response must be preceded by exactly this echo.
+        """
+        if self.transport is None:
+            msg = "Transport not available"
+            raise RuntimeError(msg)
+
+        self.assembler.reset(echo)
+        self._timeout = timeout
+        self._inter_byte_timeout = inter_byte_timeout
+        self._response = asyncio.get_running_loop().create_future()
+        self._arm_timer(timeout)
+        self.transport.write(data)
+
+    async def receive(self, frame_timeout: float) -> bytearray | None:
+        """Wait for the response frame to the last request, None on timeout."""
+        if self._response is None:
+            return None
+        try:
+            async with asyncio.timeout(frame_timeout):
+                return await self._response
+        except TimeoutError:
+            _LOGGER.debug("Rx Timeout, frame deadline exceeded")
+            return None
+        finally:
+            self._cancel_timer()
+            self._response = None
+
+    def _arm_timer(self, timeout: float) -> None:
+        """(Re)start the timer that ends the request when no data arrives in time."""
+        self._cancel_timer()
+        self._timer = asyncio.get_running_loop().call_later(timeout, self._on_timeout)
+
+    def _cancel_timer(self) -> None:
+        """Stop the timer."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _on_timeout(self) -> None:
+        """No data arrived in time."""
+        _LOGGER.debug("Rx Timeout")
+        self._timer = None
+        self._finish(None)
+
+    def _finish(self, frame: bytearray | None) -> None:
+        """Resolve the pending request."""
+        self._cancel_timer()
+        if self._response is not None and not self._response.done():
+            self._response.set_result(frame)
@@ -0,0 +1,83 @@
+"""Readings of the meter for kamstrup_403."""
+
+from collections.abc import Iterator, Mapping
+from decimal import Decimal
+from typing import Any, Self
+
+
+class Reading:  # pylint: disable=too-few-public-methods
+    """The value and unit of a register, updated in place by every update."""
+
+    __slots__ = ("unit", "value")
+
+    def __init__(self, value: float | Decimal | None = None, unit: str | None = None) -> None:
+        """Initialize."""
+        self.value = value
+        # Units are the strings of the unit table of the library, shared by all readings.
+        self.unit = unit
+
+    def as_dict(self) -> dict[str, Any]:
+        """The reading as a dictionary, for diagnostics and storage."""
+        return {"value": self.value, "unit": self.unit}
+
+
+class Readings:
+    """The readings of the registered commands.
+
+    A reading is created once for a command, after that updates only change its value and unit,
+    an update doesn't allocate anything for values that didn't change.
+    """
+
+    __slots__ = ("_readings",)
+
+    def __init__(self) -> None:
+        """Initialize."""
+        self._readings: dict[int, Reading] = {}
+
+    def __contains__(self, command: object) -> bool:
+        """Whether there is a reading for the command."""
+        return command in self._readings
+
+    def __getitem__(self, command: int) -> Reading:
+        """The reading of the command."""
+        return self._readings[command]
+
+    def __iter__(self) -> Iterator[int]:
+        """The commands with a reading."""
+        return iter(self._readings)
+
+    def __len__(self) -> int:
+        """The number of readings."""
+        return len(self._readings)
+
+    def get(self, command: int) -> Reading | None:
+        """The reading of the command, if there is one."""
+        return self._readings.get(command)
+
+    def set(self, command: int, value: float | Decimal | None, unit: str | None) -> bool:
+        """Set the reading of the command, returns whether it changed."""
+        reading = self._readings.get(command)
+        if reading is None:
+            self._readings[command] = Reading(value, unit)
+            return True
+        if reading.value == value and reading.unit == unit:
+            return False
+        reading.value = value
+        reading.unit = unit
+        return True
+
+    def remove(self, command: int) -> None:
+        """Remove the reading of the command."""
+        self._readings.pop(command, None)
+
+    def as_dict(self) -> dict[int, dict[str, Any]]:
+        """The readings as dictionaries, for diagnostics and storage."""
+        return {command: reading.as_dict() for command, reading in self._readings.items()}
+
+    @classmethod
+    def from_dict(cls, data: Mapping[Any, Mapping[str, Any]]) -> Self:
+        """Create readings from dictionaries, keys may be commands as strings."""
+        readings = cls()
+        for command, reading in data.items():
+            readings.set(int(command), reading.get("value"), reading.get("unit"))
+        return readings
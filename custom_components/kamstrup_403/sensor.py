@@ -1,11 +1,12 @@
 """Sensor platform for kamstrup_403."""
 
 from datetime import datetime
+from typing import Any
 
 from homeassistant.components.sensor import SensorDeviceClass, SensorEntity, SensorEntityDescription, SensorStateClass
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.const import CONF_PORT, UnitOfVolume, UnitOfVolumeFlowRate
-from homeassistant.core import HomeAssistant
+from homeassistant.const import CONF_ADDRESS, CONF_PORT, UnitOfVolume, UnitOfVolumeFlowRate
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.helpers.device_registry import DeviceEntryType
 from homeassistant.helpers.entity import DeviceInfo, EntityCategory
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
@@ -13,8 +14,9 @@ from homeassistant.helpers.typing import StateType
 from homeassistant.helpers.update_coordinator import CoordinatorEntity
 from homeassistant.util import dt as dt_util
 
-from .const import DEFAULT_NAME, DOMAIN, MANUFACTURER, MODEL, NAME
+from .const import ATTR_RESTORED_AT, DEFAULT_NAME, DOMAIN, MANUFACTURER, MODEL, NAME
 from .coordinator import KamstrupUpdateCoordinator
+from .pykamstrup.const import DEFAULT_DEST_ADDR
 
 DESCRIPTIONS: list[SensorEntityDescription] = [
     SensorEntityDescription(
@@ -288,13 +290,23 @@ DATE_DESCRIPTIONS: list[SensorEntityDescription] = [
 
 
 async def async_setup_entry(
-    _hass: HomeAssistant,
+    hass: HomeAssistant,
     config_entry: ConfigEntry[KamstrupUpdateCoordinator],
     async_add_entities: AddEntitiesCallback,
 ) -> None:
     """Set up Kamstrup sensors based on a config entry."""
     coordinator: KamstrupUpdateCoordinator = config_entry.runtime_data
 
+    # Only add sensors for registers the meter supports.
+    registers = [int(description.key) for description in (*DESCRIPTIONS, *DATE_DESCRIPTIONS)]
+    if coordinator.restored_at is None:
+        await coordinator.async_discover(registers)
+    else:
+        # The sensors start with the readings from before the restart, don't wait for the meter. Registers that couldn't be
+        # discovered are assumed to be supported, when they aren't they're left out from the next start.
+        config_entry.async_create_background_task(hass, coordinator.async_discover(registers), f"{DOMAIN} {config_entry.entry_id} discover")
+    supported = coordinator.capabilities.is_supported
+
     # Add all meter sensors using a list comprehension.
     entities: list[KamstrupSensor] = [
         KamstrupMeterSensor(
@@ -303,6 +315,7 @@ async def async_setup_entry(
             description=description,
         )
         for description in DESCRIPTIONS
+        if supported(int(description.key))
     ]
 
     # Add all date sensors.
@@ -314,25 +327,27 @@ async def async_setup_entry(
                 description=date_description,
             )
             for date_description in DATE_DESCRIPTIONS
+            if supported(int(date_description.key))
         ]
     )
 
-    # Add a "gas" sensor.
-    entities.append(
-        KamstrupGasSensor(
-            coordinator=coordinator,
-            config_entry=config_entry,
-            description=SensorEntityDescription(
-                key="gas",
-                name="Heat Energy to Gas",
-                icon="mdi:gas-burner",
-                native_unit_of_measurement=UnitOfVolume.CUBIC_METERS,
-                device_class=SensorDeviceClass.GAS,
-                state_class=SensorStateClass.TOTAL_INCREASING,
-                entity_registry_enabled_default=False,
-            ),
+    # Add a "gas" sensor, based on the heat energy.
+    if supported(60):
+        entities.append(
+            KamstrupGasSensor(
+                coordinator=coordinator,
+                config_entry=config_entry,
+                description=SensorEntityDescription(
+                    key="gas",
+                    name="Heat Energy to Gas",
+                    icon="mdi:gas-burner",
+                    native_unit_of_measurement=UnitOfVolume.CUBIC_METERS,
+                    device_class=SensorDeviceClass.GAS,
+                    state_class=SensorStateClass.TOTAL_INCREASING,
+                    entity_registry_enabled_default=False,
+                ),
+            )
         )
-    )
 
     async_add_entities(entities)
 
@@ -351,39 +366,63 @@ class KamstrupSensor(CoordinatorEntity[KamstrupUpdateCoordinator], SensorEntity)
         """Initialize Kamstrup sensor."""
         super().__init__(coordinator=coordinator)
 
+        # Meters at other than the default address get their own device on the port.
+        identifier = str(config_entry.data.get(CONF_PORT))
+        address = config_entry.data.get(CONF_ADDRESS, DEFAULT_DEST_ADDR)
+        if address != DEFAULT_DEST_ADDR:
+            identifier = f"{identifier}-{address}"
+
         self._attr_unique_id = f"{config_entry.entry_id}-{DEFAULT_NAME} {description.name}"
         self._attr_device_info = DeviceInfo(
             entry_type=DeviceEntryType.SERVICE,
-            identifiers={(DOMAIN, str(config_entry.data.get(CONF_PORT)))},
+            identifiers={(DOMAIN, identifier)},
             manufacturer=MANUFACTURER,
-            name=NAME,
+            name=NAME if address == DEFAULT_DEST_ADDR else f"{NAME} ({address})",
             model=MODEL,
         )
 
         self.entity_description = description
+        # Override the default name to include the prefix "Kamstrup 403" for all sensors for backwards compatibility with existing entity names.
+        self._attr_name = f"{DEFAULT_NAME} {description.name}"
+        self._attr_available = False
+
+    async def async_added_to_hass(self) -> None:
+        """Run when entity about to be added to hass."""
+        self._update_from_data()
+        await super().async_added_to_hass()
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Handle updated data from the coordinator."""
+        self._update_from_data()
+        super()._handle_coordinator_update()
 
     @property
     def available(self) -> bool:
         """Return True if entity is available."""
-        return (
-            self.coordinator.data is not None
-            and self.data_key in self.coordinator.data
-            and self.coordinator.data[self.data_key].get("value", None) is not None
-        )
+        return self._attr_available
 
     @property
-    def name(self) -> str:
-        """Return the name of the sensor."""
-        # Override the default name to include the prefix "Kamstrup 403" for all sensors for backwards compatibility with existing entity names.
-        return f"{DEFAULT_NAME} {self.entity_description.name}"
-
-    @property
-    def native_value(self) -> StateType | datetime:
-        """Return the state of the sensor."""
-        if self.coordinator.data and self.data_key in self.coordinator.data:
-            return self.coordinator.data[self.data_key].get("value", None)
-
-        return None
+    def extra_state_attributes(self) -> dict[str, Any] | None:
+        """Return when the readings restored from before a restart were read, until the meter is read again."""
+        if (restored_at := self.coordinator.restored_at) is None:
+            return None
+        return {ATTR_RESTORED_AT: restored_at}
+
+    def _update_from_data(self) -> None:
+        """Resolve the state from the coordinator data, once per update instead of on every state write."""
+        data = self.coordinator.data
+        reading = data.get(self.data_key) if data is not None else None
+        if reading is None:
+            self._attr_available = False
+            self._update_reading(None, None)
+            return
+        self._attr_available = reading.value is not None
+        self._update_reading(reading.value, reading.unit)
+
+    def _update_reading(self, value: StateType, _unit: str | None) -> None:
+        """Set the state for a reading."""
+        self._attr_native_value = value
 
 
 class KamstrupMeterSensor(KamstrupSensor):
@@ -395,6 +434,8 @@ class KamstrupMeterSensor(KamstrupSensor):
         """Initialize Kamstrup meter sensor."""
         super().__init__(coordinator, config_entry, description)
         self.data_key = int(description.key)
+        # Only updated when the reading of its command changes.
+        self.coordinator_context = self.data_key
 
     async def async_added_to_hass(self) -> None:
         """Run when entity about to be added to hass."""
@@ -406,18 +447,11 @@ class KamstrupMeterSensor(KamstrupSensor):
         await super().async_will_remove_from_hass()
         self.coordinator.unregister_command(self.data_key)
 
-    @property
-    def native_unit_of_measurement(self) -> str | None:
-        """Return the unit of measurement of the sensor, if any."""
-        if self.entity_description.native_unit_of_measurement is not None:
-            # If the unit of measurement is defined in the entity description, use it.
-            return self.entity_description.native_unit_of_measurement
-
-        if self.coordinator.data and self.data_key in self.coordinator.data:
-            # Use the unit of measurement from the coordinator data if available.
-            return self.coordinator.data[self.data_key].get("unit", None)
-
-        return None
+    def _update_reading(self, value: StateType, unit: str | None) -> None:
+        """Set the state for a reading, with the unit of the meter unless the description has one."""
+        super()._update_reading(value, unit)
+        if self.entity_description.native_unit_of_measurement is None:
+            self._attr_native_unit_of_measurement = unit
 
 
 class KamstrupDateSensor(KamstrupMeterSensor):
@@ -430,19 +464,9 @@ class KamstrupDateSensor(KamstrupMeterSensor):
         super().__init__(coordinator, config_entry, description)
         self.data_key = int(description.key)
 
-    @property
-    def native_value(self) -> datetime | None:
-        """Return the state of the sensor."""
-        value = super().native_value
-        if value is not None and isinstance(value, (float, int)):
-            return self.to_datetime(value)
-
-        return None
-
-    @property
-    def native_unit_of_measurement(self) -> None:
-        """Return the unit of measurement of the sensor, if any."""
-        return None
+    def _update_reading(self, value: StateType, _unit: str | None) -> None:
+        """Set the state for a reading, the meter returns dates as a number."""
+        self._attr_native_value = self.to_datetime(value) if isinstance(value, (float, int)) else None
 
     def to_datetime(self, value: float) -> datetime | None:
         """Convert a meter value to a datetime object.
@@ -463,3 +487,4 @@ class KamstrupGasSensor(KamstrupSensor):
         """Initialize Kamstrup gas sensor."""
         super().__init__(coordinator, config_entry, description)
         self.data_key = 60
+        self.coordinator_context = self.data_key
@@ -0,0 +1,110 @@
+"""Services for kamstrup_403."""
+
+import logging
+
+import voluptuous as vol
+from homeassistant.config_entries import ConfigEntry, ConfigEntryState
+from homeassistant.const import ATTR_CONFIG_ENTRY_ID
+from homeassistant.core import HomeAssistant, ServiceCall, ServiceResponse, SupportsResponse, callback
+from homeassistant.exceptions import HomeAssistantError, ServiceValidationError
+from homeassistant.helpers import config_validation as cv
+from homeassistant.helpers.update_coordinator import UpdateFailed
+
+from .const import (
+    ATTR_DURATION,
+    ATTR_REGISTERS,
+    DEFAULT_STREAM_DURATION,
+    DOMAIN,
+    FAST_REGISTERS,
+    MAX_STREAM_DURATION,
+    SERVICE_READ_REGISTERS,
+    SERVICE_START_STREAMING,
+    SERVICE_STOP_STREAMING,
+)
+from .coordinator import KamstrupUpdateCoordinator
+
+_LOGGER: logging.Logger = logging.getLogger(__package__)
+
+REGISTERS = vol.All(cv.ensure_list, vol.Length(min=1), [vol.All(vol.Coerce(int), vol.Range(min=0, max=0xFFFF))])
+
+READ_REGISTERS_SCHEMA = vol.Schema(
+    {
+        vol.Required(ATTR_CONFIG_ENTRY_ID): cv.string,
+        vol.Required(ATTR_REGISTERS): REGISTERS,
+    }
+)
+
+START_STREAMING_SCHEMA = vol.Schema(
+    {
+        vol.Required(ATTR_CONFIG_ENTRY_ID): cv.string,
+        vol.Optional(ATTR_REGISTERS, default=list(FAST_REGISTERS)): REGISTERS,
+        vol.Optional(ATTR_DURATION, default=DEFAULT_STREAM_DURATION): vol.All(vol.Coerce(float), vol.Range(min=1, max=MAX_STREAM_DURATION)),
+    }
+)
+
+STOP_STREAMING_SCHEMA = vol.Schema({vol.Required(ATTR_CONFIG_ENTRY_ID): cv.string})
+
+
+@callback
+def async_setup_services(hass: HomeAssistant) -> None:
+    """Register the services of the integration."""
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_READ_REGISTERS,
+        async_read_registers,
+        schema=READ_REGISTERS_SCHEMA,
+        supports_response=SupportsResponse.ONLY,
+    )
+    hass.services.async_register(DOMAIN, SERVICE_START_STREAMING, async_start_streaming, schema=START_STREAMING_SCHEMA)
+    hass.services.async_register(DOMAIN, SERVICE_STOP_STREAMING, async_stop_streaming, schema=STOP_STREAMING_SCHEMA)
+
+
+def _get_coordinator(hass: HomeAssistant, entry_id: str) -> KamstrupUpdateCoordinator:
+    """The coordinator of a loaded config entry of the integration."""
+    config_entry: ConfigEntry[KamstrupUpdateCoordinator] | None = hass.config_entries.async_get_entry(entry_id)
+    if config_entry is None or config_entry.domain != DOMAIN:
+        raise ServiceValidationError(
+            translation_domain=DOMAIN,
+            translation_key="entry_not_found",
+            translation_placeholders={"entry_id": entry_id},
+        )
+    if config_entry.state is not ConfigEntryState.LOADED:
+        raise ServiceValidationError(
+            translation_domain=DOMAIN,
+            translation_key="entry_not_loaded",
+            translation_placeholders={"title": config_entry.title},
+        )
+    return config_entry.runtime_data
+
+
+async def async_read_registers(call: ServiceCall) -> ServiceResponse:
+    """Read registers of a meter, the same registers are read once and in as few requests as possible."""
+    coordinator = _get_coordinator(call.hass, call.data[ATTR_CONFIG_ENTRY_ID])
+    registers = list(dict.fromkeys(call.data[ATTR_REGISTERS]))
+
+    _LOGGER.debug("Read registers %s", registers)
+    try:
+        readings = await coordinator.async_read_registers(registers)
+    except UpdateFailed as exception:
+        raise HomeAssistantError(translation_domain=DOMAIN, translation_key="read_failed") from exception
+
+    return {ATTR_REGISTERS: {str(register): reading for register, reading in readings.as_dict().items()}}
+
+
+async def async_start_streaming(call: ServiceCall) -> None:
+    """Stream registers of a meter that have a sensor, for a limited time."""
+    coordinator = _get_coordinator(call.hass, call.data[ATTR_CONFIG_ENTRY_ID])
+    registers = [register for register in dict.fromkeys(call.data[ATTR_REGISTERS]) if register in coordinator.commands]
+    if not registers:
+        raise ServiceValidationError(
+            translation_domain=DOMAIN,
+            translation_key="no_sensors",
+            translation_placeholders={"registers": ", ".join(map(str, call.data[ATTR_REGISTERS]))},
+        )
+
+    coordinator.async_start_streaming(registers, call.data[ATTR_DURATION])
+
+
+async def async_stop_streaming(call: ServiceCall) -> None:
+    """Stop streaming registers of a meter."""
+    _get_coordinator(call.hass, call.data[ATTR_CONFIG_ENTRY_ID]).async_stop_streaming()
@@ -1,5 +1,8 @@
 """Integration tests."""
 
+import timeit
+from collections.abc import Callable
+
 from homeassistant.const import CONF_PORT
 from homeassistant.core import HomeAssistant
 from pytest_homeassistant_custom_component.common import MockConfigEntry
@@ -37,3 +40,11 @@ async def unload_integration(hass: HomeAssistant, config_entry: MockConfigEntry)
     """Unload the custom component for tests."""
     assert await hass.config_entries.async_unload(config_entry.entry_id)
     await hass.async_block_till_done()
+
+
+def best_of(func: Callable[[], object], rounds: int, repeat: int = 5) -> float:
+    """Best run time of `func` over `repeat` runs of `rounds` calls, in seconds per call.
+
+    Benchmarks only log this, wall clock timings are too noisy to assert on.
+    """
+    return min(timeit.repeat(func, repeat=repeat, number=rounds)) / rounds
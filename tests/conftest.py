@@ -5,7 +5,7 @@ from unittest.mock import AsyncMock, Mock, PropertyMock, patch
 
 import pytest
 
-from custom_components.kamstrup_403.pykamstrup.kamstrup import Kamstrup
+from custom_components.kamstrup_403.pykamstrup.kamstrup import MULTIPLE_NBR_MAX, Kamstrup
 
 
 @pytest.fixture(autouse=True)
@@ -38,6 +38,17 @@ def fixture_mock_kamstrup() -> Generator[AsyncMock]:
         1001: (12345678, None),
         1004: (12345.0, "h"),
     }
+    mock_client.get_value.return_value = (None, None)
+    mock_client.baudrate = 1200
+    mock_client.probe_baudrate.return_value = 1200
+    mock_client.configure.return_value = False
+    mock_client.probe_batch_size.return_value = MULTIPLE_NBR_MAX
+    mock_client.plan_batches.side_effect = lambda multiple_nbr, _dest_addr=None: [
+        list(multiple_nbr[i : i + MULTIPLE_NBR_MAX]) for i in range(0, len(multiple_nbr), MULTIPLE_NBR_MAX)
+    ]
+    mock_client.discover_registers.side_effect = lambda multiple_nbr, dest_addr=None: dict.fromkeys(multiple_nbr, True)  # noqa: ARG005
+    mock_client.frame_cache_info.return_value = {"hits": 0, "misses": 0, "size": 0, "max_size": 32}
+    mock_client.trace.return_value = []
 
     mock_client_class = Mock(return_value=mock_client)
 
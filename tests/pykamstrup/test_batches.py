@@ -0,0 +1,93 @@
+"""Tests for packing registers in requests."""
+
+from unittest.mock import patch
+
+from custom_components.kamstrup_403.pykamstrup.kamstrup import MULTIPLE_NBR_MAX, Kamstrup
+
+
+def test_batch_size() -> None:
+    """Test the batch size per meter, limited to what a request can hold."""
+    kamstrup = Kamstrup("test_url", 9600, 1.0)
+    assert kamstrup.batch_size() == MULTIPLE_NBR_MAX
+
+    kamstrup.set_batch_size(4, 0x01)
+    kamstrup.set_batch_size(20, 0x02)
+    kamstrup.set_batch_size(0, 0x03)
+
+    assert kamstrup.batch_size(0x01) == 4
+    assert kamstrup.batch_size(0x02) == MULTIPLE_NBR_MAX
+    assert kamstrup.batch_size(0x03) == 1
+    assert kamstrup.batch_size() == MULTIPLE_NBR_MAX
+
+
+async def test_probe_batch_size() -> None:
+    """Test the number of registers per request is searched between the answered and the unanswered numbers."""
+    # A number without an answer is requested twice.
+    for limit, sizes in ((2, [8, 8, 4, 4, 2, 3, 3]), (5, [8, 8, 4, 6, 6, 5]), (7, [8, 8, 4, 6, 7]), (8, [8])):
+        kamstrup = Kamstrup("test_url", 9600, 1.0)
+
+        async def get_values(multiple_nbr: list[int], _dest_addr: int, limit: int = limit) -> dict | None:
+            return None if len(multiple_nbr) > limit else dict.fromkeys(multiple_nbr, (1.0, "GJ"))
+
+        with patch.object(kamstrup, "get_values", side_effect=get_values) as mock_get_values:
+            assert await kamstrup.probe_batch_size() == limit
+
+        assert [len(call.args[0]) for call in mock_get_values.call_args_list] == sizes
+        assert kamstrup.batch_size() == limit
+
+
+async def test_probe_batch_size_lost_request() -> None:
+    """Test a single request without an answer doesn't lower the number of registers per request."""
+    kamstrup = Kamstrup("test_url", 9600, 1.0)
+
+    with patch.object(kamstrup, "get_values", side_effect=[None, dict.fromkeys(range(8), (1.0, "GJ"))]) as mock_get_values:
+        assert await kamstrup.probe_batch_size() == 8
+
+    assert [len(call.args[0]) for call in mock_get_values.call_args_list] == [8, 8]
+
+
+async def test_probe_batch_size_no_answer() -> None:
+    """Test probing when the meter doesn't answer at all."""
+    kamstrup = Kamstrup("test_url", 9600, 1.0)
+
+    with patch.object(kamstrup, "get_values", return_value=None) as mock_get_values:
+        assert await kamstrup.probe_batch_size([60, 68, 80], 0x01) is None
+
+    assert [len(call.args[0]) for call in mock_get_values.call_args_list] == [3, 3, 1, 1]
+    assert kamstrup.batch_size(0x01) == MULTIPLE_NBR_MAX
+
+
+def test_plan_batches() -> None:
+    """Test registers of unknown size are chunked in order."""
+    kamstrup = Kamstrup("test_url", 9600, 1.0)
+    commands = list(range(1, 13))
+
+    assert kamstrup.plan_batches(commands) == [commands[:8], commands[8:]]
+
+    kamstrup.set_batch_size(5)
+    assert kamstrup.plan_batches(commands) == [commands[:5], commands[5:10], commands[10:]]
+
+
+async def test_discover_registers() -> None:
+    """Test registers without a value are asked again on their own before they're unsupported."""
+    kamstrup = Kamstrup("test_url", 9600, 1.0)
+    kamstrup.set_batch_size(2, 0x01)
+
+    async def get_values(multiple_nbr: list[int], _dest_addr: int) -> dict | None:
+        if 80 in multiple_nbr:
+            return None
+        # A short response to the batch, 68 is there on its own.
+        if multiple_nbr == [68]:
+            return {68: (1.0, "m³")}
+        return {nbr: ((1.0, "GJ") if nbr == 60 else (None, None)) for nbr in multiple_nbr}
+
+    with patch.object(kamstrup, "get_values", side_effect=get_values) as mock_get_values:
+        assert await kamstrup.discover_registers([60, 68, 80, 99, 113], 0x01) == {60: True, 68: True, 113: False}
+
+    assert [call.args for call in mock_get_values.call_args_list] == [
+        ([60, 68], 0x01),
+        ([68], 0x01),
+        ([80, 99], 0x01),
+        ([113], 0x01),
+        ([113], 0x01),
+    ]
@@ -0,0 +1,100 @@
+"""Benchmarks for the Kamstrup Meter Protocol hot paths."""
+
+import logging
+import random
+
+from custom_components.kamstrup_403.pykamstrup.const import ESCAPES
+from custom_components.kamstrup_403.pykamstrup.kamstrup import Kamstrup
+from tests import best_of
+
+_LOGGER: logging.Logger = logging.getLogger(__name__)
+# Calls per timed run.
+ROUNDS = 200
+
+# Payloads (without CRC) of responses used in the unit tests.
+RECORDED_PAYLOADS = [
+    bytes([0x3F, 0x10, 0x00, 0x3C, 0x08, 0x02, 0x00, 0x12, 0x34]),
+    bytes([0x3F, 0x10, 0x00, 0x3C, 0x08, 0x02, 0x00, 0x12, 0x34, 0x00, 0x8C, 0x30, 0x03, 0x00, 0x23, 0x01, 0x23]),
+    bytes([0x3F, 0x10]) + b"".join(bytes([0x00, 0x01 + i, 0x08, 0x01, 0x00, 0x42]) for i in range(8)),
+    bytes([0x3F, 0x10, 0x00, 0x80, 0x0D, 0x04, 0x40, 0x1B, 0x06, 0x00, 0x80]),
+]
+
+
+def _crc_1021_bitwise(message: tuple[int, ...]) -> int:
+    """Bitwise CRC-16 implementation that the table driven version replaced."""
+    poly = 0x1021
+    reg = 0x0000
+    for byte in message:
+        mask = 0x80
+        while mask > 0:
+            reg <<= 1
+            if byte & mask:
+                reg |= 1
+            mask >>= 1
+            if reg & 0x10000:
+                reg &= 0xFFFF
+                reg ^= poly
+    return reg
+
+
+def _stuff(payload: bytes) -> bytearray:
+    """Build a response frame, with CRC and byte stuffing, from a payload."""
+    crc = Kamstrup._crc_1021(bytes(2), Kamstrup._crc_1021(payload))  # pylint: disable=protected-access
+    frame = bytearray([0x40])
+    for byte in [*payload, crc >> 8, crc & 0xFF]:
+        if byte in ESCAPES:
+            frame += bytes([0x1B, byte ^ 0xFF])
+        else:
+            frame.append(byte)
+    frame.append(0x0D)
+    return frame
+
+
+def _unstuff_loop(frame: bytearray) -> tuple[bytearray, bool]:
+    """Index loop unstuffing implementation that the split version replaced."""
+    escape_byte = 0x1B
+    response_data = bytearray()
+    i = 1
+    while i < len(frame) - 1:
+        if frame[i] == escape_byte:
+            response_data.append(frame[i + 1] ^ 0xFF)
+            i += 2
+        else:
+            response_data.append(frame[i])
+            i += 1
+    crc_valid = Kamstrup._crc_1021(response_data) == 0  # pylint: disable=protected-access
+    return response_data[:-2], crc_valid
+
+
+def test_crc_1021_matches_bitwise() -> None:
+    """Test the table driven CRC against the bitwise reference."""
+    rng = random.Random(1021)  # noqa: S311
+    for length in range(64):
+        message = bytes(rng.randrange(256) for _ in range(length))
+        assert Kamstrup._crc_1021(message) == _crc_1021_bitwise(tuple(message))  # pylint: disable=protected-access
+
+
+def test_crc_1021_benchmark() -> None:
+    """Benchmark the table driven CRC against the bitwise reference on a full size frame."""
+    rng = random.Random(1021)  # noqa: S311
+    frame = bytearray(rng.randrange(256) for _ in range(80))
+
+    bitwise = best_of(lambda: _crc_1021_bitwise(tuple(frame)), ROUNDS)
+    table = best_of(lambda: Kamstrup._crc_1021(frame), ROUNDS)  # pylint: disable=protected-access
+    _LOGGER.info("CRC of %i bytes, bitwise: %.2f µs, table: %.2f µs", len(frame), bitwise * 1e6, table * 1e6)
+
+
+def test_unstuff_matches_loop() -> None:
+    """Test the split unstuffing against the index loop reference."""
+    for payload in RECORDED_PAYLOADS:
+        frame = _stuff(payload)
+        assert Kamstrup._unstuff(frame) == _unstuff_loop(frame) == (bytearray(payload), True)  # pylint: disable=protected-access
+
+
+def test_unstuff_benchmark() -> None:
+    """Benchmark the split unstuffing against the index loop reference on the recorded frames."""
+    frames = [_stuff(payload) for payload in RECORDED_PAYLOADS]
+
+    loop = best_of(lambda: [_unstuff_loop(frame) for frame in frames], ROUNDS)
+    split = best_of(lambda: [Kamstrup._unstuff(frame) for frame in frames], ROUNDS)  # pylint: disable=protected-access
+    _LOGGER.info("Unstuffing %i frames, loop: %.2f µs, split: %.2f µs", len(frames), loop * 1e6, split * 1e6)
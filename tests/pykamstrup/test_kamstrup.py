@@ -1,11 +1,17 @@
 """Tests for Kamstrup class."""
 
+# pylint: disable=too-many-lines
+
+import asyncio
 import math
-from unittest.mock import AsyncMock, patch
+from decimal import Decimal
+from unittest.mock import AsyncMock, Mock, patch
 
 import pytest
+from serialx import SerialException
 
-from custom_components.kamstrup_403.pykamstrup.kamstrup import Kamstrup
+from custom_components.kamstrup_403.pykamstrup.const import EchoMode
+from custom_components.kamstrup_403.pykamstrup.kamstrup import _READ_SIZE, Kamstrup
 
 
 def test_init() -> None:
@@ -15,10 +21,20 @@ def test_init() -> None:
     assert kamstrup.url == "test_url"
     assert kamstrup.baudrate == 9600
     assert kamstrup.timeout == 1.0
+    assert kamstrup.inter_byte_timeout == 0.05  # Lower bound, 20 characters at 9600 baud is shorter.
+    assert kamstrup.exact is False
+    assert kamstrup.echo_mode is EchoMode.AUTO
+    assert kamstrup.echo_detected is None
     assert kamstrup.reader is None
     assert kamstrup.writer is None
 
 
+def test_init_inter_byte_timeout() -> None:
+    """Test the inter byte timeout, derived from the baudrate or given."""
+    assert Kamstrup("test_url", 1200, 1.0).inter_byte_timeout == pytest.approx(20 * 11 / 1200)
+    assert Kamstrup("test_url", 1200, 1.0, 0.3).inter_byte_timeout == 0.3
+
+
 def test_crc_1021() -> None:
     """Test CRC calculation."""
     # Test with empty message
@@ -33,14 +49,63 @@ def test_crc_1021() -> None:
     assert Kamstrup._crc_1021((0xFF,)) == 255  # pylint: disable=protected-access
 
 
-def test_debug(caplog: pytest.LogCaptureFixture) -> None:
-    """Test debug logging."""
-    kamstrup = Kamstrup("test_url", 9600, 1.0)
+def test_crc_1021_buffers() -> None:
+    """Test CRC calculation on buffers and incremental updates."""
+    message = bytes([0x3F, 0x10, 0x01, 0x00, 0x3C])
+
+    assert Kamstrup._crc_1021(message) == 64250  # pylint: disable=protected-access
+    assert Kamstrup._crc_1021(bytearray(message)) == 64250  # pylint: disable=protected-access
+    assert Kamstrup._crc_1021(memoryview(message)) == 64250  # pylint: disable=protected-access
+
+    # Feeding the message in parts gives the same result.
+    partial = Kamstrup._crc_1021(message[:2])  # pylint: disable=protected-access
+    assert Kamstrup._crc_1021(message[2:], partial) == 64250  # pylint: disable=protected-access
+
+    # A message followed by its own CRC checks out to zero.
+    crc = Kamstrup._crc_1021(bytes(2), Kamstrup._crc_1021(message))  # pylint: disable=protected-access
+    assert Kamstrup._crc_1021(message + bytes([crc >> 8, crc & 0xFF])) == 0  # pylint: disable=protected-access
+
+
+def test_trace(caplog: pytest.LogCaptureFixture) -> None:
+    """Test tracing frames."""
+    kamstrup = Kamstrup("test_url", 9600, 1.0, trace_size=2)
 
     with caplog.at_level("DEBUG"):
-        kamstrup._debug("Test message", bytearray([0x01, 0x02, 0xFF]))  # pylint: disable=protected-access
+        kamstrup._trace("TX", bytes([0x01, 0x02, 0xFF]))  # pylint: disable=protected-access
+        kamstrup._trace("RX", bytearray([0x40, 0x0D]))  # pylint: disable=protected-access
+        kamstrup._trace("TX", bytes([0x03]))  # pylint: disable=protected-access
+
+    assert "TX: 01 02 ff" in caplog.text
+    assert "RX: 40 0d" in caplog.text
+
+    # Only the last two frames are kept.
+    trace = kamstrup.trace()
+    assert [(item["direction"], item["frame"]) for item in trace] == [("RX", "40 0d"), ("TX", "03")]
+    assert all(isinstance(item["age"], float) and item["age"] >= 0 for item in trace)
+
+
+def test_trace_disabled(caplog: pytest.LogCaptureFixture) -> None:
+    """Test tracing without debug logging and without a trace buffer."""
+    kamstrup = Kamstrup("test_url", 9600, 1.0, trace_size=0)
+
+    with caplog.at_level("INFO"):
+        kamstrup._trace("TX", bytes([0x01, 0x02, 0xFF]))  # pylint: disable=protected-access
 
-    assert "Test message: 01 02 ff" in caplog.text
+    assert "TX" not in caplog.text
+    assert kamstrup.trace() == []
+
+
+async def test_receive_traces_incomplete_frame() -> None:
+    """Test the part of a frame received before a timeout is traced."""
+    mock_reader = AsyncMock()
+    mock_reader.read.side_effect = [bytes([0x40, 0x3F]), b""]
+
+    kamstrup = Kamstrup("test_url", 9600, 1.0)
+    kamstrup.reader = mock_reader
+    kamstrup.writer = AsyncMock()  # Needed for _ensure_connected
+
+    assert await kamstrup._receive() is None  # pylint: disable=protected-access
+    assert [(item["direction"], item["frame"]) for item in kamstrup.trace()] == [("RX", "40 3f")]
 
 
 async def test_connect() -> None:
@@ -91,6 +156,94 @@ async def test_disconnect() -> None:
     assert kamstrup.writer is None
 
 
+async def test_set_baudrate() -> None:
+    """Test changing the baudrate reconnects and updates the derived inter byte timeout."""
+    kamstrup = Kamstrup("test_url", 1200, 1.0)
+    kamstrup.writer = AsyncMock()
+    kamstrup.reader = AsyncMock()
+
+    await kamstrup.set_baudrate(9600)
+
+    assert kamstrup.baudrate == 9600
+    assert kamstrup.inter_byte_timeout == 0.05
+    assert kamstrup.writer is None
+
+    kamstrup = Kamstrup("test_url", 1200, 1.0, 0.3)
+    await kamstrup.set_baudrate(9600)
+    assert kamstrup.inter_byte_timeout == 0.3
+
+
+async def test_configure() -> None:
+    """Test changing the settings of the line."""
+    kamstrup = Kamstrup("test_url", 1200, 1.0, echo_mode=EchoMode.AUTO)
+    kamstrup.writer = AsyncMock()
+    kamstrup.reader = AsyncMock()
+    kamstrup.echo_detected = True
+
+    assert not await kamstrup.configure(1200, 1.0, echo_mode=EchoMode.AUTO)
+    assert kamstrup.writer is not None
+    assert kamstrup.echo_detected is True
+
+    assert await kamstrup.configure(9600, 0.5, 0.3, echo_mode=EchoMode.NEVER)
+    assert (kamstrup.baudrate, kamstrup.timeout, kamstrup.inter_byte_timeout) == (9600, 0.5, 0.3)
+    assert kamstrup.echo_mode is EchoMode.NEVER
+    assert kamstrup.echo_detected is None
+    assert kamstrup.writer is None
+
+
+async def test_close() -> None:
+    """Test closing waits for the request in progress, and later requests don't connect again."""
+    kamstrup = Kamstrup("test_url", 1200, 1.0)
+    kamstrup.writer = Mock(wait_closed=AsyncMock())
+    kamstrup.reader = AsyncMock()
+
+    async with kamstrup._lock:  # pylint: disable=protected-access
+        close = asyncio.create_task(kamstrup.close())
+        await asyncio.sleep(0)
+        assert not close.done()
+        assert kamstrup.writer is not None
+    await close
+
+    assert kamstrup.writer is None
+    with (
+        patch("custom_components.kamstrup_403.pykamstrup.kamstrup.serialx.open_serial_connection") as mock_open,
+        pytest.raises(RuntimeError, match="Connection is closed"),
+    ):
+        await kamstrup.connect()
+    mock_open.assert_not_called()
+
+
+async def test_probe_baudrate() -> None:
+    """Test the fastest baudrate the meter answers at is found."""
+    kamstrup = Kamstrup("test_url", 1200, 1.0)
+    baudrates = []
+
+    async def get_value(nbr: int, dest_addr: int) -> tuple[float | None, str | None]:
+        assert nbr == 1001
+        assert dest_addr == 0x3F
+        baudrates.append(kamstrup.baudrate)
+        if kamstrup.baudrate == 19200:
+            raise SerialException
+        return (12345678, None) if kamstrup.baudrate <= 2400 else (None, None)
+
+    with patch.object(kamstrup, "get_value", side_effect=get_value):
+        assert await kamstrup.probe_baudrate() == 2400
+
+    assert baudrates == [19200, 9600, 4800, 2400]
+    assert kamstrup.baudrate == 2400
+
+
+async def test_probe_baudrate_no_answer() -> None:
+    """Test the original baudrate is restored when the meter doesn't answer."""
+    kamstrup = Kamstrup("test_url", 1200, 1.0)
+
+    with patch.object(kamstrup, "get_value", return_value=(None, None)) as mock_get_value:
+        assert await kamstrup.probe_baudrate((2400, 9600)) is None
+
+    assert mock_get_value.call_count == 2
+    assert kamstrup.baudrate == 1200
+
+
 async def test_write() -> None:
     """Test writing data."""
     mock_writer = AsyncMock()
@@ -99,11 +252,11 @@ async def test_write() -> None:
     kamstrup.writer = mock_writer
     kamstrup.reader = AsyncMock()  # Needed for _ensure_connected
 
-    test_data = (0x01, 0x02, 0x03)
+    test_data = bytes([0x01, 0x02, 0x03])
 
     await kamstrup._write(test_data)  # pylint: disable=protected-access
 
-    mock_writer.write.assert_called_once_with(bytearray([0x01, 0x02, 0x03]))
+    mock_writer.write.assert_called_once_with(test_data)
     mock_writer.drain.assert_called_once()
 
 
@@ -122,7 +275,7 @@ async def test_write_no_writer() -> None:
         kamstrup.reader = AsyncMock()  # Reader exists but writer is None
         kamstrup.writer = None
 
-        test_data = (0x01, 0x02, 0x03)
+        test_data = bytes([0x01, 0x02, 0x03])
 
         with pytest.raises(RuntimeError, match="Writer not available"):
             await kamstrup._write(test_data)  # pylint: disable=protected-access
@@ -175,8 +328,8 @@ async def test_read_success() -> None:
 
     result = await kamstrup._read()  # pylint: disable=protected-access
 
-    assert result == 0x42
-    mock_reader.read.assert_called_once_with(1)
+    assert result == b"\x42"
+    mock_reader.read.assert_called_once_with(_READ_SIZE)
 
 
 async def test_read_no_reader() -> None:
@@ -210,7 +363,7 @@ async def test_read_empty_data() -> None:
     result = await kamstrup._read()  # pylint: disable=protected-access
 
     assert result is None
-    mock_reader.read.assert_called_once_with(1)
+    mock_reader.read.assert_called_once_with(_READ_SIZE)
 
 
 async def test_read_timeout() -> None:
@@ -241,45 +394,53 @@ async def test_read_asyncio_timeout_error() -> None:
     assert result is None
 
 
-async def test_send_without_escapes() -> None:
-    """Test sending data without escape characters."""
-    mock_writer = AsyncMock()
+def test_encode_without_escapes() -> None:
+    """Test encoding data without escape characters."""
+    message = (0x3F, 0x10, 0x01, 0x00, 0x3C)
 
-    kamstrup = Kamstrup("test_url", 9600, 1.0)
-    kamstrup.writer = mock_writer
-    kamstrup.reader = AsyncMock()  # Needed for _ensure_connected
+    frame = Kamstrup._encode(0x80, message)  # pylint: disable=protected-access
 
-    message = (0x3F, 0x10, 0x01)
+    # Prefix, message, CRC and end byte.
+    assert frame == bytes([0x80, 0x3F, 0x10, 0x01, 0x00, 0x3C, 0xB2, 0x5F, 0x0D])
 
-    await kamstrup._send(0x80, message)  # pylint: disable=protected-access
 
-    # Verify the call was made (exact bytes depend on CRC calculation)
-    mock_writer.write.assert_called_once()
-    written_data = mock_writer.write.call_args[0][0]
+def test_encode_with_escapes() -> None:
+    """Test encoding data with escape characters."""
+    message = (0x40, 0x1B, 0x06)  # All escape characters
 
-    # Should start with prefix and end with 0x0D
-    assert written_data[0] == 0x80
-    assert written_data[-1] == 0x0D
+    frame = Kamstrup._encode(0x80, message)  # pylint: disable=protected-access
 
+    # Should start with prefix, contain escape sequences and end with 0x0D
+    assert frame[0] == 0x80
+    assert frame[1:7] == bytes([0x1B, 0xBF, 0x1B, 0xE4, 0x1B, 0xF9])
+    assert frame[-1] == 0x0D
 
-async def test_send_with_escapes() -> None:
-    """Test sending data with escape characters."""
-    mock_writer = AsyncMock()
 
+def test_request_frame_cache() -> None:
+    """Test request frames are encoded once and served from cache afterwards."""
     kamstrup = Kamstrup("test_url", 9600, 1.0)
-    kamstrup.writer = mock_writer
-    kamstrup.reader = AsyncMock()  # Needed for _ensure_connected
 
-    # Use a message that will contain escape characters after CRC
-    message = (0x40, 0x1B, 0x06)  # All escape characters
+    with patch.object(Kamstrup, "_encode", wraps=Kamstrup._encode) as mock_encode:  # pylint: disable=protected-access
+        frame = kamstrup._request_frame(0x3F, 0x10, (60,))  # pylint: disable=protected-access
+        assert kamstrup._request_frame(0x3F, 0x10, (60,)) is frame  # pylint: disable=protected-access
+        kamstrup._request_frame(0x3F, 0x10, (60, 68))  # pylint: disable=protected-access
+
+    assert frame == Kamstrup._encode(0x80, (0x3F, 0x10, 0x01, 0x00, 0x3C))  # pylint: disable=protected-access
+    assert mock_encode.call_count == 2
+    assert kamstrup.frame_cache_info() == {"hits": 1, "misses": 2, "size": 2, "max_size": 32}
+
 
-    await kamstrup._send(0x80, message)  # pylint: disable=protected-access
+def test_request_frame_cache_bounded() -> None:
+    """Test the least recently used request frame is evicted when the cache is full."""
+    kamstrup = Kamstrup("test_url", 9600, 1.0)
 
-    mock_writer.write.assert_called_once()
-    written_data = mock_writer.write.call_args[0][0]
+    for nbr in range(33):
+        kamstrup._request_frame(0x3F, 0x10, (nbr,))  # pylint: disable=protected-access
 
-    # Should contain escape sequences
-    assert 0x1B in written_data  # Escape byte should be present
+    assert kamstrup.frame_cache_info()["size"] == 32
+    kamstrup._request_frame(0x3F, 0x10, (32,))  # pylint: disable=protected-access
+    kamstrup._request_frame(0x3F, 0x10, (0,))  # pylint: disable=protected-access
+    assert kamstrup.frame_cache_info() == {"hits": 1, "misses": 34, "size": 32, "max_size": 32}
 
 
 async def test_receive_success() -> None:
@@ -306,6 +467,141 @@ async def test_receive_success() -> None:
     assert len(result) == 3  # Original data without CRC (0x3F, 0x10, 0x00)
 
 
+async def test_receive_buffered_with_echo() -> None:
+    """Test receive when the echo and response arrive in bulk."""
+    mock_reader = AsyncMock()
+
+    message_data = bytearray([0x3F, 0x10, 0x00, 0x3C, 0x00])
+    crc = Kamstrup._crc_1021(message_data)  # pylint: disable=protected-access
+    message_data[-2:] = [crc >> 8, crc & 0xFF]
+
+    echo = bytes([0x80, 0x3F, 0x10, 0x01, 0x00, 0x3C, 0x12, 0x34, 0x0D])
+    response = bytes([0x40, *message_data, 0x0D])
+    # The echo and the first part of the response arrive together, the rest follows later.
+    mock_reader.read.side_effect = [echo + response[:3], response[3:]]
+
+    kamstrup = Kamstrup("test_url", 9600, 1.0)
+    kamstrup.reader = mock_reader
+    kamstrup.writer = AsyncMock()  # Needed for _ensure_connected
+
+    result = await kamstrup._receive()  # pylint: disable=protected-access
+
+    assert result == bytearray([0x3F, 0x10, 0x00])
+    assert mock_reader.read.call_count == 2
+
+
+def _value_response(nbr: int) -> bytes:
+    """Build the response frame (without escapes) of the meter for a register."""
+    payload = bytes([0x3F, 0x10, nbr >> 8, nbr & 0xFF, 0x08, 0x02, 0x00, 0x12, 0x34])
+    crc = Kamstrup._crc_1021(bytes(2), Kamstrup._crc_1021(payload))  # pylint: disable=protected-access
+    return bytes([0x40, *payload, crc >> 8, crc & 0xFF, 0x0D])
+
+
+def _echo_kamstrup(echo_mode: EchoMode, *responses: bytes) -> Kamstrup:
+    """Create a connected Kamstrup that receives the given data."""
+    kamstrup = Kamstrup("test_url", 9600, 1.0, echo_mode=echo_mode)
+    kamstrup.reader = AsyncMock()
+    kamstrup.reader.read.side_effect = responses
+    kamstrup.writer = Mock()
+    kamstrup.writer.drain = AsyncMock()
+    return kamstrup
+
+
+async def test_echo_auto_detect() -> None:
+    """Test the echo is detected on the first response, then verified."""
+    request = Kamstrup("test_url", 9600, 1.0)._request_frame(0x3F, 0x10, (60,))  # pylint: disable=protected-access
+    garbled = bytes([0x80, 0x3F, 0x10, 0x01, 0x00, 0x00, 0x00, 0x00, 0x0D])
+    kamstrup = _echo_kamstrup(EchoMode.AUTO, request + _value_response(60), garbled + _value_response(60))
+
+    assert await kamstrup.get_value(60) == (0x1234, "GJ")
+    assert kamstrup.echo_detected is True
+
+    # A garbled echo now fails the request, without waiting for the response.
+    assert await kamstrup.get_value(60) == (None, None)
+
+
+async def test_echo_auto_detect_without_echo() -> None:
+    """Test a head without echo is detected."""
+    kamstrup = _echo_kamstrup(EchoMode.AUTO, _value_response(60))
+
+    assert await kamstrup.get_value(60) == (0x1234, "GJ")
+    assert kamstrup.echo_detected is False
+
+
+async def test_echo_auto_detect_noise() -> None:
+    """Test noise before the response leaves the echo undetected."""
+    kamstrup = _echo_kamstrup(EchoMode.AUTO, bytes([0x00, 0x0D]) + _value_response(60))
+
+    assert await kamstrup.get_value(60) == (0x1234, "GJ")
+    assert kamstrup.echo_detected is None
+
+
+async def test_echo_always_mismatch() -> None:
+    """Test a mismatching echo fails right away in always mode."""
+    kamstrup = _echo_kamstrup(EchoMode.ALWAYS, bytes([0x80, 0x00]), _value_response(60))
+
+    assert await kamstrup.get_value(60) == (None, None)
+    assert kamstrup.reader is not None
+    assert kamstrup.reader.read.call_count == 1
+
+
+async def test_echo_never() -> None:
+    """Test the echo isn't verified in never mode."""
+    kamstrup = _echo_kamstrup(EchoMode.NEVER, bytes([0x80, 0x00, 0x0D]) + _value_response(60))
+
+    assert await kamstrup.get_value(60) == (0x1234, "GJ")
+    assert kamstrup.echo_detected is None
+
+
+async def test_read_frame_timeouts() -> None:
+    """Test the first byte timeout applies until the response starts, then the inter byte timeout."""
+    kamstrup = Kamstrup("test_url", 1200, 0.3, 0.05)
+
+    with patch.object(kamstrup, "_read") as mock_read:
+        mock_read.side_effect = [bytes([0x80, 0x3F, 0x0D]), bytes([0x40, 0x3F]), bytes([0x10, 0x0D])]
+
+        result = await kamstrup._read_frame(32)  # pylint: disable=protected-access
+
+    assert result == bytearray([0x40, 0x3F, 0x10, 0x0D])
+    waits = [call.args[0] for call in mock_read.call_args_list]
+    assert waits == [pytest.approx(0.3), pytest.approx(0.3), pytest.approx(0.05)]
+
+
+async def test_read_frame_deadline() -> None:
+    """Test a frame that trickles in slower than the frame deadline is abandoned."""
+    mock_reader = AsyncMock()
+
+    async def trickle(_size: int) -> bytes:
+        await asyncio.sleep(0.02)
+        return bytes([0x40]) if mock_reader.read.call_count == 1 else bytes([0x00])
+
+    mock_reader.read.side_effect = trickle
+
+    kamstrup = Kamstrup("test_url", 9600, 0.05, 0.05)
+    kamstrup.reader = mock_reader
+    kamstrup.writer = AsyncMock()  # Needed for _ensure_connected
+
+    result = await kamstrup._read_frame(2)  # pylint: disable=protected-access
+
+    assert result is None
+    # Deadline is 0.05 + 0.05 + a few ms of transmission time, each read takes 0.02.
+    assert mock_reader.read.call_count < 10
+
+
+async def test_receive_frame_too_long() -> None:
+    """Test receive gives up on a frame that never ends."""
+    mock_reader = AsyncMock()
+    mock_reader.read.side_effect = [bytes([0x40]), *[bytes(_READ_SIZE)] * 4]
+
+    kamstrup = Kamstrup("test_url", 9600, 1.0)
+    kamstrup.reader = mock_reader
+    kamstrup.writer = AsyncMock()  # Needed for _ensure_connected
+
+    result = await kamstrup._receive()  # pylint: disable=protected-access
+
+    assert result is None
+
+
 async def test_receive_timeout() -> None:
     """Test receive timeout."""
     mock_reader = AsyncMock()
@@ -382,6 +678,34 @@ async def test_receive_crc_error() -> None:
     assert result is not None
 
 
+def test_unstuff() -> None:
+    """Test unstuffing frames with and without escape sequences."""
+    payload = bytearray([0x3F, 0x10, 0x40, 0x0D, 0x00])
+    crc = Kamstrup._crc_1021(bytes(2), Kamstrup._crc_1021(payload))  # pylint: disable=protected-access
+
+    # 0x40 and 0x0D are escaped on the line.
+    frame = bytearray([0x40, 0x3F, 0x10, 0x1B, 0xBF, 0x1B, 0xF2, 0x00, crc >> 8, crc & 0xFF, 0x0D])
+    result, crc_valid = Kamstrup._unstuff(frame)  # pylint: disable=protected-access
+    assert result == payload
+    assert crc_valid
+
+    # Corrupt the payload.
+    frame[1] = 0x3E
+    result, crc_valid = Kamstrup._unstuff(frame)  # pylint: disable=protected-access
+    assert result == bytearray([0x3E, 0x10, 0x40, 0x0D, 0x00])
+    assert not crc_valid
+
+
+def test_unstuff_escape_at_end(caplog: pytest.LogCaptureFixture) -> None:
+    """Test unstuffing a frame with an escape byte right before the end byte."""
+    with caplog.at_level("DEBUG"):
+        result, crc_valid = Kamstrup._unstuff(bytearray([0x40, 0x3F, 0x10, 0x00, 0x1B, 0x0D]))  # pylint: disable=protected-access
+
+    assert result == bytearray([0x3F, 0x10])
+    assert not crc_valid
+    assert "Missing Escape" in caplog.text
+
+
 def test_process_response_success() -> None:
     """Test successful response processing."""
     nbr = 0x003C  # 60
@@ -465,7 +789,7 @@ async def test_get_value_success() -> None:
 
     # Mock both _send and _receive methods
     with (
-        patch.object(kamstrup, "_send") as mock_send,
+        patch.object(kamstrup, "_write") as mock_write,
         patch.object(kamstrup, "_receive") as mock_receive,
     ):
         mock_receive.return_value = bytearray([0x3F, 0x10, 0x00, 0x3C, 0x08, 0x02, 0x00, 0x12, 0x34])
@@ -474,7 +798,7 @@ async def test_get_value_success() -> None:
 
     assert value == 0x1234
     assert unit == "GJ"
-    mock_send.assert_called_once()
+    mock_write.assert_called_once_with(bytes([0x80, 0x3F, 0x10, 0x01, 0x00, 0x3C, 0xB2, 0x5F, 0x0D]))
 
 
 async def test_get_value_no_response() -> None:
@@ -482,7 +806,7 @@ async def test_get_value_no_response() -> None:
     kamstrup = Kamstrup("test_url", 9600, 1.0)
 
     with (
-        patch.object(kamstrup, "_send") as mock_send,
+        patch.object(kamstrup, "_write") as mock_write,
         patch.object(kamstrup, "_receive") as mock_receive,
     ):
         mock_receive.return_value = None
@@ -491,7 +815,7 @@ async def test_get_value_no_response() -> None:
 
     assert value is None
     assert unit is None
-    mock_send.assert_called_once()
+    mock_write.assert_called_once()
 
 
 async def test_get_value_wrong_address_or_cid() -> None:
@@ -499,7 +823,7 @@ async def test_get_value_wrong_address_or_cid() -> None:
     kamstrup = Kamstrup("test_url", 9600, 1.0)
 
     with (
-        patch.object(kamstrup, "_send") as mock_send,
+        patch.object(kamstrup, "_write") as mock_write,
         patch.object(kamstrup, "_receive") as mock_receive,
     ):
         # Wrong destination address (should be 0x3F)
@@ -509,7 +833,7 @@ async def test_get_value_wrong_address_or_cid() -> None:
 
     assert value is None
     assert unit is None
-    mock_send.assert_called_once()
+    mock_write.assert_called_once()
 
 
 async def test_get_values_success() -> None:
@@ -517,7 +841,7 @@ async def test_get_values_success() -> None:
     kamstrup = Kamstrup("test_url", 9600, 1.0)
 
     with (
-        patch.object(kamstrup, "_send") as mock_send,
+        patch.object(kamstrup, "_write") as mock_write,
         patch.object(kamstrup, "_receive") as mock_receive,
     ):
         # Response with two values
@@ -552,7 +876,158 @@ async def test_get_values_success() -> None:
     assert result[60][1] == "GJ"
     assert result[140][0] == 0x230123
     assert result[140][1] == "yy:mm:dd"
-    mock_send.assert_called_once()
+    mock_write.assert_called_once()
+
+
+async def test_get_values_one_request_at_a_time() -> None:
+    """Test concurrent requests take turns, in the order they were made."""
+    kamstrup = Kamstrup("test_url", 9600, 1.0)
+    events = []
+
+    async def write(data: bytes) -> None:
+        events.append(("write", data[5]))
+        await asyncio.sleep(0)
+
+    async def receive(_expected_length: int) -> bytearray:
+        nbr = events[-1][1]
+        await asyncio.sleep(0.01)
+        events.append(("receive", nbr))
+        return bytearray([0x3F, 0x10, 0x00, nbr, 0x08, 0x01, 0x00, nbr])
+
+    with (
+        patch.object(kamstrup, "_write", side_effect=write),
+        patch.object(kamstrup, "_receive", side_effect=receive),
+    ):
+        results = await asyncio.gather(kamstrup.get_values([60]), kamstrup.get_value(68), kamstrup.get_values([80]))
+
+    assert results == [{60: (60, "GJ")}, (68, "GJ"), {80: (80, "GJ")}]
+    assert events == [("write", 60), ("receive", 60), ("write", 68), ("receive", 68), ("write", 80), ("receive", 80)]
+
+
+async def test_get_values_addresses_interleaved() -> None:
+    """Test requests to meters at different addresses take turns on the line."""
+    kamstrup = Kamstrup("test_url", 9600, 1.0)
+    requests = []
+
+    async def write(data: bytes) -> None:
+        requests.append((data[1], data[5]))
+
+    async def receive(_expected_length: int) -> bytearray:
+        dest_addr, nbr = requests[-1]
+        await asyncio.sleep(0.01)
+        return bytearray([dest_addr, 0x10, 0x00, nbr, 0x08, 0x01, 0x00, dest_addr])
+
+    async def poll(dest_addr: int) -> list[dict | None]:
+        return [await kamstrup.get_values([nbr], dest_addr) for nbr in (60, 68)]
+
+    with (
+        patch.object(kamstrup, "_write", side_effect=write),
+        patch.object(kamstrup, "_receive", side_effect=receive),
+    ):
+        meter_1, meter_2 = await asyncio.gather(poll(0x01), poll(0x02))
+
+    assert meter_1 == [{60: (1, "GJ")}, {68: (1, "GJ")}]
+    assert meter_2 == [{60: (2, "GJ")}, {68: (2, "GJ")}]
+    assert requests == [(0x01, 60), (0x02, 60), (0x01, 68), (0x02, 68)]
+
+
+async def test_get_values_other_address() -> None:
+    """Test a response from another meter than the one requested is ignored."""
+    kamstrup = Kamstrup("test_url", 9600, 1.0)
+
+    with (
+        patch.object(kamstrup, "_write") as mock_write,
+        patch.object(kamstrup, "_receive", return_value=bytearray([0x3F, 0x10, 0x00, 0x3C, 0x08, 0x01, 0x00, 0x01])),
+    ):
+        assert await kamstrup.get_values([60], 0x01) is None
+
+    assert mock_write.call_args.args[0][1] == 0x01
+
+
+async def test_get_values_short_response(caplog: pytest.LogCaptureFixture) -> None:
+    """Test get_values with a response that ends halfway a register."""
+    kamstrup = Kamstrup("test_url", 9600, 1.0)
+
+    with (
+        patch.object(kamstrup, "_write"),
+        patch.object(kamstrup, "_receive") as mock_receive,
+        caplog.at_level("DEBUG"),
+    ):
+        # First value complete, second value misses its last byte, third value is missing.
+        mock_receive.return_value = bytearray([0x3F, 0x10, 0x00, 0x3C, 0x08, 0x02, 0x00, 0x12, 0x34, 0x00, 0x8C, 0x30, 0x03, 0x00, 0x23, 0x01])
+
+        result = await kamstrup.get_values([60, 140, 68])
+
+    assert result == {60: (0x1234, "GJ"), 140: (None, None), 68: (None, None)}
+    assert "Short response" in caplog.text
+
+
+async def test_get_value_short_response() -> None:
+    """Test get_value with a response that only contains the address."""
+    kamstrup = Kamstrup("test_url", 9600, 1.0)
+
+    with (
+        patch.object(kamstrup, "_write"),
+        patch.object(kamstrup, "_receive") as mock_receive,
+    ):
+        mock_receive.return_value = bytearray([0x3F])
+
+        value, unit = await kamstrup.get_value(60)
+
+    assert value is None
+    assert unit is None
+
+
+def test_process_response_exact_float() -> None:
+    """Test values with a negative exponent are correctly rounded floats."""
+    nbr = 0x010A  # 266
+    # 1000002 * 10^-1, which used to be decoded as 100000.20000000001.
+    data = bytearray([0x01, 0x0A, 0x01, 0x04, 0x41, 0x00, 0x0F, 0x42, 0x42])
+
+    value, unit = Kamstrup._process_response(nbr, data)  # pylint: disable=protected-access
+
+    assert value == 100000.2
+    assert unit == "Wh"
+
+
+def test_process_response_decimal() -> None:
+    """Test the exact Decimal result mode."""
+    nbr = 0x010A  # 266
+    data = bytearray([0x01, 0x0A, 0x01, 0x04, 0xC3, 0x00, 0x0F, 0x42, 0x42])  # -1000002 * 10^-3
+
+    value, unit = Kamstrup._process_response(nbr, data, exact=True)  # pylint: disable=protected-access
+
+    assert value == Decimal("-1000.002")
+    assert unit == "Wh"
+
+    data = bytearray([0x01, 0x0A, 0x01, 0x01, 0x02, 0x07])  # 7 * 10^2
+    value, _ = Kamstrup._process_response(nbr, data, exact=True)  # pylint: disable=protected-access
+    assert value == Decimal(700)
+
+
+async def test_get_values_exact() -> None:
+    """Test get_values returns Decimal values in exact mode."""
+    kamstrup = Kamstrup("test_url", 9600, 1.0, exact=True)
+
+    with (
+        patch.object(kamstrup, "_write"),
+        patch.object(kamstrup, "_receive") as mock_receive,
+    ):
+        mock_receive.return_value = bytearray([0x3F, 0x10, 0x00, 0x3C, 0x08, 0x02, 0x42, 0x12, 0x34])
+
+        result = await kamstrup.get_values([60])
+
+    assert result == {60: (Decimal("46.60"), "GJ")}
+
+
+def test_process_response_offset() -> None:
+    """Test response processing at an offset."""
+    data = bytearray([0x3F, 0x10, 0x00, 0x3C, 0x08, 0x02, 0x00, 0x12, 0x34])
+
+    value, unit = Kamstrup._process_response(60, memoryview(data), 2)  # pylint: disable=protected-access
+
+    assert value == 0x1234
+    assert unit == "GJ"
 
 
 async def test_get_values_too_many_values() -> None:
@@ -563,7 +1038,7 @@ async def test_get_values_too_many_values() -> None:
     many_values = list(range(1, 12))  # 11 values
 
     with (
-        patch.object(kamstrup, "_send") as mock_send,
+        patch.object(kamstrup, "_write") as mock_write,
         patch.object(kamstrup, "_receive") as mock_receive,
     ):
         # Create proper response for first 8 values
@@ -575,7 +1050,7 @@ async def test_get_values_too_many_values() -> None:
         result = await kamstrup.get_values(many_values)
 
     assert result is not None  # Should still return data for first 8 values
-    mock_send.assert_called_once()
+    mock_write.assert_called_once()
 
 
 async def test_get_values_no_response() -> None:
@@ -583,7 +1058,7 @@ async def test_get_values_no_response() -> None:
     kamstrup = Kamstrup("test_url", 9600, 1.0)
 
     with (
-        patch.object(kamstrup, "_send") as mock_send,
+        patch.object(kamstrup, "_write") as mock_write,
         patch.object(kamstrup, "_receive") as mock_receive,
     ):
         mock_receive.return_value = None
@@ -591,7 +1066,7 @@ async def test_get_values_no_response() -> None:
         result = await kamstrup.get_values([60])
 
     assert result is None
-    mock_send.assert_called_once()
+    mock_write.assert_called_once()
 
 
 async def test_get_values_wrong_address_or_cid() -> None:
@@ -599,7 +1074,7 @@ async def test_get_values_wrong_address_or_cid() -> None:
     kamstrup = Kamstrup("test_url", 9600, 1.0)
 
     with (
-        patch.object(kamstrup, "_send") as mock_send,
+        patch.object(kamstrup, "_write") as mock_write,
         patch.object(kamstrup, "_receive") as mock_receive,
     ):
         # Wrong CID (should be 0x10)
@@ -608,4 +1083,4 @@ async def test_get_values_wrong_address_or_cid() -> None:
         result = await kamstrup.get_values([60])
 
     assert result is None
-    mock_send.assert_called_once()
+    mock_write.assert_called_once()
@@ -0,0 +1,214 @@
+"""Tests for the KMP frame assembler and protocol."""
+
+import asyncio
+from unittest.mock import Mock, patch
+
+import pytest
+
+from custom_components.kamstrup_403.pykamstrup.const import FRAME_SIZE_MAX
+from custom_components.kamstrup_403.pykamstrup.kamstrup import Kamstrup
+from custom_components.kamstrup_403.pykamstrup.protocol import FrameAssembler, KamstrupProtocol
+
+ECHO = bytes([0x80, 0x3F, 0x10, 0x01, 0x00, 0x3C, 0xB2, 0x5F, 0x0D])
+
+
+def _response(payload: bytes) -> bytes:
+    """Build a response frame (without escapes) for a payload."""
+    crc = Kamstrup._crc_1021(bytes(2), Kamstrup._crc_1021(payload))  # pylint: disable=protected-access
+    return bytes([0x40, *payload, crc >> 8, crc & 0xFF, 0x0D])
+
+
+def _protocol() -> tuple[KamstrupProtocol, Mock]:
+    """Create a protocol connected to a mock transport."""
+    transport = Mock(spec=asyncio.WriteTransport)
+    protocol = KamstrupProtocol()
+    protocol.connection_made(transport)
+    return protocol, transport
+
+
+def test_assembler_skips_echo() -> None:
+    """Test the echo and noise before the start byte are skipped."""
+    assembler = FrameAssembler()
+
+    assert assembler.feed(ECHO) is None
+    assert not assembler.started
+    assert assembler.feed(bytes([0x40, 0x3F])) is None
+    assert assembler.started
+    assert assembler.feed(bytes([0x10, 0x0D, 0x00])) == bytearray([0x40, 0x3F, 0x10, 0x0D])
+    assert not assembler.started
+
+
+def test_assembler_restarts_on_start_byte() -> None:
+    """Test a new start byte restarts the frame."""
+    assembler = FrameAssembler()
+
+    assert assembler.feed(bytes([0x40, 0x3F, 0x40, 0x10])) is None
+    assert assembler.feed(bytes([0x0D])) == bytearray([0x40, 0x10, 0x0D])
+
+
+def test_assembler_overflow() -> None:
+    """Test the assembler reports a frame that grows too large."""
+    assembler = FrameAssembler()
+
+    assembler.feed(bytes([0x40]))
+    assembler.feed(bytes(FRAME_SIZE_MAX))
+    assert assembler.error == f"Frame exceeds {FRAME_SIZE_MAX} bytes"
+
+    assembler.reset()
+    assert not assembler.started
+    assert assembler.error is None
+
+
+def test_assembler_keeps_skipped() -> None:
+    """Test the data before the start byte is kept for echo detection."""
+    assembler = FrameAssembler()
+
+    assembler.feed(ECHO[:4])
+    assembler.feed(ECHO[4:] + bytes([0x40, 0x3F, 0x0D]))
+    assert assembler.skipped == bytearray(ECHO)
+
+
+def test_assembler_verifies_echo() -> None:
+    """Test the echo is verified when it's expected, even across chunks."""
+    assembler = FrameAssembler()
+    assembler.reset(ECHO)
+
+    assert assembler.feed(ECHO[:4]) is None
+    assert assembler.feed(ECHO[4:] + bytes([0x40, 0x3F])) is None
+    assert assembler.feed(bytes([0x0D])) == bytearray([0x40, 0x3F, 0x0D])
+    assert assembler.error is None
+
+    assembler.reset(ECHO)
+    assert assembler.feed(ECHO[:4] + bytes([0x40])) is None
+    assert assembler.error == "Echo mismatch"
+    # Nothing is accepted after a mismatch.
+    assert assembler.feed(bytes([0x40, 0x3F, 0x0D])) is None
+
+
+async def test_protocol_request() -> None:
+    """Test a response is assembled from chunks and resolves the request."""
+    protocol, transport = _protocol()
+
+    protocol.send(ECHO, 1.0, 0.1)
+    transport.write.assert_called_once_with(ECHO)
+
+    loop = asyncio.get_running_loop()
+    response = _response(bytes([0x3F, 0x10]))
+    loop.call_soon(protocol.data_received, ECHO + response[:2])
+    loop.call_soon(protocol.data_received, response[2:])
+
+    assert await protocol.receive(1.0) == bytearray(response)
+
+
+async def test_protocol_first_byte_timeout() -> None:
+    """Test the request ends when the meter doesn't start its response in time."""
+    protocol, _ = _protocol()
+
+    protocol.send(ECHO, 0.01, 0.01)
+    loop = asyncio.get_running_loop()
+    loop.call_soon(protocol.data_received, ECHO)
+
+    assert await protocol.receive(1.0) is None
+
+
+async def test_protocol_inter_byte_timeout() -> None:
+    """Test the request ends when the response stalls."""
+    protocol, _ = _protocol()
+
+    protocol.send(ECHO, 1.0, 0.01)
+    loop = asyncio.get_running_loop()
+    loop.call_soon(protocol.data_received, bytes([0x40, 0x3F]))
+
+    assert await protocol.receive(1.0) is None
+    assert protocol.assembler.buffer == bytearray([0x40, 0x3F])
+
+
+async def test_protocol_frame_timeout() -> None:
+    """Test the request ends when the frame deadline passes, even while data keeps arriving."""
+    protocol, _ = _protocol()
+
+    protocol.send(ECHO, 1.0, 1.0)
+    loop = asyncio.get_running_loop()
+    loop.call_soon(protocol.data_received, bytes([0x40]))
+
+    assert await protocol.receive(0.01) is None
+
+
+async def test_protocol_overflow() -> None:
+    """Test the request ends when the frame grows too large."""
+    protocol, _ = _protocol()
+
+    protocol.send(ECHO, 1.0, 1.0)
+    protocol.data_received(bytes([0x40]))
+    protocol.data_received(bytes(FRAME_SIZE_MAX))
+
+    assert await protocol.receive(1.0) is None
+
+
+async def test_protocol_echo_mismatch() -> None:
+    """Test the request ends as soon as the echo doesn't match."""
+    protocol, _ = _protocol()
+
+    protocol.send(ECHO, 1.0, 1.0, ECHO)
+    protocol.data_received(bytes([0x80, 0x00]))
+
+    assert await protocol.receive(1.0) is None
+
+
+async def test_protocol_connection_lost() -> None:
+    """Test a pending request fails when the connection is lost."""
+    protocol, _ = _protocol()
+
+    protocol.send(ECHO, 1.0, 1.0)
+    protocol.connection_lost(None)
+
+    assert protocol.transport is None
+    with pytest.raises(ConnectionError):
+        await protocol.receive(1.0)
+
+
+def test_protocol_unsolicited_data() -> None:
+    """Test data without a pending request is dropped."""
+    protocol, _ = _protocol()
+
+    protocol.data_received(_response(bytes([0x3F, 0x10])))
+
+    assert not protocol.assembler.started
+
+
+async def test_protocol_send_not_connected() -> None:
+    """Test sending without a transport."""
+    protocol = KamstrupProtocol()
+
+    with pytest.raises(RuntimeError, match="Transport not available"):
+        protocol.send(ECHO, 1.0, 1.0)
+
+
+async def test_kamstrup_with_protocol() -> None:
+    """Test getting a value through the protocol based connection."""
+    protocol, transport = _protocol()
+
+    def reply(data: bytes) -> None:
+        # The IR head echoes the request, then the meter responds.
+        response = _response(bytes([0x3F, 0x10, 0x00, 0x3C, 0x08, 0x02, 0x00, 0x12, 0x34]))
+        asyncio.get_running_loop().call_soon(protocol.data_received, data + response)
+
+    transport.write.side_effect = reply
+
+    with patch("custom_components.kamstrup_403.pykamstrup.kamstrup.serialx.create_serial_connection") as mock_create:
+        mock_create.return_value = (transport, protocol)
+
+        kamstrup = Kamstrup("test_url", 9600, 1.0, use_protocol=True)
+        value, unit = await kamstrup.get_value(60)
+
+        # Connected once, on first use.
+        assert mock_create.call_count == 1
+        assert mock_create.call_args.kwargs == {"url": "test_url", "baudrate": 9600}
+
+    assert value == 0x1234
+    assert unit == "GJ"
+    assert [item["direction"] for item in kamstrup.trace()] == ["TX", "RX"]
+
+    await kamstrup.disconnect()
+    transport.close.assert_called_once()
+    assert kamstrup.protocol is None
@@ -0,0 +1,65 @@
+"""Test for the registers supported by the meter."""
+
+from typing import Any
+
+from homeassistant.core import HomeAssistant
+
+from custom_components.kamstrup_403.capabilities import QUARANTINE_BACKOFF, QUARANTINE_BACKOFF_MAX, QUARANTINE_FAILURES, KamstrupCapabilities
+
+
+async def test_discovered(hass: HomeAssistant, hass_storage: dict[str, Any]) -> None:
+    """Test discovered registers are stored and loaded."""
+    capabilities = KamstrupCapabilities(hass, "test_entry")
+    assert capabilities.unknown([60, 68, 80]) == [60, 68, 80]
+
+    capabilities.discovered({60: True, 80: False})
+    await capabilities.async_save()
+
+    assert capabilities.unknown([60, 68, 80]) == [68]
+    assert capabilities.is_supported(60)
+    assert capabilities.is_supported(68)
+    assert not capabilities.is_supported(80)
+    assert hass_storage["kamstrup_403.test_entry"]["data"]["unsupported"] == [80]
+
+    loaded = KamstrupCapabilities(hass, "test_entry")
+    await loaded.async_load()
+    assert loaded.supported == {60}
+    assert loaded.unsupported == {80}
+
+    await loaded.async_remove()
+    assert "kamstrup_403.test_entry" not in hass_storage
+
+
+async def test_quarantine(hass: HomeAssistant) -> None:
+    """Test a register that keeps failing is quarantined, with a backoff that doubles on every failed re-probe."""
+    capabilities = KamstrupCapabilities(hass, "test_entry")
+
+    for _ in range(QUARANTINE_FAILURES - 1):
+        capabilities.record(60, success=False, now=0.0)
+    assert not capabilities.is_quarantined(60, 0.0)
+
+    capabilities.record(60, success=False, now=0.0)
+    assert capabilities.is_quarantined(60, QUARANTINE_BACKOFF - 1)
+    assert not capabilities.is_quarantined(60, QUARANTINE_BACKOFF)
+
+    # The re-probe fails.
+    capabilities.record(60, success=False, now=QUARANTINE_BACKOFF)
+    assert capabilities.is_quarantined(60, 3 * QUARANTINE_BACKOFF - 1)
+    assert not capabilities.is_quarantined(60, 3 * QUARANTINE_BACKOFF)
+
+    # The re-probe succeeds.
+    capabilities.record(60, success=True, now=3 * QUARANTINE_BACKOFF)
+    capabilities.record(60, success=False, now=3 * QUARANTINE_BACKOFF)
+    assert not capabilities.is_quarantined(60, 3 * QUARANTINE_BACKOFF)
+
+
+async def test_quarantine_backoff_max(hass: HomeAssistant) -> None:
+    """Test the quarantine backoff is limited."""
+    capabilities = KamstrupCapabilities(hass, "test_entry")
+
+    for _ in range(100):
+        capabilities.record(60, success=False, now=0.0)
+
+    assert capabilities.is_quarantined(60, QUARANTINE_BACKOFF_MAX - 1)
+    assert not capabilities.is_quarantined(60, QUARANTINE_BACKOFF_MAX)
+    assert capabilities.as_dict()["failures"] == {"60": 100}
@@ -1,19 +1,21 @@
 """Test for config flow."""
 
 from collections.abc import Generator
-from unittest.mock import patch
+from typing import Any
+from unittest.mock import AsyncMock, Mock, patch
 
 import pytest
 from homeassistant.config_entries import SOURCE_USER
-from homeassistant.const import CONF_PORT, CONF_SCAN_INTERVAL, CONF_TIMEOUT
+from homeassistant.const import CONF_ADDRESS, CONF_PORT, CONF_SCAN_INTERVAL, CONF_TIMEOUT
 from homeassistant.core import HomeAssistant
 from homeassistant.data_entry_flow import FlowResultType
+from pytest_homeassistant_custom_component.common import MockConfigEntry
 
-from custom_components.kamstrup_403.const import DOMAIN
+from custom_components.kamstrup_403.const import CONF_ECHO_MODE, DOMAIN
 
 from . import get_mock_config_data, setup_integration, unload_integration
 
-MOCK_UPDATE_CONFIG = {CONF_SCAN_INTERVAL: 120, CONF_TIMEOUT: 1.0}
+MOCK_UPDATE_CONFIG = {CONF_SCAN_INTERVAL: 120, CONF_TIMEOUT: 1.0, CONF_ECHO_MODE: "always"}
 
 
 @pytest.fixture(autouse=True, name="bypass_setup")
@@ -36,12 +38,50 @@ async def test_successful_config_flow(hass: HomeAssistant) -> None:
     # If a user were to fill in all fields, it would result in this function call
     result2 = await hass.config_entries.flow.async_configure(result["flow_id"], user_input=config_data)
 
+    # Check that the config flow continues with the address of the meter
+    assert result2["type"] == FlowResultType.FORM
+    assert result2["step_id"] == "address"
+
+    result3 = await hass.config_entries.flow.async_configure(result["flow_id"], user_input={CONF_ADDRESS: 63})
+
     # Check that the config flow is complete and a new entry is created with
     # the input data
-    assert result2["type"] == FlowResultType.CREATE_ENTRY
-    assert result2["title"] == config_data[CONF_PORT]
-    assert result2["data"] == config_data
-    assert result2["result"]
+    assert result3["type"] == FlowResultType.CREATE_ENTRY
+    assert result3["title"] == config_data[CONF_PORT]
+    assert result3["data"] == {**config_data, CONF_ADDRESS: 63}
+    assert result3["result"]
+
+
+async def test_config_flow_meters_on_port(hass: HomeAssistant) -> None:
+    """Test several meters can be added on a port, but not the same one twice."""
+    config_data = get_mock_config_data()
+
+    result = await hass.config_entries.flow.async_init(DOMAIN, context={"source": SOURCE_USER})
+    result = await hass.config_entries.flow.async_configure(result["flow_id"], user_input=config_data)
+    result = await hass.config_entries.flow.async_configure(result["flow_id"], user_input={CONF_ADDRESS: 2})
+
+    assert result["type"] == FlowResultType.CREATE_ENTRY
+    assert result["title"] == f"{config_data[CONF_PORT]} (2)"
+    assert result["data"] == {**config_data, CONF_ADDRESS: 2}
+
+    result = await hass.config_entries.flow.async_init(DOMAIN, context={"source": SOURCE_USER})
+    result = await hass.config_entries.flow.async_configure(result["flow_id"], user_input=config_data)
+    result = await hass.config_entries.flow.async_configure(result["flow_id"], user_input={CONF_ADDRESS: 2})
+
+    assert result["type"] == FlowResultType.ABORT
+    assert result["reason"] == "already_configured"
+
+
+async def test_config_flow_entry_without_address(hass: HomeAssistant) -> None:
+    """Test an entry without an address is the meter at the default address."""
+    MockConfigEntry(domain=DOMAIN, data=get_mock_config_data()).add_to_hass(hass)
+
+    result = await hass.config_entries.flow.async_init(DOMAIN, context={"source": SOURCE_USER})
+    result = await hass.config_entries.flow.async_configure(result["flow_id"], user_input=get_mock_config_data())
+    result = await hass.config_entries.flow.async_configure(result["flow_id"], user_input={CONF_ADDRESS: 63})
+
+    assert result["type"] == FlowResultType.ABORT
+    assert result["reason"] == "already_configured"
 
 
 async def test_unsuccessful_config_flow(hass: HomeAssistant) -> None:
@@ -68,11 +108,12 @@ async def test_unsuccessful_config_flow(hass: HomeAssistant) -> None:
 
 
 async def test_step_reconfigure(hass: HomeAssistant) -> None:
-    """Test for reconfigure step."""
+    """Test for reconfigure step, the stored registers and readings are of the meter on the old port."""
     updated_data = {
         CONF_PORT: "/dev/ttyUSB1",
     }
     config_entry = await setup_integration(hass)
+    config_entry.runtime_data = Mock(async_remove_stores=AsyncMock())
 
     result = await config_entry.start_reconfigure_flow(hass)
     assert result["type"] == FlowResultType.FORM
@@ -82,11 +123,33 @@ async def test_step_reconfigure(hass: HomeAssistant) -> None:
         result["flow_id"],
         updated_data,
     )
-    assert result2["type"] == FlowResultType.ABORT
-    assert result2["reason"] == "reconfigure_successful"
+    assert result2["type"] == FlowResultType.FORM
+    assert result2["step_id"] == "address"
+
+    result3 = await hass.config_entries.flow.async_configure(result["flow_id"], {CONF_ADDRESS: 63})
+    assert result3["type"] == FlowResultType.ABORT
+    assert result3["reason"] == "reconfigure_successful"
 
     assert config_entry.title == updated_data[CONF_PORT]
-    assert config_entry.data == {**updated_data}
+    assert config_entry.data == {**updated_data, CONF_ADDRESS: 63}
+    config_entry.runtime_data.async_remove_stores.assert_awaited_once()
+
+
+async def test_step_reconfigure_not_loaded(hass: HomeAssistant, hass_storage: dict[str, Any]) -> None:
+    """Test the stored registers and readings are only removed when the entry is for another meter."""
+    for address, removed in ((63, False), (2, True)):
+        config_entry = MockConfigEntry(domain=DOMAIN, entry_id=f"entry_{address}", data=get_mock_config_data())
+        config_entry.add_to_hass(hass)
+        keys = (f"kamstrup_403.entry_{address}", f"kamstrup_403.entry_{address}.snapshot")
+        for key in keys:
+            hass_storage[key] = {"version": 1, "key": key, "data": {}}
+
+        result = await config_entry.start_reconfigure_flow(hass)
+        result = await hass.config_entries.flow.async_configure(result["flow_id"], get_mock_config_data())
+        result = await hass.config_entries.flow.async_configure(result["flow_id"], {CONF_ADDRESS: address})
+        assert result["reason"] == "reconfigure_successful"
+
+        assert all((key not in hass_storage) is removed for key in keys)
 
 
 async def test_options_flow(hass: HomeAssistant) -> None:
@@ -1,17 +1,28 @@
 """Test for data update coordinator."""
 
-from datetime import timedelta
-from unittest.mock import Mock
+import asyncio
+import math
+from datetime import UTC, datetime, timedelta
+from typing import Any
+from unittest.mock import Mock, call, patch
 
 import pytest
 from homeassistant.core import HomeAssistant
 from homeassistant.helpers.update_coordinator import UpdateFailed
+from homeassistant.util import dt as dt_util
+from pytest_homeassistant_custom_component.common import MockConfigEntry, async_fire_time_changed
 from serialx import SerialException
 
-from custom_components.kamstrup_403.const import DOMAIN
-from custom_components.kamstrup_403.coordinator import KamstrupUpdateCoordinator
+from custom_components.kamstrup_403.capabilities import QUARANTINE_BACKOFF, QUARANTINE_FAILURES
+from custom_components.kamstrup_403.const import CONF_BAUDRATE, CONF_PROBE_BAUDRATE, DOMAIN
+from custom_components.kamstrup_403.coordinator import (
+    BAUDRATE_FALLBACK_UPDATES,
+    NEW_COMMANDS_DELAY,
+    STREAM_PUBLISH_INTERVAL,
+    KamstrupUpdateCoordinator,
+)
 
-from . import get_mock_config_entry
+from . import get_mock_config_data, get_mock_config_entry
 
 
 @pytest.fixture(name="coordinator")
@@ -25,6 +36,7 @@ def test_init(coordinator: KamstrupUpdateCoordinator, mock_kamstrup: Mock) -> No
     """Test coordinator initialization."""
     assert coordinator.name == DOMAIN
     assert coordinator.kamstrup == mock_kamstrup
+    assert coordinator.address == 0x3F
     assert coordinator.update_interval == timedelta(seconds=30)
     assert coordinator.commands == []
 
@@ -58,10 +70,24 @@ def test_unregister_command(coordinator: KamstrupUpdateCoordinator) -> None:
 
 def test_unregister_nonexistent_command_raises_error(coordinator: KamstrupUpdateCoordinator) -> None:
     """Test unregistering a command that doesn't exist raises ValueError."""
-    with pytest.raises(ValueError, match=r"list\.remove\(x\): x not in list"):
+    with pytest.raises(ValueError, match=r"Command 999 is not registered"):
         coordinator.unregister_command(999)
 
 
+def test_register_command_twice(coordinator: KamstrupUpdateCoordinator) -> None:
+    """Test a command registered twice is listed once, and stays registered until both registrations are removed."""
+    coordinator.register_command(60)
+    coordinator.register_command(68)
+    coordinator.register_command(60)
+    assert coordinator.commands == [60, 68]
+
+    coordinator.unregister_command(60)
+    assert coordinator.commands == [60, 68]
+
+    coordinator.unregister_command(60)
+    assert coordinator.commands == [68]
+
+
 def test_commands_property(coordinator: KamstrupUpdateCoordinator) -> None:
     """Test the commands property."""
     assert coordinator.commands == []
@@ -92,12 +118,22 @@ async def test_async_update_data_successful(coordinator: KamstrupUpdateCoordinat
 
     # Verify results
     assert len(result) == 3
-    assert result[60] == {"value": 1234.0, "unit": "GJ"}
-    assert result[68] == {"value": 5678.0, "unit": "m³"}
-    assert result[80] == {"value": 90.5, "unit": "kW"}
+    assert result[60].as_dict() == {"value": 1234.0, "unit": "GJ"}
+    assert result[68].as_dict() == {"value": 5678.0, "unit": "m³"}
+    assert result[80].as_dict() == {"value": 90.5, "unit": "kW"}
 
     # Verify kamstrup was called with correct commands
-    mock_kamstrup.get_values.assert_called_once_with(commands)
+    mock_kamstrup.get_values.assert_called_once_with(commands, dest_addr=0x3F)
+
+
+async def test_async_update_data_address(hass: HomeAssistant, mock_kamstrup: Mock) -> None:
+    """Test values are requested from the meter at the address of the coordinator."""
+    coordinator = KamstrupUpdateCoordinator(hass, get_mock_config_entry(), mock_kamstrup, timedelta(seconds=30), address=2)
+    coordinator.register_command(60)
+
+    await coordinator._async_update_data()  # pylint: disable=protected-access
+
+    mock_kamstrup.get_values.assert_called_once_with([60], dest_addr=2)
 
 
 async def test_async_update_data_with_chunking(coordinator: KamstrupUpdateCoordinator, mock_kamstrup: Mock) -> None:
@@ -108,7 +144,8 @@ async def test_async_update_data_with_chunking(coordinator: KamstrupUpdateCoordi
         coordinator.register_command(command)
 
     # Mock successful responses for both chunks
-    def mock_get_values(chunk: list[int]) -> dict[int, tuple[float, str]]:
+    def mock_get_values(chunk: list[int], dest_addr: int) -> dict[int, tuple[float, str]]:
+        assert dest_addr == 0x3F
         # Return values for each command in the chunk
         return {cmd: (float(cmd), "unit") for cmd in chunk}
 
@@ -120,12 +157,26 @@ async def test_async_update_data_with_chunking(coordinator: KamstrupUpdateCoordi
     # Verify results
     assert len(result) == 12
     for command in commands:
-        assert result[command] == {"value": float(command), "unit": "unit"}
+        assert result[command].as_dict() == {"value": float(command), "unit": "unit"}
 
     # Verify kamstrup was called twice (two chunks)
     assert mock_kamstrup.get_values.call_count == 2
 
 
+async def test_async_update_data_planned_batches(coordinator: KamstrupUpdateCoordinator, mock_kamstrup: Mock) -> None:
+    """Test the commands are requested in the batches planned by the client."""
+    for command in (60, 68, 1001):
+        coordinator.register_command(command)
+    mock_kamstrup.plan_batches.side_effect = None
+    mock_kamstrup.plan_batches.return_value = [[1001], [60, 68]]
+
+    result = await coordinator._async_update_data()  # pylint: disable=protected-access
+
+    mock_kamstrup.plan_batches.assert_called_once_with([60, 68, 1001], 0x3F)
+    assert mock_kamstrup.get_values.call_args_list == [call([1001], dest_addr=0x3F), call([60, 68], dest_addr=0x3F)]
+    assert result[1001].as_dict() == {"value": 12345678, "unit": None}
+
+
 async def test_async_update_data_partial_success(coordinator: KamstrupUpdateCoordinator, mock_kamstrup: Mock) -> None:
     """Test data update with partial success (some commands missing from response)."""
     commands = [60, 68, 80]
@@ -144,9 +195,9 @@ async def test_async_update_data_partial_success(coordinator: KamstrupUpdateCoor
 
     # Verify results
     assert len(result) == 3
-    assert result[60] == {"value": 1234.0, "unit": "GJ"}
-    assert result[68] == {"value": None, "unit": None}  # Missing command
-    assert result[80] == {"value": 90.5, "unit": "kW"}
+    assert result[60].as_dict() == {"value": 1234.0, "unit": "GJ"}
+    assert result[68].as_dict() == {"value": None, "unit": None}  # Missing command
+    assert result[80].as_dict() == {"value": 90.5, "unit": "kW"}
 
 
 async def test_async_update_data_serial_exception(coordinator: KamstrupUpdateCoordinator, mock_kamstrup: Mock) -> None:
@@ -163,7 +214,7 @@ async def test_async_update_data_serial_exception(coordinator: KamstrupUpdateCoo
     with pytest.raises(UpdateFailed):
         await coordinator._async_update_data()  # pylint: disable=protected-access
 
-    mock_kamstrup.get_values.assert_called_once_with(commands)
+    mock_kamstrup.get_values.assert_called_once_with(commands, dest_addr=0x3F)
 
 
 async def test_async_update_data_general_exception(coordinator: KamstrupUpdateCoordinator, mock_kamstrup: Mock) -> None:
@@ -180,7 +231,7 @@ async def test_async_update_data_general_exception(coordinator: KamstrupUpdateCo
     with pytest.raises(UpdateFailed):
         await coordinator._async_update_data()  # pylint: disable=protected-access
 
-    mock_kamstrup.get_values.assert_called_once_with(commands)
+    mock_kamstrup.get_values.assert_called_once_with(commands, dest_addr=0x3F)
 
 
 async def test_async_update_data_returns_none(coordinator: KamstrupUpdateCoordinator, mock_kamstrup: Mock) -> None:
@@ -194,8 +245,8 @@ async def test_async_update_data_returns_none(coordinator: KamstrupUpdateCoordin
 
     result = await coordinator._async_update_data()  # pylint: disable=protected-access
 
-    # When values is None, the chunk is skipped with continue, so no entries are added
-    assert result == {}
+    # When values is None, the commands have no value
+    assert result.as_dict() == {command: {"value": None, "unit": None} for command in commands}
 
 
 async def test_async_update_data_chunk_returns_none_but_adds_entries(coordinator: KamstrupUpdateCoordinator, mock_kamstrup: Mock) -> None:
@@ -215,9 +266,9 @@ async def test_async_update_data_chunk_returns_none_but_adds_entries(coordinator
 
     # All commands should have entries, missing ones get None values
     assert len(result) == 3
-    assert result[60] == {"value": 1234.0, "unit": "GJ"}
-    assert result[68] == {"value": None, "unit": None}
-    assert result[80] == {"value": None, "unit": None}
+    assert result[60].as_dict() == {"value": 1234.0, "unit": "GJ"}
+    assert result[68].as_dict() == {"value": None, "unit": None}
+    assert result[80].as_dict() == {"value": None, "unit": None}
 
 
 async def test_async_update_data_mixed_chunks_with_failures(coordinator: KamstrupUpdateCoordinator, mock_kamstrup: Mock) -> None:
@@ -240,22 +291,23 @@ async def test_async_update_data_mixed_chunks_with_failures(coordinator: Kamstru
             89: (5.0, "°C"),
         },  # First chunk success
         None,  # Second chunk returns None
+        None,  # And again when it's retried
     ]
     mock_kamstrup.get_values.side_effect = responses
 
     result = await coordinator._async_update_data()  # pylint: disable=protected-access
 
-    # Verify results - only first chunk commands get entries (second chunk is skipped)
-    assert len(result) == 8
+    # Verify results - only first chunk commands get values (second chunk has no value)
+    assert len(result) == 9
 
     # First chunk commands should have values
     expected_first_chunk = [60, 63, 68, 74, 80, 86, 87, 89]
     for command in expected_first_chunk:
-        assert result[command]["value"] is not None
-        assert result[command]["unit"] is not None
+        assert result[command].value is not None
+        assert result[command].unit is not None
 
-    # Second chunk command (97) should not be in result due to None response
-    assert 97 not in result
+    # Second chunk command (97) should have no value due to None response
+    assert result[97].value is None
 
 
 async def test_async_update_data_no_commands(coordinator: KamstrupUpdateCoordinator, mock_kamstrup: Mock) -> None:
@@ -263,8 +315,8 @@ async def test_async_update_data_no_commands(coordinator: KamstrupUpdateCoordina
     # Don't register any commands
     result = await coordinator._async_update_data()  # pylint: disable=protected-access
 
-    # Should return empty dict
-    assert result == {}
+    # Should return no readings
+    assert len(result) == 0
 
     # Kamstrup should not be called
     mock_kamstrup.get_values.assert_not_called()
@@ -278,7 +330,8 @@ async def test_async_update_data_exception_in_middle_chunk(coordinator: Kamstrup
         coordinator.register_command(command)
 
     # Mock responses: first succeeds, second fails, third never reached
-    def side_effect(chunk: list[int]) -> dict[int, tuple[float, str]]:
+    def side_effect(chunk: list[int], dest_addr: int) -> dict[int, tuple[float, str]]:
+        assert dest_addr == 0x3F
         if chunk[0] == 60:  # First chunk
             return {cmd: (float(cmd), "unit") for cmd in chunk}
         if chunk[0] == 68:  # Second chunk
@@ -312,4 +365,464 @@ async def test_async_update_data_all_commands_fail(coordinator: KamstrupUpdateCo
     # All commands should have None values
     assert len(result) == 3
     for command in commands:
-        assert result[command] == {"value": None, "unit": None}
+        assert result[command].as_dict() == {"value": None, "unit": None}
+
+
+async def test_async_update_data_baudrate_fallback(hass: HomeAssistant, mock_kamstrup: Mock) -> None:
+    """Test a slower baudrate is stored when the meter stops answering."""
+    config_entry = get_mock_config_entry()
+    config_entry.add_to_hass(hass)
+    coordinator = KamstrupUpdateCoordinator(hass, config_entry, mock_kamstrup, timedelta(seconds=30), retry_budget=0)
+    coordinator.register_command(60)
+
+    mock_kamstrup.baudrate = 9600
+    mock_kamstrup.get_values.return_value = None
+
+    with patch.object(hass.config_entries, "async_schedule_reload") as mock_schedule_reload:
+        for _ in range(BAUDRATE_FALLBACK_UPDATES - 1):
+            await coordinator._async_update_data()  # pylint: disable=protected-access
+        assert CONF_BAUDRATE not in config_entry.data
+        mock_schedule_reload.assert_not_called()
+
+        await coordinator._async_update_data()  # pylint: disable=protected-access
+    assert config_entry.data[CONF_BAUDRATE] == 4800
+    assert config_entry.data[CONF_PROBE_BAUDRATE] is True
+    mock_schedule_reload.assert_called_once_with(config_entry.entry_id)
+
+
+async def test_async_update_data_baudrate_probe_again(hass: HomeAssistant, mock_kamstrup: Mock) -> None:
+    """Test the baudrate is probed again when the meter answers at a baudrate that isn't confirmed."""
+    config_entry = MockConfigEntry(
+        domain=DOMAIN,
+        entry_id="test_entry",
+        data={**get_mock_config_data(), CONF_BAUDRATE: 4800, CONF_PROBE_BAUDRATE: True},
+    )
+    config_entry.add_to_hass(hass)
+    coordinator = KamstrupUpdateCoordinator(hass, config_entry, mock_kamstrup, timedelta(seconds=30))
+    coordinator.register_command(60)
+
+    mock_kamstrup.get_values.return_value = {60: (1234.0, "GJ")}
+    with patch.object(hass.config_entries, "async_schedule_reload") as mock_schedule_reload:
+        await coordinator._async_update_data()  # pylint: disable=protected-access
+
+    assert config_entry.data == get_mock_config_data()
+    mock_schedule_reload.assert_called_once_with(config_entry.entry_id)
+
+
+async def test_async_update_data_baudrate_no_fallback(hass: HomeAssistant, mock_kamstrup: Mock) -> None:
+    """Test there's no fallback below the slowest baudrate, or while the meter answers now and then."""
+    config_entry = get_mock_config_entry()
+    config_entry.add_to_hass(hass)
+    # Read the command every update, also after a successful reading.
+    coordinator = KamstrupUpdateCoordinator(hass, config_entry, mock_kamstrup, timedelta(seconds=30), retry_budget=0, register_ttls={60: 0.0})
+    coordinator.register_command(60)
+
+    mock_kamstrup.get_values.side_effect = [None, None, {60: (1.0, "GJ")}, None, None]
+    mock_kamstrup.baudrate = 9600
+    for _ in range(5):
+        await coordinator._async_update_data()  # pylint: disable=protected-access
+    assert CONF_BAUDRATE not in config_entry.data
+
+    mock_kamstrup.get_values.side_effect = None
+    mock_kamstrup.get_values.return_value = None
+    mock_kamstrup.baudrate = 1200
+    for _ in range(BAUDRATE_FALLBACK_UPDATES):
+        await coordinator._async_update_data()  # pylint: disable=protected-access
+    assert CONF_BAUDRATE not in config_entry.data
+
+
+async def test_async_update_data_retry_chunk(coordinator: KamstrupUpdateCoordinator, mock_kamstrup: Mock) -> None:
+    """Test a chunk that failed is requested again in the same update."""
+    commands = [60, 68, 80]
+    for command in commands:
+        coordinator.register_command(command)
+
+    mock_kamstrup.get_values.side_effect = [None, {60: (1234.0, "GJ"), 68: (5678.0, "m³"), 80: (90.5, "kW")}]
+
+    result = await coordinator._async_update_data()  # pylint: disable=protected-access
+
+    assert result[68].as_dict() == {"value": 5678.0, "unit": "m³"}
+    assert mock_kamstrup.get_values.call_args_list == [call(commands, dest_addr=0x3F)] * 2
+    mock_kamstrup.get_value.assert_not_called()
+
+
+async def test_async_update_data_retry_single(coordinator: KamstrupUpdateCoordinator, mock_kamstrup: Mock) -> None:
+    """Test only the failed commands are retried, one by one when they fail again."""
+    commands = [60, 68, 80]
+    for command in commands:
+        coordinator.register_command(command)
+
+    mock_kamstrup.get_values.return_value = {60: (1234.0, "GJ")}
+    mock_kamstrup.get_value.side_effect = [(5678.0, "m³"), (None, None)]
+
+    result = await coordinator._async_update_data()  # pylint: disable=protected-access
+
+    assert result[60].as_dict() == {"value": 1234.0, "unit": "GJ"}
+    assert result[68].as_dict() == {"value": 5678.0, "unit": "m³"}
+    assert result[80].as_dict() == {"value": None, "unit": None}
+    assert mock_kamstrup.get_values.call_args_list == [call(commands, dest_addr=0x3F), call([68, 80], dest_addr=0x3F)]
+    assert mock_kamstrup.get_value.call_args_list == [call(68, dest_addr=0x3F), call(80, dest_addr=0x3F)]
+
+
+async def test_async_update_data_retry_none_value(coordinator: KamstrupUpdateCoordinator, mock_kamstrup: Mock) -> None:
+    """Test a value of None from the meter is a failure, the command is retried."""
+    coordinator.register_command(60)
+    coordinator.register_command(68)
+
+    mock_kamstrup.get_values.side_effect = [{60: (1234.0, "GJ"), 68: (None, None)}, {68: (5678.0, "m³")}]
+
+    result = await coordinator._async_update_data()  # pylint: disable=protected-access
+
+    assert result[68].as_dict() == {"value": 5678.0, "unit": "m³"}
+    assert mock_kamstrup.get_values.call_args_list == [call([60, 68], dest_addr=0x3F), call([68], dest_addr=0x3F)]
+
+
+async def test_async_update_data_retry_budget(hass: HomeAssistant, mock_kamstrup: Mock) -> None:
+    """Test retries stop when the retry budget is spent."""
+    coordinator = KamstrupUpdateCoordinator(hass, get_mock_config_entry(), mock_kamstrup, timedelta(seconds=30), retry_budget=2)
+    commands = [60, 68, 80]
+    for command in commands:
+        coordinator.register_command(command)
+
+    mock_kamstrup.get_values.return_value = None
+
+    result = await coordinator._async_update_data()  # pylint: disable=protected-access
+
+    assert result.as_dict() == {command: {"value": None, "unit": None} for command in commands}
+    assert mock_kamstrup.get_values.call_count == 2
+    assert mock_kamstrup.get_value.call_count == 1
+
+
+async def test_async_update_data_cached(coordinator: KamstrupUpdateCoordinator, mock_kamstrup: Mock) -> None:
+    """Test registers with a time to live are only read again once they expire."""
+    commands = [60, 139, 1001]
+    for command in commands:
+        coordinator.register_command(command)
+
+    mock_kamstrup.get_values.return_value = {60: (1234.0, "GJ"), 139: (500.0, "l/h"), 1001: (12345678, None)}
+
+    with patch("custom_components.kamstrup_403.coordinator.time.monotonic") as mock_monotonic:
+        mock_monotonic.return_value = 1000.0
+        await coordinator._async_update_data()  # pylint: disable=protected-access
+
+        # The monthly max and serial number are cached.
+        mock_monotonic.return_value = 1000.0 + 3600
+        result = await coordinator._async_update_data()  # pylint: disable=protected-access
+        assert result.as_dict() == {
+            60: {"value": 1234.0, "unit": "GJ"},
+            139: {"value": 500.0, "unit": "l/h"},
+            1001: {"value": 12345678, "unit": None},
+        }
+
+        # The monthly max expires, the serial number never does.
+        mock_monotonic.return_value = 1000.0 + 24 * 3600
+        await coordinator._async_update_data()  # pylint: disable=protected-access
+
+    assert mock_kamstrup.get_values.call_args_list == [
+        call(commands, dest_addr=0x3F),
+        call([60], dest_addr=0x3F),
+        call([60, 139], dest_addr=0x3F),
+    ]
+
+
+async def test_async_update_data_all_cached(hass: HomeAssistant, mock_kamstrup: Mock) -> None:
+    """Test nothing is requested when all values are cached, and failed readings aren't cached."""
+    coordinator = KamstrupUpdateCoordinator(hass, get_mock_config_entry(), mock_kamstrup, timedelta(seconds=30), register_ttls={60: 60.0, 68: 60.0})
+    coordinator.register_command(60)
+    coordinator.register_command(68)
+
+    mock_kamstrup.get_values.return_value = {60: (1234.0, "GJ"), 68: (None, None)}
+    await coordinator._async_update_data()  # pylint: disable=protected-access
+    mock_kamstrup.get_values.return_value = {68: (5678.0, "m³")}
+    await coordinator._async_update_data()  # pylint: disable=protected-access
+    mock_kamstrup.get_values.reset_mock()
+
+    result = await coordinator._async_update_data()  # pylint: disable=protected-access
+
+    assert result.as_dict() == {60: {"value": 1234.0, "unit": "GJ"}, 68: {"value": 5678.0, "unit": "m³"}}
+    mock_kamstrup.get_values.assert_not_called()
+
+    # A command registered again is read again.
+    coordinator.unregister_command(60)
+    coordinator.register_command(60)
+    mock_kamstrup.get_values.return_value = {60: (1234.0, "GJ")}
+    await coordinator._async_update_data()  # pylint: disable=protected-access
+    mock_kamstrup.get_values.assert_called_once_with([60], dest_addr=0x3F)
+
+
+def test_update_interval(hass: HomeAssistant, mock_kamstrup: Mock) -> None:
+    """Test the coordinator updates as often as the fastest registered command with a poll interval needs."""
+    register_ttls = {80: 10.0, 140: 30.0, 1001: math.inf}
+    coordinator = KamstrupUpdateCoordinator(
+        hass, get_mock_config_entry(), mock_kamstrup, timedelta(seconds=60), register_ttls=register_ttls, poll_intervals={80: 10.0}
+    )
+
+    coordinator.register_command(1001)
+    assert coordinator.update_interval == timedelta(seconds=60)
+
+    # A time to live only skips values that are still valid.
+    coordinator.register_command(140)
+    assert coordinator.update_interval == timedelta(seconds=60)
+
+    coordinator.register_command(80)
+    assert coordinator.update_interval == timedelta(seconds=10)
+
+    coordinator.unregister_command(80)
+    assert coordinator.update_interval == timedelta(seconds=60)
+
+
+async def test_async_update_data_tiers(hass: HomeAssistant, mock_kamstrup: Mock) -> None:
+    """Test commands of all tiers that are due are requested together."""
+    coordinator = KamstrupUpdateCoordinator(
+        hass, get_mock_config_entry(), mock_kamstrup, timedelta(seconds=60), register_ttls={80: 10.0}, poll_intervals={80: 10.0}
+    )
+    coordinator.register_command(60)
+    coordinator.register_command(80)
+
+    mock_kamstrup.get_values.return_value = {60: (1234.0, "GJ"), 80: (90.5, "kW")}
+
+    with patch("custom_components.kamstrup_403.coordinator.time.monotonic") as mock_monotonic:
+        for now in (1000.0, 1010.0, 1020.0, 1060.0):
+            mock_monotonic.return_value = now
+            await coordinator._async_update_data()  # pylint: disable=protected-access
+
+    assert mock_kamstrup.get_values.call_args_list == [
+        call([60, 80], dest_addr=0x3F),
+        call([80], dest_addr=0x3F),
+        call([80], dest_addr=0x3F),
+        call([60, 80], dest_addr=0x3F),
+    ]
+
+
+async def test_async_update_data_quarantine(coordinator: KamstrupUpdateCoordinator, mock_kamstrup: Mock) -> None:
+    """Test a command that keeps failing while the meter answers is quarantined, and re-probed later."""
+    coordinator.register_command(60)
+    coordinator.register_command(68)
+    mock_kamstrup.get_values.return_value = {60: (1234.0, "GJ")}
+
+    with patch("custom_components.kamstrup_403.coordinator.time.time", return_value=1000.0):
+        for _ in range(QUARANTINE_FAILURES):
+            coordinator._cache.clear()  # pylint: disable=protected-access
+            await coordinator._async_update_data()  # pylint: disable=protected-access
+        assert coordinator.capabilities.is_quarantined(68, 1000.0)
+
+        mock_kamstrup.get_values.reset_mock()
+        coordinator._cache.clear()  # pylint: disable=protected-access
+        await coordinator._async_update_data()  # pylint: disable=protected-access
+        mock_kamstrup.get_values.assert_called_once_with([60], dest_addr=0x3F)
+
+    with patch("custom_components.kamstrup_403.coordinator.time.time", return_value=1000.0 + QUARANTINE_BACKOFF):
+        mock_kamstrup.get_values.reset_mock()
+        mock_kamstrup.get_values.return_value = {60: (1234.0, "GJ"), 68: (5678.0, "m³")}
+        coordinator._cache.clear()  # pylint: disable=protected-access
+        result = await coordinator._async_update_data()  # pylint: disable=protected-access
+
+    mock_kamstrup.get_values.assert_called_once_with([60, 68], dest_addr=0x3F)
+    assert result[68].as_dict() == {"value": 5678.0, "unit": "m³"}
+    assert not coordinator.capabilities.is_quarantined(68, 1000.0 + QUARANTINE_BACKOFF)
+
+
+async def test_async_update_data_no_quarantine_without_answer(coordinator: KamstrupUpdateCoordinator, mock_kamstrup: Mock) -> None:
+    """Test commands aren't quarantined while the meter doesn't answer at all."""
+    coordinator.register_command(60)
+    mock_kamstrup.get_values.return_value = None
+
+    for _ in range(QUARANTINE_FAILURES):
+        await coordinator._async_update_data()  # pylint: disable=protected-access
+
+    assert coordinator.capabilities.as_dict()["failures"] == {}
+
+
+async def test_async_discover(coordinator: KamstrupUpdateCoordinator, mock_kamstrup: Mock) -> None:
+    """Test only registers that weren't discovered before are discovered."""
+    mock_kamstrup.discover_registers.side_effect = None
+    mock_kamstrup.discover_registers.return_value = {60: True, 80: False}
+
+    await coordinator.async_discover([60, 68, 80])
+    mock_kamstrup.discover_registers.assert_called_once_with([60, 68, 80], dest_addr=0x3F)
+    assert not coordinator.capabilities.is_supported(80)
+
+    mock_kamstrup.discover_registers.reset_mock()
+    await coordinator.async_discover([60, 80])
+    mock_kamstrup.discover_registers.assert_not_called()
+
+    mock_kamstrup.discover_registers.side_effect = SerialException("Device disconnected")
+    await coordinator.async_discover([68])
+    assert coordinator.capabilities.unknown([68]) == [68]
+
+
+async def test_async_restore(hass: HomeAssistant, hass_storage: dict[str, Any], mock_kamstrup: Mock) -> None:
+    """Test the last readings are stored and restored, with the time they were read."""
+    coordinator = KamstrupUpdateCoordinator(hass, get_mock_config_entry(), mock_kamstrup, timedelta(seconds=30))
+    assert not await coordinator.async_restore()
+
+    coordinator.register_command(60)
+    mock_kamstrup.get_values.return_value = {60: (1234.0, "GJ")}
+    with patch("custom_components.kamstrup_403.coordinator.time.time", return_value=1700000000.0):
+        await coordinator.async_refresh()
+        await coordinator._snapshot_store.async_save(coordinator._snapshot_to_save())  # pylint: disable=protected-access
+    assert hass_storage["kamstrup_403.test_entry.snapshot"]["data"]["data"] == {"60": {"value": 1234.0, "unit": "GJ"}}
+
+    restored = KamstrupUpdateCoordinator(hass, get_mock_config_entry(), mock_kamstrup, timedelta(seconds=30))
+    assert await restored.async_restore()
+    assert restored.data.as_dict() == {60: {"value": 1234.0, "unit": "GJ"}}
+    assert restored.restored_at == datetime(2023, 11, 14, 22, 13, 20, tzinfo=UTC)
+
+    # The restored readings are replaced by the first readings from the meter, the listeners are updated without the
+    # time of the restored readings, also when the reading didn't change.
+    listener = Mock()
+    remove = restored.async_add_listener(listener, 60)
+    restored.register_command(60)
+    await restored.async_refresh()
+    assert restored.restored_at is None
+    listener.assert_called_once_with()
+    remove()
+
+
+async def test_async_update_listeners_changed(coordinator: KamstrupUpdateCoordinator, mock_kamstrup: Mock) -> None:
+    """Test only the listeners of commands whose reading changed are updated."""
+    listeners = {context: Mock() for context in (60, 68, None)}
+    removers = [coordinator.async_add_listener(listener, context) for context, listener in listeners.items()]
+    coordinator.register_command(60)
+    coordinator.register_command(68)
+    coordinator.register_ttls = {60: 0.0, 68: 0.0}
+
+    mock_kamstrup.get_values.return_value = {60: (1234.0, "GJ"), 68: (5678.0, "m³")}
+    await coordinator.async_refresh()
+    assert [listener.call_count for listener in listeners.values()] == [1, 1, 1]
+
+    mock_kamstrup.get_values.return_value = {60: (1235.0, "GJ"), 68: (5678.0, "m³")}
+    await coordinator.async_refresh()
+    assert [listener.call_count for listener in listeners.values()] == [2, 1, 2]
+
+    # All listeners are updated when the update fails.
+    mock_kamstrup.get_values.side_effect = SerialException("Device disconnected")
+    await coordinator.async_refresh()
+    assert [listener.call_count for listener in listeners.values()] == [3, 2, 3]
+
+    # And when the meter answers again.
+    mock_kamstrup.get_values.side_effect = None
+    await coordinator.async_refresh()
+    assert [listener.call_count for listener in listeners.values()] == [4, 3, 4]
+
+    for remove in removers:
+        remove()
+
+
+async def test_async_update_data_in_place(coordinator: KamstrupUpdateCoordinator, mock_kamstrup: Mock) -> None:
+    """Test the readings are updated in place."""
+    coordinator.register_command(60)
+    coordinator.register_command(68)
+    coordinator.register_ttls = {60: 0.0, 68: 0.0}
+
+    mock_kamstrup.get_values.return_value = {60: (1234.0, "GJ"), 68: (5678.0, "m³")}
+    result = await coordinator._async_update_data()  # pylint: disable=protected-access
+    reading = result[60]
+
+    mock_kamstrup.get_values.return_value = {60: (1235.0, "GJ"), 68: (5678.0, "m³")}
+    assert await coordinator._async_update_data() is result  # pylint: disable=protected-access
+
+    assert result[60] is reading
+    assert reading.as_dict() == {"value": 1235.0, "unit": "GJ"}
+
+
+async def test_read_new_commands(hass: HomeAssistant, coordinator: KamstrupUpdateCoordinator, mock_kamstrup: Mock) -> None:
+    """Test commands registered after the first update are read within seconds, without reading the other commands."""
+    listeners = {context: Mock() for context in (60, 68)}
+    removers = [coordinator.async_add_listener(listener, context) for context, listener in listeners.items()]
+    coordinator.register_command(60)
+    mock_kamstrup.get_values.return_value = {60: (1234.0, "GJ")}
+    await coordinator.async_refresh()
+    mock_kamstrup.get_values.reset_mock()
+
+    coordinator.register_command(68)
+    coordinator.register_command(80)
+    coordinator.unregister_command(80)
+    mock_kamstrup.get_values.return_value = {68: (5678.0, "m³")}
+    async_fire_time_changed(hass, dt_util.utcnow() + timedelta(seconds=NEW_COMMANDS_DELAY))
+    await hass.async_block_till_done()
+
+    mock_kamstrup.get_values.assert_called_once_with([68], dest_addr=0x3F)
+    assert coordinator.data.as_dict() == {60: {"value": 1234.0, "unit": "GJ"}, 68: {"value": 5678.0, "unit": "m³"}}
+    assert [listener.call_count for listener in listeners.values()] == [1, 1]
+
+    for remove in removers:
+        remove()
+
+
+async def test_read_new_commands_by_update(coordinator: KamstrupUpdateCoordinator, mock_kamstrup: Mock) -> None:
+    """Test new commands aren't read twice when an update reads them first."""
+    coordinator.register_command(60)
+    mock_kamstrup.get_values.return_value = {60: (1234.0, "GJ")}
+    await coordinator.async_refresh()
+
+    coordinator.register_command(68)
+    mock_kamstrup.get_values.return_value = {68: (5678.0, "m³")}
+    await coordinator.async_refresh()
+    mock_kamstrup.get_values.reset_mock()
+
+    await coordinator._async_read_new_commands()  # pylint: disable=protected-access
+    mock_kamstrup.get_values.assert_not_called()
+
+
+async def test_streaming(hass: HomeAssistant, coordinator: KamstrupUpdateCoordinator, mock_kamstrup: Mock) -> None:
+    """Test streamed commands are read back to back, and their listeners are updated at most every publish interval."""
+    listeners = {context: Mock() for context in (60, 80)}
+    removers = [coordinator.async_add_listener(listener, context) for context, listener in listeners.items()]
+    coordinator.register_command(60)
+    coordinator.register_command(80)
+    mock_kamstrup.get_values.return_value = {60: (1234.0, "GJ"), 80: (0.0, "kW")}
+    await coordinator.async_refresh()
+    mock_kamstrup.get_values.reset_mock()
+
+    async def get_values(multiple_nbr: list[int], dest_addr: int) -> dict[int, tuple[float, str]]:
+        assert dest_addr == 0x3F
+        if mock_kamstrup.get_values.call_count == 3:
+            coordinator.async_stop_streaming()
+        return dict.fromkeys(multiple_nbr, (float(mock_kamstrup.get_values.call_count), "kW"))
+
+    mock_kamstrup.get_values.side_effect = get_values
+    coordinator.async_start_streaming([80], 60.0)
+    assert coordinator.streaming
+    await hass.async_block_till_done(wait_background_tasks=True)
+    async_fire_time_changed(hass, dt_util.utcnow() + timedelta(seconds=STREAM_PUBLISH_INTERVAL))
+    await hass.async_block_till_done()
+
+    assert not coordinator.streaming
+    assert mock_kamstrup.get_values.call_args_list == [call([80], dest_addr=0x3F)] * 3
+    assert coordinator.data[80].as_dict() == {"value": 3.0, "unit": "kW"}
+    # The stream only updates the listeners of the streamed commands, not for every reading.
+    assert listeners[60].call_count == 1
+    assert 1 < listeners[80].call_count <= 4
+
+    for remove in removers:
+        remove()
+
+
+async def test_streaming_timeout(hass: HomeAssistant, coordinator: KamstrupUpdateCoordinator, mock_kamstrup: Mock) -> None:
+    """Test streaming stops after its duration, and the updates don't read the streamed commands again."""
+    coordinator.register_command(60)
+    coordinator.register_command(80)
+    coordinator.register_ttls = {60: 0.0}
+
+    async def get_values(multiple_nbr: list[int], dest_addr: int) -> dict[int, tuple[float, str]]:
+        assert dest_addr == 0x3F
+        await asyncio.sleep(0.01)
+        if mock_kamstrup.get_values.call_count == 1:
+            msg = "Device disconnected"
+            raise SerialException(msg)
+        return dict.fromkeys(multiple_nbr, (90.5, "kW"))
+
+    mock_kamstrup.get_values.side_effect = get_values
+    with patch("custom_components.kamstrup_403.coordinator.STREAM_RETRY_DELAY", 0.0):
+        coordinator.async_start_streaming([80], 0.05)
+        await hass.async_block_till_done(wait_background_tasks=True)
+    async_fire_time_changed(hass, dt_util.utcnow() + timedelta(seconds=STREAM_PUBLISH_INTERVAL))
+    await hass.async_block_till_done()
+
+    assert not coordinator.streaming
+    assert mock_kamstrup.get_values.call_count > 2
+    mock_kamstrup.get_values.reset_mock()
+
+    await coordinator._async_update_data()  # pylint: disable=protected-access
+    mock_kamstrup.get_values.assert_called_once_with([60], dest_addr=0x3F)
@@ -17,3 +17,5 @@ async def test_config_entry_diagnostics(hass: HomeAssistant, hass_client: Client
 
     assert result["config_entry"]["entry_id"] == "test_entry"
     assert result["config_entry"]["domain"] == DOMAIN
+    assert result["frame_cache"] == {"hits": 0, "misses": 0, "size": 0, "max_size": 32}
+    assert result["trace"] == []
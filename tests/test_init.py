@@ -1,17 +1,33 @@
 """Test setup."""
 
-from unittest.mock import patch
+import asyncio
+import math
+from typing import Any
+from unittest.mock import AsyncMock, patch
 
 import pytest
 from homeassistant.core import HomeAssistant
 from homeassistant.exceptions import ConfigEntryNotReady
 from pytest_homeassistant_custom_component.common import MockConfigEntry
 
-from custom_components.kamstrup_403 import async_setup_entry
-from custom_components.kamstrup_403.const import DOMAIN
+from custom_components.kamstrup_403 import async_setup_entry, register_ttls, tier_intervals
+from custom_components.kamstrup_403.const import (
+    CONF_BATCH_SIZE,
+    CONF_BAUDRATE,
+    CONF_FAST_SCAN_INTERVAL,
+    CONF_PROBE_BATCH_SIZE,
+    CONF_PROBE_BAUDRATE,
+    CONF_SLOW_SCAN_INTERVAL,
+    DOMAIN,
+    FAST_REGISTERS,
+    REGISTER_TTLS,
+    SLOW_REGISTERS,
+)
 from custom_components.kamstrup_403.coordinator import KamstrupUpdateCoordinator
+from custom_components.kamstrup_403.port_manager import get_port_manager
+from custom_components.kamstrup_403.pykamstrup.kamstrup import MULTIPLE_NBR_MAX
 
-from . import get_mock_config_entry, setup_integration, unload_integration
+from . import get_mock_config_data, get_mock_config_entry, setup_integration, unload_integration
 
 
 async def test_setup_and_unload_entry(hass: HomeAssistant) -> None:
@@ -24,6 +40,103 @@ async def test_setup_and_unload_entry(hass: HomeAssistant) -> None:
     await unload_integration(hass, config_entry)
 
 
+async def test_setup_entry_probes_baudrate(hass: HomeAssistant, mock_kamstrup: AsyncMock) -> None:
+    """Test the baudrate is probed and stored on first setup."""
+    mock_kamstrup.probe_baudrate.return_value = 9600
+
+    config_entry = await setup_integration(hass)
+
+    mock_kamstrup.probe_baudrate.assert_called_once()
+    assert config_entry.data[CONF_BAUDRATE] == 9600
+
+
+async def test_setup_entry_probe_no_answer(hass: HomeAssistant, mock_kamstrup: AsyncMock) -> None:
+    """Test the current baudrate is stored when the meter doesn't answer at any baudrate, to be probed again later."""
+    mock_kamstrup.probe_baudrate.return_value = None
+
+    config_entry = await setup_integration(hass)
+
+    assert config_entry.data[CONF_BAUDRATE] == 1200
+    assert config_entry.data[CONF_PROBE_BAUDRATE] is True
+
+
+async def test_setup_entry_stored_baudrate(hass: HomeAssistant, mock_kamstrup: AsyncMock) -> None:
+    """Test a stored baudrate is used without probing."""
+    config_entry = MockConfigEntry(
+        domain=DOMAIN,
+        entry_id="test_entry",
+        data={**get_mock_config_data(), CONF_BAUDRATE: 2400},
+    )
+    config_entry.add_to_hass(hass)
+
+    with patch("custom_components.kamstrup_403.Kamstrup", return_value=mock_kamstrup) as mock_kamstrup_class:
+        assert await hass.config_entries.async_setup(config_entry.entry_id)
+        await hass.async_block_till_done()
+
+    assert mock_kamstrup_class.call_args.kwargs["baudrate"] == 2400
+    mock_kamstrup.probe_baudrate.assert_not_called()
+
+
+async def test_setup_entry_probes_batch_size(hass: HomeAssistant, mock_kamstrup: AsyncMock) -> None:
+    """Test the batch size is probed and stored on first setup, all registers a request can hold are confirmed right away."""
+    config_entry = await setup_integration(hass)
+
+    mock_kamstrup.probe_batch_size.assert_called_once_with(dest_addr=0x3F)
+    assert config_entry.data[CONF_BATCH_SIZE] == MULTIPLE_NBR_MAX
+    assert CONF_PROBE_BATCH_SIZE not in config_entry.data
+
+
+async def test_setup_entry_confirms_batch_size(hass: HomeAssistant, mock_kamstrup: AsyncMock) -> None:
+    """Test a smaller batch size is probed again on the next setup, and confirmed when it's found again."""
+    mock_kamstrup.probe_batch_size.return_value = 4
+
+    config_entry = await setup_integration(hass)
+    assert config_entry.data[CONF_BATCH_SIZE] == 4
+    assert config_entry.data[CONF_PROBE_BATCH_SIZE] is True
+
+    for batch_size, unconfirmed in ((5, True), (5, False)):
+        mock_kamstrup.probe_batch_size.return_value = batch_size
+        assert await hass.config_entries.async_reload(config_entry.entry_id)
+        await hass.async_block_till_done()
+
+        assert config_entry.data[CONF_BATCH_SIZE] == batch_size
+        assert (CONF_PROBE_BATCH_SIZE in config_entry.data) is unconfirmed
+
+    # Confirmed, it isn't probed anymore.
+    mock_kamstrup.probe_batch_size.reset_mock()
+    assert await hass.config_entries.async_reload(config_entry.entry_id)
+    await hass.async_block_till_done()
+    mock_kamstrup.probe_batch_size.assert_not_called()
+
+    await unload_integration(hass, config_entry)
+
+
+async def test_setup_entry_batch_size_no_answer(hass: HomeAssistant, mock_kamstrup: AsyncMock) -> None:
+    """Test nothing is stored when the meter doesn't answer a request for multiple registers."""
+    mock_kamstrup.probe_batch_size.return_value = None
+    mock_kamstrup.batch_size.return_value = 8
+
+    config_entry = await setup_integration(hass)
+
+    assert CONF_BATCH_SIZE not in config_entry.data
+
+
+async def test_setup_entry_stored_batch_size(hass: HomeAssistant, mock_kamstrup: AsyncMock) -> None:
+    """Test a stored batch size is used without probing."""
+    config_entry = MockConfigEntry(
+        domain=DOMAIN,
+        entry_id="test_entry",
+        data={**get_mock_config_data(), CONF_BATCH_SIZE: 4},
+    )
+    config_entry.add_to_hass(hass)
+
+    assert await hass.config_entries.async_setup(config_entry.entry_id)
+    await hass.async_block_till_done()
+
+    mock_kamstrup.set_batch_size.assert_called_once_with(4, 0x3F)
+    mock_kamstrup.probe_batch_size.assert_not_called()
+
+
 async def test_setup_entry_exception(hass: HomeAssistant) -> None:
     """Test setup entry raises ConfigEntryNotReady on connection error."""
     # Create config entry but don't set it up through HA's system
@@ -39,6 +152,20 @@ async def test_setup_entry_exception(hass: HomeAssistant) -> None:
             await async_setup_entry(hass, config_entry)
 
 
+async def test_setup_entry_fails_after_connecting(hass: HomeAssistant, mock_kamstrup: AsyncMock) -> None:
+    """Test the port is released when the setup fails after the connection is made, also on every retry."""
+    config_entry = get_mock_config_entry()
+    config_entry.add_to_hass(hass)
+
+    with patch("custom_components.kamstrup_403.coordinator.KamstrupCapabilities.async_load", side_effect=OSError("Storage failed")):
+        for _ in range(2):
+            with pytest.raises(OSError, match="Storage failed"):
+                await async_setup_entry(hass, config_entry)
+
+    assert not get_port_manager(hass).ports
+    assert mock_kamstrup.close.await_count == 2
+
+
 async def test_setup_entry_no_port(hass: HomeAssistant) -> None:
     """Test setup entry raises ValueError on missing port."""
     # Create config entry but don't set it up through HA's system
@@ -54,11 +181,87 @@ async def test_setup_entry_no_port(hass: HomeAssistant) -> None:
         await async_setup_entry(hass, config_entry)
 
 
+async def test_setup_entry_restored(hass: HomeAssistant, hass_storage: dict[str, Any], mock_kamstrup: AsyncMock) -> None:
+    """Test setup doesn't wait for the meter when there are readings from before the restart."""
+    hass_storage["kamstrup_403.test_entry.snapshot"] = {
+        "version": 1,
+        "key": "kamstrup_403.test_entry.snapshot",
+        "data": {"time": 1700000000.0, "data": {"60": {"value": 1000.0, "unit": "GJ"}}},
+    }
+    meter = asyncio.Event()
+
+    async def get_values(multiple_nbr: list[int], dest_addr: int) -> dict:  # noqa: ARG001 # pylint: disable=unused-argument
+        await meter.wait()
+        return dict.fromkeys(multiple_nbr, (1234.0, "GJ"))
+
+    mock_kamstrup.get_values.side_effect = get_values
+
+    config_entry = await setup_integration(hass)
+
+    assert config_entry.runtime_data.restored_at is not None
+    state = hass.states.get("sensor.kamstrup_403_heat_energy_e1")
+    assert state.state == "1000.0"
+    assert state.attributes["restored_at"] == config_entry.runtime_data.restored_at
+
+    meter.set()
+    await hass.async_block_till_done()
+
+    assert config_entry.runtime_data.restored_at is None
+    state = hass.states.get("sensor.kamstrup_403_heat_energy_e1")
+    assert state.state == "1234.0"
+    assert "restored_at" not in state.attributes
+
+    await unload_integration(hass, config_entry)
+
+
+async def test_remove_entry(hass: HomeAssistant, hass_storage: dict[str, Any]) -> None:
+    """Test the discovered registers are removed with the entry."""
+    config_entry = await setup_integration(hass)
+    assert "kamstrup_403.test_entry" in hass_storage
+
+    assert await hass.config_entries.async_remove(config_entry.entry_id)
+    await hass.async_block_till_done()
+
+    assert "kamstrup_403.test_entry" not in hass_storage
+
+
 async def test_async_reload_entry(hass: HomeAssistant) -> None:
-    """Test reloading the entry."""
+    """Test the entry reloads when the options change, not when the data changes."""
     config_entry = await setup_integration(hass)
 
-    with patch("custom_components.kamstrup_403.async_reload_entry") as mock_reload_entry:
-        assert len(mock_reload_entry.mock_calls) == 0
+    with patch.object(hass.config_entries, "async_reload") as mock_reload:
+        hass.config_entries.async_update_entry(config_entry, data={**config_entry.data, CONF_BATCH_SIZE: 4})
+        await hass.async_block_till_done()
+        mock_reload.assert_not_called()
+
         hass.config_entries.async_update_entry(config_entry, options={"something": "else"})
-        assert len(mock_reload_entry.mock_calls) == 1
+        await hass.async_block_till_done()
+        mock_reload.assert_awaited_once_with(config_entry.entry_id)
+
+    # The update listener of the previous setup is removed.
+    assert await hass.config_entries.async_reload(config_entry.entry_id)
+    await hass.async_block_till_done()
+    assert len(config_entry.update_listeners) == 1
+
+    await unload_integration(hass, config_entry)
+
+
+def test_register_ttls() -> None:
+    """Test the polling tiers from the options."""
+    config_entry = get_mock_config_entry()
+    assert register_ttls(config_entry) == REGISTER_TTLS
+    assert not tier_intervals(config_entry)
+
+    config_entry = MockConfigEntry(
+        domain=DOMAIN,
+        data=get_mock_config_data(),
+        options={CONF_FAST_SCAN_INTERVAL: 10, CONF_SLOW_SCAN_INTERVAL: 7200},
+    )
+    ttls = register_ttls(config_entry)
+    assert ttls[80] == 10.0
+    assert ttls[124] == 7200.0
+    assert ttls[139] == 7200.0
+    assert ttls[1001] == math.inf
+    assert 60 not in ttls
+    # Only the tiers set in the options make the coordinator update more often.
+    assert tier_intervals(config_entry) == {**dict.fromkeys(SLOW_REGISTERS, 7200.0), **dict.fromkeys(FAST_REGISTERS, 10.0)}
@@ -0,0 +1,116 @@
+"""Test for the shared serial ports."""
+
+from unittest.mock import AsyncMock, Mock, patch
+
+import pytest
+from homeassistant.const import CONF_PORT
+from homeassistant.core import HomeAssistant
+from serialx import SerialException
+
+from custom_components.kamstrup_403.port_manager import KamstrupPortManager, get_port_manager
+from custom_components.kamstrup_403.pykamstrup.const import EchoMode
+
+from . import setup_integration, unload_integration
+
+SETTINGS = {"baudrate": 1200, "timeout": 1.0, "inter_byte_timeout": None, "echo_mode": EchoMode.AUTO}
+
+
+async def test_acquire_shared() -> None:
+    """Test a port is connected once and shared."""
+    port_manager = KamstrupPortManager()
+    client = AsyncMock()
+    client.configure.return_value = False
+    factory = Mock(return_value=client)
+
+    assert await port_manager.async_acquire("/dev/ttyUSB0", factory, SETTINGS) is client
+    assert await port_manager.async_acquire("/dev/ttyUSB0", factory, SETTINGS) is client
+
+    factory.assert_called_once_with(**SETTINGS)
+    client.configure.assert_awaited_once_with(**SETTINGS)
+    client.connect.assert_awaited_once()
+    assert port_manager.ports["/dev/ttyUSB0"].users == 2
+
+    await port_manager.async_release("/dev/ttyUSB0")
+    client.close.assert_not_awaited()
+
+    await port_manager.async_release("/dev/ttyUSB0")
+    client.close.assert_awaited_once()
+    assert not port_manager.ports
+
+
+async def test_acquire_other_settings() -> None:
+    """Test the shared connection changes to the settings of the last entry that acquired the port."""
+    port_manager = KamstrupPortManager()
+    client = AsyncMock()
+    factory = Mock(return_value=client)
+    settings = {**SETTINGS, "baudrate": 9600}
+
+    await port_manager.async_acquire("/dev/ttyUSB0", factory, SETTINGS)
+    assert await port_manager.async_acquire("/dev/ttyUSB0", factory, settings) is client
+
+    factory.assert_called_once_with(**SETTINGS)
+    client.configure.assert_awaited_once_with(**settings)
+
+
+async def test_acquire_different_ports() -> None:
+    """Test every port gets its own connection."""
+    port_manager = KamstrupPortManager()
+    factory = Mock(side_effect=[AsyncMock(), AsyncMock()])
+
+    client_1 = await port_manager.async_acquire("/dev/ttyUSB0", factory, SETTINGS)
+    client_2 = await port_manager.async_acquire("/dev/ttyUSB1", factory, SETTINGS)
+
+    assert client_1 is not client_2
+    assert len(port_manager.ports) == 2
+
+
+async def test_acquire_connect_error() -> None:
+    """Test a port that can't be connected isn't kept."""
+    port_manager = KamstrupPortManager()
+    client = AsyncMock()
+    client.connect.side_effect = SerialException("Connection failed")
+
+    with pytest.raises(SerialException):
+        await port_manager.async_acquire("/dev/ttyUSB0", Mock(return_value=client), SETTINGS)
+
+    assert not port_manager.ports
+
+
+async def test_release_unknown_port() -> None:
+    """Test releasing a port that isn't in use."""
+    port_manager = KamstrupPortManager()
+
+    await port_manager.async_release("/dev/ttyUSB0")
+
+    assert not port_manager.ports
+
+
+async def test_setup_and_unload_entry(hass: HomeAssistant, mock_kamstrup: AsyncMock) -> None:
+    """Test a config entry uses the port while it's loaded."""
+    config_entry = await setup_integration(hass)
+    port_manager = get_port_manager(hass)
+
+    assert port_manager is get_port_manager(hass)
+    assert port_manager.ports[config_entry.data[CONF_PORT]].client is mock_kamstrup
+
+    await unload_integration(hass, config_entry)
+
+    assert not port_manager.ports
+    mock_kamstrup.close.assert_awaited_once()
+
+
+async def test_unload_entry_on_other_port(hass: HomeAssistant, mock_kamstrup: AsyncMock) -> None:
+    """Test the port that was acquired is released, also when the entry was moved to another port before it unloads."""
+    config_entry = await setup_integration(hass)
+    port_manager = get_port_manager(hass)
+    coordinator = config_entry.runtime_data
+
+    # Without the reload, the entry unloads below.
+    with patch.object(config_entry, "update_listeners", []):
+        hass.config_entries.async_update_entry(config_entry, data={**config_entry.data, CONF_PORT: "/dev/ttyUSB1"})
+    with patch.object(coordinator, "async_shutdown", wraps=coordinator.async_shutdown) as mock_shutdown:
+        await unload_integration(hass, config_entry)
+
+    mock_shutdown.assert_awaited()
+    assert not port_manager.ports
+    mock_kamstrup.close.assert_awaited_once()
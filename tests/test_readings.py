@@ -0,0 +1,31 @@
+"""Test for the readings of the meter."""
+
+from custom_components.kamstrup_403.readings import Readings
+
+
+def test_set() -> None:
+    """Test a reading is created once and updated in place."""
+    readings = Readings()
+
+    assert readings.set(60, 1234.0, "GJ")
+    reading = readings[60]
+    assert not readings.set(60, 1234.0, "GJ")
+    assert readings.set(60, 1235.0, "GJ")
+
+    assert readings[60] is reading
+    assert reading.value == 1235.0
+    assert readings.get(68) is None
+    assert 60 in readings
+    assert list(readings) == [60]
+    assert len(readings) == 1
+
+    readings.remove(60)
+    readings.remove(68)
+    assert len(readings) == 0
+
+
+def test_as_dict() -> None:
+    """Test the readings are converted to and from dictionaries."""
+    readings = Readings.from_dict({"60": {"value": 1234.0, "unit": "GJ"}, "68": {"value": None, "unit": None}})
+
+    assert readings.as_dict() == {60: {"value": 1234.0, "unit": "GJ"}, 68: {"value": None, "unit": None}}
@@ -1,5 +1,9 @@
 """Tests for sensor."""
 
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any
 from unittest.mock import AsyncMock, patch
 from zoneinfo import ZoneInfo
 
@@ -7,11 +11,46 @@ import pytest
 from homeassistant.components.sensor import SensorDeviceClass, SensorEntityDescription, SensorStateClass
 from homeassistant.const import UnitOfVolumeFlowRate
 from homeassistant.core import HomeAssistant
+from homeassistant.helpers import entity_platform
+from homeassistant.helpers.typing import StateType
 from homeassistant.util import dt as dt_util
 
-from custom_components.kamstrup_403.sensor import DESCRIPTIONS, KamstrupMeterSensor, KamstrupSensor
+from custom_components.kamstrup_403.const import DEFAULT_NAME, DOMAIN
+from custom_components.kamstrup_403.sensor import DATE_DESCRIPTIONS, DESCRIPTIONS, KamstrupDateSensor, KamstrupMeterSensor, KamstrupSensor
 
-from . import get_mock_config_entry, setup_integration, unload_integration
+from . import best_of, get_mock_config_entry, setup_integration, unload_integration
+
+_LOGGER: logging.Logger = logging.getLogger(__name__)
+# Calls per timed run.
+ROUNDS = 20
+
+
+# Lookups on every state write, that the state resolved once per update replaced.
+def _lookup_available(self: KamstrupSensor) -> bool:
+    return self.coordinator.data is not None and self.data_key in self.coordinator.data and self.coordinator.data[self.data_key].value is not None
+
+
+def _lookup_native_value(self: KamstrupSensor) -> StateType | datetime:
+    if self.coordinator.data and self.data_key in self.coordinator.data:
+        value = self.coordinator.data[self.data_key].value
+        if isinstance(self, KamstrupDateSensor):
+            return self.to_datetime(value) if isinstance(value, (float, int)) else None
+        return value
+    return None
+
+
+def _lookup_native_unit_of_measurement(self: KamstrupSensor) -> str | None:
+    if isinstance(self, KamstrupDateSensor):
+        return None
+    if self.entity_description.native_unit_of_measurement is not None:
+        return self.entity_description.native_unit_of_measurement
+    if self.coordinator.data and self.data_key in self.coordinator.data:
+        return self.coordinator.data[self.data_key].unit
+    return None
+
+
+def _lookup_name(self: KamstrupSensor) -> str:
+    return f"{DEFAULT_NAME} {self.entity_description.name}"
 
 
 @pytest.mark.parametrize(
@@ -99,6 +138,51 @@ async def test_native_value_returns_none_when_data_key_missing(hass: HomeAssista
     await unload_integration(hass, config_entry)
 
 
+async def test_unsupported_registers(hass: HomeAssistant, mock_kamstrup: AsyncMock) -> None:
+    """Test there are no sensors for registers the meter doesn't support."""
+    mock_kamstrup.discover_registers.side_effect = lambda multiple_nbr, dest_addr: {nbr: nbr not in (60, 140) for nbr in multiple_nbr}  # noqa: ARG005
+
+    config_entry = await setup_integration(hass)
+
+    assert hass.states.get("sensor.kamstrup_403_heat_energy_e1") is None
+    assert hass.states.get("sensor.kamstrup_403_heat_energy_to_gas") is None
+    assert hass.states.get("sensor.kamstrup_403_minflowdate_m") is None
+    assert hass.states.get("sensor.kamstrup_403_volume")
+    assert 60 not in config_entry.runtime_data.commands
+
+    await unload_integration(hass, config_entry)
+
+
+async def test_discover_registers_after_restart(hass: HomeAssistant, hass_storage: dict[str, Any], mock_kamstrup: AsyncMock) -> None:
+    """Test registers are discovered in the background when there are readings from before the restart."""
+    hass_storage["kamstrup_403.test_entry.snapshot"] = {
+        "version": 1,
+        "key": "kamstrup_403.test_entry.snapshot",
+        "data": {"time": 1700000000.0, "data": {"60": {"value": 1000.0, "unit": "GJ"}}},
+    }
+    meter = asyncio.Event()
+
+    async def discover_registers(multiple_nbr: list[int], dest_addr: int) -> dict[int, bool]:  # noqa: ARG001 # pylint: disable=unused-argument
+        await meter.wait()
+        return {nbr: nbr != 68 for nbr in multiple_nbr}
+
+    mock_kamstrup.discover_registers.side_effect = discover_registers
+
+    config_entry = await setup_integration(hass)
+
+    # Registers that weren't discovered yet are assumed to be supported.
+    assert hass.states.get("sensor.kamstrup_403_heat_energy_e1")
+    assert hass.states.get("sensor.kamstrup_403_volume")
+
+    meter.set()
+    await hass.async_block_till_done(wait_background_tasks=True)
+
+    assert not config_entry.runtime_data.capabilities.is_supported(68)
+    assert "kamstrup_403.test_entry" in hass_storage
+
+    await unload_integration(hass, config_entry)
+
+
 def test_native_value_method_directly_when_no_data() -> None:
     """Test native_value method directly returns None when coordinator.data is None."""
     # Set up a mock coordinator with no data
@@ -163,3 +247,43 @@ def test_native_unit_of_measurement_from_entity_description() -> None:
     sensor = KamstrupMeterSensor(mock_coordinator, get_mock_config_entry(), description)
 
     assert sensor.native_unit_of_measurement == UnitOfVolumeFlowRate.LITERS_PER_HOUR
+
+
+async def test_state_write_benchmark(hass: HomeAssistant) -> None:
+    """Benchmark writing the states of all sensors, against looking the state up on every write."""
+    config_entry = await setup_integration(hass)
+    entities = [entity for platform in entity_platform.async_get_platforms(hass, DOMAIN) for entity in platform.entities.values()]
+
+    def read_state() -> list[tuple]:
+        return [(entity.available, entity.native_value, entity.native_unit_of_measurement, entity.name) for entity in entities]
+
+    def write_states() -> None:
+        # Only the state writes, the state is resolved from the coordinator data once per update before that.
+        for entity in entities:
+            entity.async_write_ha_state()
+
+    cached_reads = best_of(read_state, ROUNDS)
+    cached_writes = best_of(write_states, ROUNDS)
+
+    with (
+        patch.object(KamstrupSensor, "available", property(_lookup_available)),
+        patch.object(KamstrupSensor, "native_value", property(_lookup_native_value)),
+        patch.object(KamstrupSensor, "native_unit_of_measurement", property(_lookup_native_unit_of_measurement)),
+        patch.object(KamstrupSensor, "name", property(_lookup_name)),
+    ):
+        lookup_reads = best_of(read_state, ROUNDS)
+        lookup_writes = best_of(write_states, ROUNDS)
+
+    _LOGGER.info(
+        "%i sensors, reading the state, lookup: %.2f µs, cached: %.2f µs, writing the state, lookup: %.2f µs, cached: %.2f µs",
+        len(entities),
+        lookup_reads * 1e6,
+        cached_reads * 1e6,
+        lookup_writes * 1e6,
+        cached_writes * 1e6,
+    )
+
+    # All meter and date sensors, and the gas sensor.
+    assert len(entities) == len(DESCRIPTIONS) + len(DATE_DESCRIPTIONS) + 1
+
+    await unload_integration(hass, config_entry)
@@ -0,0 +1,146 @@
+"""Test for the services."""
+
+from unittest.mock import AsyncMock, call, patch
+
+import pytest
+import voluptuous as vol
+from homeassistant.const import ATTR_CONFIG_ENTRY_ID
+from homeassistant.core import HomeAssistant
+from homeassistant.exceptions import HomeAssistantError, ServiceValidationError
+from serialx import SerialException
+
+from custom_components.kamstrup_403.const import (
+    ATTR_DURATION,
+    ATTR_REGISTERS,
+    DOMAIN,
+    SERVICE_READ_REGISTERS,
+    SERVICE_START_STREAMING,
+    SERVICE_STOP_STREAMING,
+)
+
+from . import setup_integration, unload_integration
+
+
+async def test_read_registers(hass: HomeAssistant, mock_kamstrup: AsyncMock) -> None:
+    """Test registers are read in batches, once each, and returned with their units."""
+    config_entry = await setup_integration(hass)
+    mock_kamstrup.get_values.reset_mock()
+    mock_kamstrup.get_values.side_effect = [
+        {nbr: (float(nbr), "GJ") for nbr in range(1, 9)},
+        {9: (9.0, None)},
+    ]
+
+    response = await hass.services.async_call(
+        DOMAIN,
+        SERVICE_READ_REGISTERS,
+        {ATTR_CONFIG_ENTRY_ID: config_entry.entry_id, ATTR_REGISTERS: [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 1]},
+        blocking=True,
+        return_response=True,
+    )
+
+    assert mock_kamstrup.get_values.call_args_list == [
+        call([1, 2, 3, 4, 5, 6, 7, 8], dest_addr=0x3F),
+        call([9, 10], dest_addr=0x3F),
+    ]
+    assert response == {
+        ATTR_REGISTERS: {
+            **{str(nbr): {"value": float(nbr), "unit": "GJ"} for nbr in range(1, 9)},
+            "9": {"value": 9.0, "unit": None},
+            "10": {"value": None, "unit": None},
+        }
+    }
+
+    await unload_integration(hass, config_entry)
+
+
+async def test_read_registers_failed(hass: HomeAssistant, mock_kamstrup: AsyncMock) -> None:
+    """Test an error is raised when the meter can't be read."""
+    config_entry = await setup_integration(hass)
+    mock_kamstrup.get_values.side_effect = SerialException("Device disconnected")
+
+    with pytest.raises(HomeAssistantError) as exc_info:
+        await hass.services.async_call(
+            DOMAIN,
+            SERVICE_READ_REGISTERS,
+            {ATTR_CONFIG_ENTRY_ID: config_entry.entry_id, ATTR_REGISTERS: [60]},
+            blocking=True,
+            return_response=True,
+        )
+    assert exc_info.value.translation_key == "read_failed"
+
+    await unload_integration(hass, config_entry)
+
+
+async def test_read_registers_entry_not_loaded(hass: HomeAssistant) -> None:
+    """Test registers can only be read from loaded config entries of the integration."""
+    config_entry = await setup_integration(hass)
+    await unload_integration(hass, config_entry)
+
+    for entry_id, translation_key in ((config_entry.entry_id, "entry_not_loaded"), ("unknown", "entry_not_found")):
+        with pytest.raises(ServiceValidationError) as exc_info:
+            await hass.services.async_call(
+                DOMAIN,
+                SERVICE_READ_REGISTERS,
+                {ATTR_CONFIG_ENTRY_ID: entry_id, ATTR_REGISTERS: [60]},
+                blocking=True,
+                return_response=True,
+            )
+        assert exc_info.value.translation_key == translation_key
+
+
+async def test_read_registers_schema(hass: HomeAssistant) -> None:
+    """Test the registers are validated."""
+    config_entry = await setup_integration(hass)
+
+    for registers in ([], [-1], ["heat"]):
+        with pytest.raises(vol.Invalid):
+            await hass.services.async_call(
+                DOMAIN,
+                SERVICE_READ_REGISTERS,
+                {ATTR_CONFIG_ENTRY_ID: config_entry.entry_id, ATTR_REGISTERS: registers},
+                blocking=True,
+                return_response=True,
+            )
+
+    await unload_integration(hass, config_entry)
+
+
+async def test_start_and_stop_streaming(hass: HomeAssistant) -> None:
+    """Test streaming is started for the registers with a sensor, and stopped."""
+    config_entry = await setup_integration(hass)
+    coordinator = config_entry.runtime_data
+
+    with patch.object(coordinator, "async_start_streaming") as mock_start_streaming:
+        await hass.services.async_call(DOMAIN, SERVICE_START_STREAMING, {ATTR_CONFIG_ENTRY_ID: config_entry.entry_id}, blocking=True)
+        mock_start_streaming.assert_called_once_with([74, 80, 86, 87, 89], 300.0)
+
+        await hass.services.async_call(
+            DOMAIN,
+            SERVICE_START_STREAMING,
+            {ATTR_CONFIG_ENTRY_ID: config_entry.entry_id, ATTR_REGISTERS: [80, 9999, 80], ATTR_DURATION: 30},
+            blocking=True,
+        )
+        mock_start_streaming.assert_called_with([80], 30.0)
+
+    with patch.object(coordinator, "async_stop_streaming") as mock_stop_streaming:
+        await hass.services.async_call(DOMAIN, SERVICE_STOP_STREAMING, {ATTR_CONFIG_ENTRY_ID: config_entry.entry_id}, blocking=True)
+        mock_stop_streaming.assert_called_once_with()
+
+    await unload_integration(hass, config_entry)
+
+
+async def test_start_streaming_no_sensors(hass: HomeAssistant) -> None:
+    """Test streaming registers without a sensor isn't possible."""
+    config_entry = await setup_integration(hass)
+
+    with pytest.raises(ServiceValidationError) as exc_info:
+        await hass.services.async_call(
+            DOMAIN,
+            SERVICE_START_STREAMING,
+            {ATTR_CONFIG_ENTRY_ID: config_entry.entry_id, ATTR_REGISTERS: [9999]},
+            blocking=True,
+        )
+    assert exc_info.value.translation_key == "no_sensors"
+    assert not config_entry.runtime_data.streaming
+
+    await unload_integration(hass, config_entry)